@@ -5,7 +5,7 @@ AI模块
 
 # 从子模块导入公共API
 from .llm import ai_stream, DEFAULT_AI_MODEL as AI_MODEL
-from .emotion import predict_emotion
+from .emotion import predict_emotion, get_emotion_stats
 from .plan import ActionPlanner
 
-__all__ = ['ai_stream', 'AI_MODEL', 'predict_emotion', 'ActionPlanner'] 
\ No newline at end of file
+__all__ = ['ai_stream', 'AI_MODEL', 'predict_emotion', 'get_emotion_stats', 'ActionPlanner'] 
\ No newline at end of file
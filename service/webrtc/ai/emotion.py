@@ -4,11 +4,18 @@
 """
 
 import os
+import re
+import asyncio
 import json
+import time
+import hashlib
 import logging
-import aiohttp
+import threading
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
 from openai import OpenAI
+from utils.client_utils import get_aiohttp_session
+from utils.metrics_utils import observe_stage, provider_label, register_stats
 
 # 加载环境变量
 load_dotenv()
@@ -17,10 +24,220 @@ load_dotenv()
 DEFAULT_OPENAI_API_KEY = os.getenv("LLM_API_KEY", "")
 DEFAULT_OPENAI_API_BASE_URL = os.getenv("LLM_BASE_URL", "")
 
+# 远程情感分析使用的模型
+EMOTION_REMOTE_MODEL = "gpt-4.1-nano"
+
+# 情感标签，本地分类器和远程模型都只会返回其中之一
+EMOTION_LABELS = ["neutral", "anger", "joy", "sadness", "shy", "shy2", "smile1", "smile2", "unhappy"]
+
+# 本地情感分类器配置：是否启用，以及词表文件路径
+EMOTION_LOCAL_CLASSIFIER = os.getenv("EMOTION_LOCAL_CLASSIFIER", "true").lower() in ("1", "true", "yes")
+EMOTION_LEXICON_PATH = os.getenv("EMOTION_LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_lexicon.json"))
+# 情感分析结果缓存的最大条目数，按文本哈希缓存
+EMOTION_CACHE_SIZE = int(os.getenv("EMOTION_CACHE_SIZE", "512"))
+# 本地分类耗时的统计窗口（最近多少次）
+_LOCAL_LATENCY_WINDOW = 1000
+
+
+# 判断文本语言用的字符范围：假名、汉字、拉丁字母
+_KANA_PATTERN = re.compile(r"[\u3040-\u30ff]")
+_HAN_PATTERN = re.compile(r"[\u4e00-\u9fff]")
+_LATIN_PATTERN = re.compile(r"[a-z]")
+
+
+def _text_languages(text):
+    """
+    判断小写文本包含哪些词表语言：有假名时视为日文，只有汉字时视为中文，有拉丁字母时同时包含英文
+
+    返回:
+        list: 语言代码（"zh"、"ja"、"en"）
+    """
+    languages = []
+    if _KANA_PATTERN.search(text):
+        languages.append("ja")
+    elif _HAN_PATTERN.search(text):
+        languages.append("zh")
+    if _LATIN_PATTERN.search(text):
+        languages.append("en")
+    return languages
+
+
+class LexiconEmotionClassifier:
+    """
+    基于关键词词表的本地情感分类器
+
+    词表中每个标签在中、日、英文下都有一组关键词及权重，每种语言的关键词编译成一个正则表达式。
+    只用文本所含语言的关键词匹配（例如"最高""泣"这类日文关键词不会在中文文本中生效）；
+    匹配到的权重按标签累加，最高分足够高且明显领先时才认为结果可信，否则交给远程模型判断。
+    """
+
+    def __init__(self, lexicon):
+        """
+        初始化分类器
+
+        参数:
+            lexicon (dict): 词表内容，格式见 emotion_lexicon.json
+        """
+        self.min_score = float(lexicon.get("min_score", 2.0))
+        self.min_margin = float(lexicon.get("min_margin", 1.0))
+        # 语言 -> {关键词: [(标签, 权重)]}
+        self._weights = {}
+        for label, languages in lexicon.get("labels", {}).items():
+            if label not in EMOTION_LABELS:
+                raise ValueError(f"词表中有未知的情感标签: {label}")
+            for language, terms in languages.items():
+                for term, weight in terms.items():
+                    term = term.lower()
+                    self._weights.setdefault(language, {}).setdefault(term, []).append((label, float(weight)))
+        # 每种语言一个正则表达式，长词优先匹配；纯ASCII的英文关键词按单词边界匹配，避免 "hi" 匹配到 "this"
+        self._patterns = {}
+        for language, weights in self._weights.items():
+            patterns = []
+            for term in sorted(weights, key=len, reverse=True):
+                escaped = re.escape(term)
+                patterns.append(rf"\b{escaped}\b" if term.isascii() else escaped)
+            self._patterns[language] = re.compile("|".join(patterns))
+
+    @classmethod
+    def load(cls, path):
+        """从词表文件创建分类器"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def classify(self, text):
+        """
+        对文本进行本地情感分类
+
+        返回:
+            str: 结果可信时返回情感标签，否则返回None
+        """
+        if not text:
+            return None
+        lowered = text.lower()
+        scores = {}
+        for language in _text_languages(lowered):
+            pattern = self._patterns.get(language)
+            if pattern is None:
+                continue
+            weights = self._weights[language]
+            for match in pattern.finditer(lowered):
+                for label, weight in weights[match.group(0)]:
+                    scores[label] = scores.get(label, 0.0) + weight
+        if not scores:
+            return None
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        top_label, top_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if top_score >= self.min_score and top_score - runner_up >= self.min_margin:
+            return top_label
+        return None
+
+
+class _EmotionStats:
+    """情感分析的统计信息：需要远程调用的比例以及本地分类的耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.predictions = 0  # 未命中缓存、实际进行分类的次数
+        self.cache_hits = 0
+        self.local_hits = 0  # 本地分类器直接给出结果的次数
+        self.remote_calls = 0  # 回退到远程模型的次数
+        self._local_latencies = deque(maxlen=_LOCAL_LATENCY_WINDOW)
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def record_prediction(self, local_seconds, remote):
+        with self._lock:
+            self.predictions += 1
+            if local_seconds is not None:
+                self._local_latencies.append(local_seconds)
+            if remote:
+                self.remote_calls += 1
+            else:
+                self.local_hits += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._local_latencies)
+            return {
+                "predictions": self.predictions,
+                "cache_hits": self.cache_hits,
+                "local_hits": self.local_hits,
+                "remote_calls": self.remote_calls,
+                "remote_share": self.remote_calls / self.predictions if self.predictions else 0.0,
+                "local_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            }
+
+
+_stats = _EmotionStats()
+
+# 情感分析结果的LRU缓存：文本哈希 -> 情感标签
+_emotion_cache = OrderedDict()
+_emotion_cache_lock = threading.Lock()
+
+# 本地分类器，首次使用时加载词表
+_local_classifier = None
+_local_classifier_lock = threading.Lock()
+_local_classifier_failed = False
+
+def _get_local_classifier():
+    """获取本地情感分类器，词表加载失败时返回None，此后只使用远程模型"""
+    global _local_classifier, _local_classifier_failed
+    if not EMOTION_LOCAL_CLASSIFIER or _local_classifier_failed:
+        return None
+    if _local_classifier is None:
+        with _local_classifier_lock:
+            if _local_classifier is None and not _local_classifier_failed:
+                try:
+                    _local_classifier = LexiconEmotionClassifier.load(EMOTION_LEXICON_PATH)
+                except Exception as e:
+                    logging.error(f"加载情感词表失败，只使用远程情感分析: {e}")
+                    _local_classifier_failed = True
+    return _local_classifier
+
+def _cache_get(key):
+    with _emotion_cache_lock:
+        emotion = _emotion_cache.get(key)
+        if emotion is not None:
+            _emotion_cache.move_to_end(key)
+        return emotion
+
+def _cache_put(key, emotion):
+    if EMOTION_CACHE_SIZE <= 0:
+        return
+    with _emotion_cache_lock:
+        _emotion_cache[key] = emotion
+        _emotion_cache.move_to_end(key)
+        while len(_emotion_cache) > EMOTION_CACHE_SIZE:
+            _emotion_cache.popitem(last=False)
+
+def get_emotion_stats():
+    """
+    获取情感分析的统计信息
+    
+    返回:
+        dict: 分类次数、缓存命中次数、本地和远程各自的次数、需要远程调用的比例（remote_share）
+              以及本地分类耗时的中位数（local_p50_ms）
+    """
+    return _stats.snapshot()
+
+register_stats("amadeus_emotion", get_emotion_stats, {
+    "predictions": ("counter", "未命中缓存、实际进行情感分类的次数"),
+    "cache_hits": ("counter", "情感分析结果缓存的命中次数"),
+    "local_hits": ("counter", "本地分类器直接给出结果的次数"),
+    "remote_calls": ("counter", "回退到远程模型的次数"),
+    "remote_share": ("gauge", "需要远程调用的比例"),
+    "local_p50_ms": ("gauge", "最近本地分类耗时的中位数（毫秒）"),
+})
+
 async def predict_emotion(message, client=None):
     """
     根据给定的消息文本预测情感
     
+    先查结果缓存，再用本地分类器判断，本地结果不可信时才调用远程模型
+    
     参数:
         message (str): 用于情感分析的消息文本
         client (OpenAI, optional): OpenAI 客户端，如不指定则创建新的客户端
@@ -28,13 +245,48 @@ async def predict_emotion(message, client=None):
     返回:
         str: 预测的情感类型，如'neutral'、'anger'、'joy'等
     """
+    cache_key = hashlib.sha1((message or "").encode("utf-8")).hexdigest()
+    emotion = _cache_get(cache_key)
+    if emotion is not None:
+        _stats.record_cache_hit()
+        return emotion
+    
+    local_seconds = None
+    classifier = _get_local_classifier()
+    if classifier is not None:
+        start_time = time.perf_counter()
+        emotion = classifier.classify(message)
+        local_seconds = time.perf_counter() - start_time
+    
+    if emotion is not None:
+        logging.info(f"本地情感分析结果: {emotion}")
+        _stats.record_prediction(local_seconds, remote=False)
+        observe_stage("emotion", local_seconds, provider="local", model="lexicon")
+    else:
+        remote_start = time.perf_counter()
+        emotion, base_url = await _predict_emotion_remote(message, client)
+        _stats.record_prediction(local_seconds, remote=True)
+        observe_stage("emotion", time.perf_counter() - remote_start, provider=provider_label(base_url), model=EMOTION_REMOTE_MODEL)
+        if emotion is None:
+            # 远程请求失败时不缓存，下次遇到相同文本时重新请求
+            return 'neutral'
+    
+    _cache_put(cache_key, emotion)
+    return emotion
+
+async def _predict_emotion_remote(message, client=None):
+    """
+    调用远程模型预测情感
+    
+    返回:
+        tuple: (预测的情感类型，请求失败时为None；实际请求的API基础URL，用于统计服务商)
+    """
+    api_key = DEFAULT_OPENAI_API_KEY
+    base_url = DEFAULT_OPENAI_API_BASE_URL
     try:
-        api_key = DEFAULT_OPENAI_API_KEY
-        base_url = DEFAULT_OPENAI_API_BASE_URL
-        
         # 准备请求数据
         data = {
-            "model": "gpt-4.1-nano",
+            "model": EMOTION_REMOTE_MODEL,
             "messages": [
                 {
                     "role": "system",
@@ -55,7 +307,7 @@ async def predict_emotion(message, client=None):
                         "properties": {
                             "result": {
                                 "type": "string",
-                                "enum": ["neutral", "anger", "joy", "sadness", "shy", "shy2", "smile1", "smile2", "unhappy"]
+                                "enum": EMOTION_LABELS
                             }
                         },
                         "required": ["result"],
@@ -67,51 +319,47 @@ async def predict_emotion(message, client=None):
         
         # 如果提供了客户端，直接使用客户端
         if client:
+            client_base_url = str(client.base_url)
             try:
-                response = client.chat.completions.create(**data)
+                # 同步客户端的请求放到线程中执行，避免阻塞共享事件循环
+                response = await asyncio.to_thread(client.chat.completions.create, **data)
                 content = response.choices[0].message.content
                 try:
                     parsed_content = json.loads(content)
                     emotion = parsed_content.get('result', 'neutral')
                     logging.info(f"情感分析结果: {emotion}")
-                    return emotion
+                    return emotion, client_base_url
                 except json.JSONDecodeError:
                     logging.error(f"无法解析JSON响应: {content}")
-                    return 'neutral'
+                    return None, client_base_url
             except Exception as e:
                 logging.error(f"客户端调用失败: {e}")
                 # 如果客户端调用失败，回退到HTTP请求
         
-        # 使用aiohttp进行异步HTTP请求
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {api_key}'
-        }
+        # 使用共享的aiohttp会话进行异步HTTP请求，会话已带有鉴权请求头并复用长连接
+        session = await get_aiohttp_session(base_url, api_key)
+        async with session.post(
+            f"{base_url}/chat/completions",
+            json=data
+        ) as response:
+            # 检查响应状态
+            if response.status == 200:
+                response_data = await response.json()
+                content = response_data.get('choices', [{}])[0].get('message', {}).get('content', '{}')
+                
+                try:
+                    parsed_content = json.loads(content)
+                    emotion = parsed_content.get('result', 'neutral')
+                    logging.info(f"情感分析结果: {emotion}")
+                    return emotion, base_url
+                except json.JSONDecodeError:
+                    logging.error(f"无法解析JSON响应: {content}")
+                    return None, base_url
+            else:
+                response_text = await response.text()
+                logging.error(f"API请求失败: {response.status} {response_text}")
+                return None, base_url
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{base_url}/chat/completions",
-                headers=headers,
-                json=data
-            ) as response:
-                # 检查响应状态
-                if response.status == 200:
-                    response_data = await response.json()
-                    content = response_data.get('choices', [{}])[0].get('message', {}).get('content', '{}')
-                    
-                    try:
-                        parsed_content = json.loads(content)
-                        emotion = parsed_content.get('result', 'neutral')
-                        logging.info(f"情感分析结果: {emotion}")
-                        return emotion
-                    except json.JSONDecodeError:
-                        logging.error(f"无法解析JSON响应: {content}")
-                        return 'neutral'
-                else:
-                    response_text = await response.text()
-                    logging.error(f"API请求失败: {response.status} {response_text}")
-                    return 'neutral'
-            
     except Exception as e:
         logging.error(f"预测情感时出错: {e}")
-        return 'neutral' 
\ No newline at end of file
+        return None, base_url 
\ No newline at end of file
@@ -8,10 +8,12 @@ import os
 import json
 import logging
 import asyncio
-import aiohttp
 import random
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from .llm import ai_stream, trim_messages
+from utils.client_utils import get_aiohttp_session
+from utils.metrics_utils import observe_stage, provider_label
 
 class ActionPlanner:
     """
@@ -89,11 +91,13 @@ class ActionPlanner:
             }
         }
         
+        request_start = time.perf_counter()
         try:
             # 如果提供了客户端，直接使用客户端
             if client:
                 try:
-                    response = client.chat.completions.create(**data)
+                    # 同步客户端的请求放到线程中执行，避免阻塞共享事件循环
+                    response = await asyncio.to_thread(client.chat.completions.create, **data)
                     content = response.choices[0].message.content
                     try:
                         parsed_content = json.loads(content)
@@ -109,40 +113,35 @@ class ActionPlanner:
                     logging.error(f"客户端调用失败: {e}")
                     # 如果客户端调用失败，回退到HTTP请求
             
-            # 配置请求头
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.openai_api_key}"
-            }
-            
-            # 使用aiohttp进行异步HTTP请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.openai_api_base_url}/chat/completions",
-                    headers=headers,
-                    json=data
-                ) as response:
-                    # 检查响应状态
-                    if response.status == 200:
-                        response_data = await response.json()
-                        content = response_data.get('choices', [{}])[0].get('message', {}).get('content', '{}')
-                        
-                        try:
-                            parsed_content = json.loads(content)
-                            action = parsed_content.get('result', 'share_memory')
-                            logging.info(f"行动计划生成结果: {action}")
-                            self.next_action = action
-                            return action
-                        except json.JSONDecodeError:
-                            logging.error(f"无法解析JSON响应: {content}")
-                            self.next_action = "share_memory"
-                            return "share_memory"
-                    else:
-                        response_text = await response.text()
-                        logging.error(f"API请求失败: {response.status} {response_text}")
+            # 使用共享的aiohttp会话进行异步HTTP请求，会话已带有鉴权请求头并复用长连接
+            session = await get_aiohttp_session(self.openai_api_base_url, self.openai_api_key)
+            async with session.post(
+                f"{self.openai_api_base_url}/chat/completions",
+                json=data
+            ) as response:
+                # 检查响应状态
+                if response.status == 200:
+                    response_data = await response.json()
+                    content = response_data.get('choices', [{}])[0].get('message', {}).get('content', '{}')
+                    
+                    try:
+                        parsed_content = json.loads(content)
+                        action = parsed_content.get('result', 'share_memory')
+                        logging.info(f"行动计划生成结果: {action}")
+                        self.next_action = action
+                        return action
+                    except json.JSONDecodeError:
+                        logging.error(f"无法解析JSON响应: {content}")
                         self.next_action = "share_memory"
                         return "share_memory"
+                else:
+                    response_text = await response.text()
+                    logging.error(f"API请求失败: {response.status} {response_text}")
+                    self.next_action = "share_memory"
+                    return "share_memory"
         except Exception as e:
             logging.error(f"行动计划生成失败: {str(e)}")
             self.next_action = "share_memory"
-            return "share_memory"  # 出错时默认返回分享记忆
\ No newline at end of file
+            return "share_memory"  # 出错时默认返回分享记忆
+        finally:
+            observe_stage("planner", time.perf_counter() - request_start, provider=provider_label(self.openai_api_base_url), model=data["model"])
\ No newline at end of file
@@ -0,0 +1,4 @@
+"""
+性能基准模块
+用于在本地测量各处理环节开销的基准脚本
+"""
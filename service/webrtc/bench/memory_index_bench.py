@@ -0,0 +1,148 @@
+"""
+本地记忆索引与mem0搜索的对比基准
+启动本地模拟的mem0服务，写入同一批记忆后分别用本地索引和mem0搜索，比较搜索延迟和召回率：
+    p50/p95  单次搜索的延迟
+    recall   目标记忆出现在前 limit 条结果中的查询比例
+与服务中一样，本地索引只包含从mem0刷新得到的记忆。部分目标记忆在首次刷新后才像对话中那样经写入队列写入，
+由写入完成后的刷新加入本地索引，并统计从入队到本地能搜索到的时间（fresh）
+模拟的mem0按共有字符数排序，召回率只反映本地索引相对这一简单基线的表现，不代表真实mem0的语义检索
+
+运行方式（在 service/webrtc 目录下）:
+    python -m bench.memory_index_bench --profile typical --distractors 500
+"""
+
+import argparse
+import os
+import random
+import time
+
+from fakes import FakeProviders, PROFILES
+
+# (记忆, 查询)：每条查询的目标是同一行的记忆
+MEMORY_CASES = [
+    ("用户喜欢喝不加糖的拿铁咖啡", "我平时喝什么咖啡"),
+    ("用户养了一只叫小橘的橘猫", "我的猫叫什么名字"),
+    ("用户在东京的大学读物理学研究生", "我在哪里读研究生"),
+    ("用户对花生过敏", "我有什么过敏的食物吗"),
+    ("用户的生日是十月十七日", "你还记得我的生日吗"),
+    ("用户最喜欢的动画是命运石之门", "我最喜欢哪部动画"),
+    ("用户每周六早上去游泳", "我周末一般做什么运动"),
+    ("用户正在准备日语能力考试N1", "我在准备什么考试"),
+    ("用户的妹妹在上海当护士", "我妹妹是做什么工作的"),
+    ("用户讨厌下雨天出门", "我对下雨天是什么态度"),
+    ("ユーザーはラーメンが大好きで、特に味噌ラーメンを好む", "私の好きなラーメンは何"),
+    ("ユーザーは毎朝七時に起きる", "私は何時に起きますか"),
+    ("ユーザーはギターを三年間練習している", "私が練習している楽器は"),
+    ("ユーザーの父親は大阪でパン屋を経営している", "父の仕事を覚えている"),
+    ("ユーザーは夏に北海道へ旅行する予定", "夏の旅行の予定は"),
+    ("The user works as a backend engineer at a robotics startup", "what is my job"),
+    ("The user is learning to play chess on weekends", "which game am I learning"),
+    ("The user prefers dark mode in every application", "do I like light or dark themes"),
+    ("The user's favorite physicist is Richard Feynman", "who is my favorite scientist"),
+    ("The user is vegetarian and avoids fish", "do I eat meat"),
+]
+
+# 生成干扰记忆的素材，模拟长期使用后积累的大量无关记忆
+_DISTRACTOR_SUBJECTS = ["用户的同事", "用户的邻居", "用户的朋友", "ユーザーの友人", "The user's cousin"]
+_DISTRACTOR_FACTS = [
+    "上周去了一家新开的餐厅", "最近在看一部历史纪录片", "打算明年换一份工作", "喜欢在晚上散步",
+    "は週末に映画を見る", "は最近料理を始めた", "recently moved to a new apartment", "collects vintage postcards",
+]
+
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    return values[min(int(len(values) * percentile), len(values) - 1)] if values else None
+
+
+def _found(results, target):
+    return any(target in memory.get("memory", "") for memory in results or [])
+
+
+def _wait_visible(index, api_key, user_id, memory, query, limit, timeout=10.0):
+    """等待写入的记忆出现在本地索引的搜索结果中，返回等待的时间，超时返回None"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if _found(index.search(api_key, user_id, query, limit), memory):
+            return time.perf_counter() - start
+        time.sleep(0.01)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较本地记忆索引与mem0搜索的延迟和召回率")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical", help="模拟服务的延迟配置")
+    parser.add_argument("--distractors", type=int, default=200, help="额外写入的干扰记忆条数")
+    parser.add_argument("--limit", type=int, default=3, help="每次搜索返回的条数")
+    parser.add_argument("--repeat", type=int, default=5, help="每条查询重复搜索的次数")
+    parser.add_argument("--fresh-every", type=int, default=4, help="每隔多少条目标记忆取一条在首次刷新后经写入队列写入")
+    args = parser.parse_args()
+
+    providers = FakeProviders(args.profile).start()
+    # 记忆模块在导入时读取mem0地址，必须先指向模拟服务
+    os.environ.update(providers.environment())
+    from memory.client import get_memory_client
+    from memory.local_index import MemoryIndex, parse_memory_list
+    from memory.write_queue import MemoryWriteQueue
+    from utils.async_utils import run_async, submit_async
+
+    api_key = os.environ["MEM0_API_KEY"]
+    user_id = "bench-user"
+    rng = random.Random(0)
+    fresh_cases = MEMORY_CASES[::args.fresh_every] if args.fresh_every > 0 else []
+    memories = [memory for memory, _ in MEMORY_CASES if memory not in dict(fresh_cases)] + [
+        f"{rng.choice(_DISTRACTOR_SUBJECTS)}{rng.choice(_DISTRACTOR_FACTS)}（{index}）" for index in range(args.distractors)
+    ]
+    rng.shuffle(memories)
+
+    local_latencies, remote_latencies = [], []
+    local_hits = remote_hits = 0
+    fresh_latencies = []
+    try:
+        client = get_memory_client(api_key)
+        # 并发写入，避免逐条等待模拟的写入延迟
+        for future in [submit_async(client.add, [{"role": "user", "content": memory}], user_id=user_id) for memory in memories]:
+            future.result()
+        index = MemoryIndex(path=":memory:")
+        index.refresh_in_background(api_key, user_id, force=True).result()
+
+        # 对话中新产生的记忆经写入队列写入mem0，写入完成后刷新本地索引；模拟的mem0把一批消息拼成一条记忆，
+        # 每批只写一条消息。模拟的mem0写入后立即可见，刷新前不等待
+        write_queue = MemoryWriteQueue(
+            delay=0, max_messages=1,
+            on_written=lambda key, user: index.refresh_in_background(key, user, force=True)
+        )
+        for memory, query in fresh_cases:
+            write_queue.add(api_key, user_id, [{"role": "user", "content": memory}])
+            fresh_latencies.append(_wait_visible(index, api_key, user_id, memory, query, args.limit))
+        write_queue.flush()
+
+        for _ in range(args.repeat):
+            for memory, query in MEMORY_CASES:
+                start = time.perf_counter()
+                local_results = index.search(api_key, user_id, query, args.limit)
+                local_latencies.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                remote_results = parse_memory_list(run_async(client.search, query=query, user_id=user_id, limit=args.limit))
+                remote_latencies.append(time.perf_counter() - start)
+                local_hits += _found(local_results, memory)
+                remote_hits += _found(remote_results, memory)
+    finally:
+        providers.stop()
+
+    searches = len(MEMORY_CASES) * args.repeat
+    print(f"延迟配置: {args.profile}，记忆条数: {len(memories) + len(fresh_cases)}，每次返回: {args.limit} 条，搜索次数: {searches}")
+    visible = [latency for latency in fresh_latencies if latency is not None]
+    if fresh_cases:
+        p50 = f"{_percentile(visible, 0.5) * 1000:.1f}ms" if visible else "-"
+        print(f"fresh: 经写入队列写入 {len(fresh_cases)} 条，本地可搜索到 {len(visible)} 条，入队到可搜索 p50 {p50}")
+    print(f"{'':<12}{'p50(ms)':>12}{'p95(ms)':>12}{'recall':>10}")
+    for name, latencies, hits in (("local", local_latencies, local_hits), ("mem0", remote_latencies, remote_hits)):
+        print(
+            f"{name:<12}{_percentile(latencies, 0.5) * 1000:>12.3f}{_percentile(latencies, 0.95) * 1000:>12.3f}"
+            f"{hits / searches:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
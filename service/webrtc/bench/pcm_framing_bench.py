@@ -0,0 +1,107 @@
+"""
+TTS PCM分帧基准
+对比旧的切片复制转换方式与 PcmFramer 处理同一段网络数据时的CPU耗时和临时内存分配
+
+网络块大小随机（模拟 iter_content 返回的任意大小数据），统计每秒音频的CPU耗时，
+以及每个网络块处理过程中的内存峰值之和（近似每秒音频产生的临时分配字节数）
+
+运行方式（在 service/webrtc 目录下）:
+    python -m bench.pcm_framing_bench
+"""
+
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from tts.pcm import PcmFramer
+
+SAMPLE_RATE = 32000
+AUDIO_SECONDS = 30
+REPEAT = 3
+
+
+def legacy_decode(chunks):
+    """旧实现：每个网络块切片复制两次，再分配int16视图、float32数组和相除结果"""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        num_samples = len(buffer) // 2
+        if num_samples > 0:
+            process_len = num_samples * 2
+            data_to_process = buffer[:process_len]
+            buffer = buffer[process_len:]
+            yield np.frombuffer(data_to_process, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def framer_decode(chunks, output_dtype="float32"):
+    """新实现：环形缓冲区分帧，每帧只分配一次输出数组"""
+    framer = PcmFramer(SAMPLE_RATE, frame_ms=20, output_dtype=output_dtype)
+    for chunk in chunks:
+        yield from framer.feed(chunk)
+    frame = framer.flush()
+    if frame is not None:
+        yield frame
+
+
+def make_chunks(seed=0):
+    """生成随机大小的网络块，总时长为 AUDIO_SECONDS 秒"""
+    rng = random.Random(seed)
+    raw = np.random.default_rng(seed).integers(-32768, 32767, SAMPLE_RATE * AUDIO_SECONDS, dtype=np.int16).tobytes()
+    chunks, offset = [], 0
+    while offset < len(raw):
+        size = rng.randint(1, 8192)
+        chunks.append(raw[offset:offset + size])
+        offset += size
+    return chunks
+
+
+def measure_cpu(decode, chunks):
+    """返回每秒音频的CPU耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.process_time()
+        for _ in decode(chunks):
+            pass
+        best = min(best, time.process_time() - start)
+    return best * 1000 / AUDIO_SECONDS
+
+
+def measure_allocations(decode, chunks):
+    """返回每秒音频的临时分配字节数（各网络块处理期间内存峰值之和）和输出的数组个数"""
+    tracemalloc.start()
+    total, outputs = 0, 0
+    iterator = decode(iter(chunks))
+    try:
+        while True:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                next(iterator)
+            except StopIteration:
+                break
+            outputs += 1
+            total += tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return total / AUDIO_SECONDS, outputs
+
+
+def main():
+    chunks = make_chunks()
+    cases = [
+        ("旧实现 float32", legacy_decode),
+        ("PcmFramer float32", framer_decode),
+        ("PcmFramer int16", lambda c: framer_decode(c, "int16")),
+    ]
+    print(f"网络块数: {len(chunks)}, 音频时长: {AUDIO_SECONDS} 秒")
+    print(f"{'实现':<20} {'CPU毫秒/秒音频':>16} {'临时分配KB/秒音频':>20} {'输出数组数':>10}")
+    for name, decode in cases:
+        cpu = measure_cpu(decode, chunks)
+        allocated, outputs = measure_allocations(decode, chunks)
+        print(f"{name:<20} {cpu:>16.3f} {allocated / 1024:>20.1f} {outputs:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+段落重排缓冲区微基准
+模拟4个TTS线程并发、交错写入音频块，测量不同段落数量下每个音频块的平均处理开销
+
+运行方式（在 service/webrtc 目录下）:
+    python -m bench.reorder_buffer_bench
+"""
+
+import time
+
+from utils.segment_utils import SegmentReorderBuffer
+
+SEGMENT_COUNTS = (5, 50, 500)
+CHUNKS_PER_SEGMENT = 25
+TTS_WORKERS = 4
+REPEAT = 5
+
+
+def _arrival_order(segment_count):
+    """生成音频块到达顺序：同一时刻最多有 TTS_WORKERS 个段落在交错产生音频块"""
+    order = []
+    for window_start in range(0, segment_count, TTS_WORKERS):
+        window = range(window_start, min(window_start + TTS_WORKERS, segment_count))
+        for chunk_index in range(CHUNKS_PER_SEGMENT):
+            for seq in reversed(window):  # 故意让后面的段落先到，制造需要重排的情况
+                order.append((seq, chunk_index))
+    return order
+
+
+def run_once(segment_count):
+    """运行一次完整的写入、结束和输出流程，返回每个音频块的平均耗时（纳秒）"""
+    arrivals = _arrival_order(segment_count)
+    remaining = {seq: CHUNKS_PER_SEGMENT for seq in range(segment_count)}
+    buffer = SegmentReorderBuffer()
+    for _ in range(segment_count):
+        buffer.open_segment()
+
+    output_count = 0
+    start = time.perf_counter_ns()
+    for seq, chunk_index in arrivals:
+        buffer.push(seq, chunk_index)
+        remaining[seq] -= 1
+        if remaining[seq] == 0:
+            buffer.close(seq)
+        for _ in buffer.pop_ready():
+            output_count += 1
+    elapsed = time.perf_counter_ns() - start
+
+    assert output_count == len(arrivals), "音频块数量不一致"
+    return elapsed / len(arrivals)
+
+
+def main():
+    print(f"{'段落数':>8} {'音频块数':>10} {'ns/音频块':>12}")
+    for segment_count in SEGMENT_COUNTS:
+        best = min(run_once(segment_count) for _ in range(REPEAT))
+        print(f"{segment_count:>8} {segment_count * CHUNKS_PER_SEGMENT:>10} {best:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+增量分段器等价性检查
+把同一段文本随机切成LLM的token序列，分别交给 StreamingSegmenter 和原来的做法
+（每个token后对累积文本调用 split_text_by_punctuation，保留最后一段继续累积），
+比较输出的段落和 flush 得到的剩余文本，覆盖 first_segment_min_length 首段提前输出模式。
+语料包括录制的中日英回复和随机生成的标点密集文本，任何一例不一致时以非零状态退出
+
+运行方式（在 service/webrtc 目录下）:
+    python -m bench.segmenter_equivalence_check --cases 200000
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from utils.segment_utils import PUNCTUATION_CHARS, StreamingSegmenter, split_text_by_punctuation
+
+# 录制的回复
+RECORDED_REPLIES = [
+    "你好，我是牧濑红莉栖。今天的实验结果非常有意思，我们发现了时间跳跃的新证据！你要不要一起来看看？不过别叫我克里斯蒂娜。",
+    "嗯……这个问题嘛，从物理学的角度来说，时间旅行需要满足很多条件；首先是能量，其次是因果律。你明白吗？",
+    "哈？你在说什么傻话。我才没有担心你呢！只是……只是觉得你一个人做实验太危险了。",
+    "好的。",
+    "それは興味深い質問ですね。でも、答えはそんなに簡単じゃありません！まずは仮説を立てて、実験で確かめましょう。",
+    "ありがとう。でも、私は天才少女なんかじゃないわ。ただの研究者よ？",
+    "Well, that's an interesting hypothesis. However, we need more data before drawing any conclusions! Let's run the experiment again, shall we?",
+    "I'm not your assistant, you know. But fine, I'll help you this time; just don't get used to it.",
+    "OK.",
+    "今天的数据：温度23.5度，湿度60%, 一切正常. Next step: 校准传感器!然后记录结果。",
+    "  前面有空格，，，连续的标点！！！还有结尾没有标点的句子",
+    "",
+]
+
+# 随机文本的字符表：汉字、假名、英文、数字、空白和全部分段标点，标点比例较高以制造各种边界情况
+_RANDOM_ALPHABET = "你好我是实验时间的了。" + "あいうえおです" + "abcXYZ 123" + " \n\t" + PUNCTUATION_CHARS * 3
+
+MIN_SEGMENT_LENGTHS = (0, 1, 2, 5, 15)
+FIRST_SEGMENT_MIN_LENGTHS = (None, 0, 1, 3, 8)
+
+
+def reference_segments(tokens, min_segment_length, first_segment_min_length=None):
+    """
+    原来的分段做法：每个token后对整个缓冲区重新分段
+
+    返回:
+        tuple: (输出的段落列表, 剩余的缓冲区)
+    """
+    buffer = ""
+    segments = []
+    for token in tokens:
+        buffer += token
+        min_length = first_segment_min_length if first_segment_min_length is not None and not segments else min_segment_length
+        split = split_text_by_punctuation(buffer, min_length)
+        if len(split) > 1:
+            buffer = split[-1]
+            segments.extend(split[:-1])
+    return segments, buffer
+
+
+def streaming_segments(tokens, min_segment_length, first_segment_min_length=None):
+    """增量分段器的结果，格式与 reference_segments 相同"""
+    segmenter = StreamingSegmenter(min_segment_length, first_segment_min_length)
+    segments = []
+    for token in tokens:
+        segments.extend(segmenter.feed(token))
+    return segments, segmenter.flush()
+
+
+def random_tokens(rng, text):
+    """把文本随机切成1到6个字符的token"""
+    tokens = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 6)
+        tokens.append(text[position:position + size])
+        position += size
+    return tokens
+
+
+def random_text(rng):
+    return "".join(rng.choice(_RANDOM_ALPHABET) for _ in range(rng.randint(0, 80)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查增量分段器与 split_text_by_punctuation 的分段结果是否一致")
+    parser.add_argument("--cases", type=int, default=20000, help="随机文本的检查次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    checked = 0
+    mismatches = 0
+
+    def check(text, min_segment_length, first_segment_min_length):
+        nonlocal checked, mismatches
+        tokens = random_tokens(rng, text)
+        expected = reference_segments(tokens, min_segment_length, first_segment_min_length)
+        actual = streaming_segments(tokens, min_segment_length, first_segment_min_length)
+        checked += 1
+        if actual != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"不一致: min={min_segment_length} first={first_segment_min_length} tokens={tokens!r}")
+                print(f"    原做法:   {expected!r}")
+                print(f"    增量分段: {actual!r}")
+
+    # 录制的回复：每种最小长度组合都用多种随机切分检查
+    for text in RECORDED_REPLIES:
+        for min_segment_length in MIN_SEGMENT_LENGTHS:
+            for first_segment_min_length in FIRST_SEGMENT_MIN_LENGTHS:
+                for _ in range(20):
+                    check(text, min_segment_length, first_segment_min_length)
+    # 随机文本
+    for _ in range(args.cases):
+        check(random_text(rng), rng.choice(MIN_SEGMENT_LENGTHS), rng.choice(FIRST_SEGMENT_MIN_LENGTHS))
+
+    print(f"检查 {checked} 例，不一致 {mismatches} 例，耗时 {time.perf_counter() - start:.1f} 秒")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+多轮对话并发检查
+用模拟的LLM流和TTS让多轮 process_llm_stream 同时运行，检查每轮的输出：
+    - 只包含本轮的音频块，没有其他轮次串入的音频
+    - 每个段落的音频块连续、按顺序输出
+    - 段落音频的顺序与 llm_stream 文本事件的顺序一致
+同时检查线程池TTS（text_to_speech_stream）和共享事件循环中的异步TTS（text_to_speech_stream_async）两种方式，
+任何一轮不满足时以非零状态退出
+
+运行方式（在 service/webrtc 目录下）:
+    python -m bench.stream_concurrency_check --turns 40 --workers 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from fastrtc import AdditionalOutputs
+
+from utils.stream_utils import process_llm_stream
+
+REPLY_TEMPLATE = "第{turn}轮：你好，我是牧濑红莉栖。今天的实验结果非常有意思，我们发现了时间跳跃的新证据！你要不要一起来看看？不过别叫我克里斯蒂娜。"
+
+# 模拟TTS的音频块只携带编号，编号 -> 段落文本
+_segment_texts = {}
+_segment_ids = itertools.count()
+_segment_lock = threading.Lock()
+
+
+def _register_segment(text):
+    with _segment_lock:
+        segment_id = next(_segment_ids)
+        _segment_texts[segment_id] = text
+    return segment_id
+
+
+def _chunk(turn, segment_id, index, count):
+    """音频块内容为 (轮次, 段落编号, 块序号, 块总数)，用于检查归属和顺序"""
+    return 16000, np.array([turn, segment_id, index, count], dtype=np.float32)
+
+
+def fake_ai_stream(client, messages, model=None, max_tokens=None, max_context_length=None):
+    """按3个字符一片输出本轮的回复，片段之间随机等待"""
+    reply = REPLY_TEMPLATE.format(turn=messages[0]["turn"])
+    full = ""
+    for i in range(0, len(reply), 3):
+        time.sleep(random.uniform(0, 0.01))
+        full += reply[i:i + 3]
+        yield reply[i:i + 3], full
+
+
+def fake_tts(text, voice=None):
+    segment_id = _register_segment(text)
+    count = len(text)
+    for index in range(count):
+        time.sleep(random.uniform(0, 0.005))
+        yield _chunk(voice, segment_id, index, count)
+
+
+async def fake_tts_async(text, voice=None):
+    segment_id = _register_segment(text)
+    count = len(text)
+    for index in range(count):
+        await asyncio.sleep(random.uniform(0, 0.005))
+        yield _chunk(voice, segment_id, index, count)
+
+
+def run_turn(turn, use_async_tts):
+    """运行一轮对话，返回 (llm_stream 文本列表, 音频块内容列表)"""
+    stream_texts = []
+    chunks = []
+    tts_kwargs = {"text_to_speech_stream_async": fake_tts_async} if use_async_tts else {"text_to_speech_stream": fake_tts}
+    for item in process_llm_stream(
+        None, [{"role": "system", "content": "", "turn": turn}], "fake-model", {"voice": turn},
+        ai_stream=fake_ai_stream, **tts_kwargs
+    ):
+        if isinstance(item, AdditionalOutputs):
+            event = json.loads(item.args[0])
+            if event.get("type") == "llm_stream":
+                stream_texts.append(event["data"])
+        elif not isinstance(item, str):
+            chunks.append(tuple(int(value) for value in np.asarray(item[1]).reshape(-1)[:4]))
+    return stream_texts, chunks
+
+
+def check_turn(turn, stream_texts, chunks):
+    """
+    检查一轮的输出
+
+    返回:
+        list: 发现的问题，为空表示通过
+    """
+    problems = []
+    leaked = [chunk for chunk in chunks if chunk[0] != turn]
+    if leaked:
+        problems.append(f"串入了其他轮次的 {len(leaked)} 个音频块，例如 {leaked[0]}")
+        return problems
+    audio_segments = []
+    expected_index = 0
+    for _, segment_id, index, count in chunks:
+        if index != expected_index:
+            problems.append(f"段落 {segment_id} 的音频块顺序错误：期望第 {expected_index} 块，收到第 {index} 块")
+            return problems
+        if index == 0:
+            audio_segments.append(segment_id)
+        expected_index = (index + 1) % count
+    if expected_index != 0:
+        problems.append("最后一个段落的音频不完整")
+    audio_texts = [_segment_texts[segment_id] for segment_id in audio_segments]
+    if audio_texts != stream_texts:
+        problems.append(f"音频段落顺序与文本事件不一致：音频 {audio_texts}，文本 {stream_texts}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查多轮并发对话的音频归属和段落顺序")
+    parser.add_argument("--turns", type=int, default=40, help="每种TTS方式运行的对话轮数")
+    parser.add_argument("--workers", type=int, default=20, help="同时进行的对话轮数")
+    parser.add_argument("--seed", type=int, default=0, help="随机等待时间的种子")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    failed = False
+    for use_async_tts in (False, True):
+        mode = "异步TTS" if use_async_tts else "线程池TTS"
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.workers) as executor:
+            results = list(executor.map(lambda turn: run_turn(turn, use_async_tts), range(args.turns)))
+        for turn, (stream_texts, chunks) in enumerate(results):
+            for problem in check_turn(turn, stream_texts, chunks):
+                failed = True
+                print(f"[{mode}] 第 {turn} 轮: {problem}")
+        chunk_count = sum(len(chunks) for _, chunks in results)
+        print(f"[{mode}] {args.turns} 轮（并发 {args.workers}），共 {chunk_count} 个音频块，耗时 {time.perf_counter() - start:.2f} 秒")
+    print("检查失败" if failed else "检查通过")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
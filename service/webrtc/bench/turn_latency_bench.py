@@ -0,0 +1,121 @@
+"""
+端到端对话延迟基准
+启动本地模拟服务，用录制好的WAV文件驱动 echo（以及开场的 start_up），统计每轮对话各阶段的延迟：
+    stt          Whisper返回转录结果
+    first_token  LLM输出第一个token
+    first_segment 第一段文本发送给前端
+    first_audio  第一个音频块输出
+    total        整轮对话结束
+所有时间都从调用 echo/start_up 开始计算，不需要网络和真实API密钥
+
+运行方式（在 service/webrtc 目录下）:
+    python -m bench.turn_latency_bench recordings/*.wav --profile typical --repeat 3
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+import wave
+
+import numpy as np
+
+from fakes import FakeProviders, PROFILES
+
+METRICS = ("stt", "first_token", "first_segment", "first_audio", "total")
+
+
+def load_wav(path):
+    """读取WAV文件，返回 ReplyOnPause 交给 echo 的格式：(采样率, 形状为 (1, 样本数) 的int16数组)"""
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getsampwidth() != 2:
+            raise ValueError(f"只支持16位PCM的WAV文件: {path}")
+        channels = wav_file.getnchannels()
+        sample_rate = wav_file.getframerate()
+        samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return sample_rate, samples.reshape(1, -1)
+
+
+def run_turn(generator, recorder, additional_outputs_type):
+    """
+    消费一轮对话的全部输出并记录各阶段的时间
+
+    返回:
+        dict: 阶段名 -> 距开始的秒数，未发生的阶段为None
+    """
+    start = time.perf_counter()
+    timings = dict.fromkeys(METRICS)
+    for item in generator:
+        elapsed = time.perf_counter() - start
+        if isinstance(item, additional_outputs_type):
+            event = json.loads(item.args[0])
+            if event.get("type") == "llm_stream" and timings["first_segment"] is None:
+                timings["first_segment"] = elapsed
+        elif not isinstance(item, str) and timings["first_audio"] is None:
+            timings["first_audio"] = elapsed
+    timings["total"] = time.perf_counter() - start
+    for metric, provider, event in (("stt", "whisper", "response"), ("first_token", "llm", "first_token")):
+        timestamp = recorder.first(provider, event, after=start)
+        timings[metric] = timestamp - start if timestamp is not None else None
+    return timings
+
+
+def _median(values):
+    values = sorted(value for value in values if value is not None)
+    return values[len(values) // 2] if values else None
+
+
+def _format(value):
+    return f"{value * 1000:>10.0f}" if value is not None else f"{'-':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="使用本地模拟服务测量端到端对话延迟")
+    parser.add_argument("wav_files", nargs="+", help="用户语音的WAV文件（16位PCM）")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical", help="模拟服务的延迟配置")
+    parser.add_argument("--repeat", type=int, default=1, help="每个WAV文件重复的轮数")
+    parser.add_argument("--skip-startup", action="store_true", help="不测量开场的 start_up")
+    args = parser.parse_args()
+
+    recordings = [(os.path.basename(path), load_wav(path)) for path in args.wav_files]
+
+    providers = FakeProviders(args.profile).start()
+    # 服务端在导入时读取环境变量，必须先指向模拟服务；关闭TTS缓存和预生成，使每轮都完整走一遍合成流程
+    os.environ.update(providers.environment())
+    os.environ.update({
+        "TTS_CACHE_MEMORY_MB": "0",
+        "TTS_CACHE_DISK_MB": "0",
+        "PROACTIVE_PREGENERATION": "false",
+    })
+    import server
+    from fastrtc import AdditionalOutputs
+    from routes import InputData
+
+    webrtc_id = f"bench-{uuid.uuid4().hex[:8]}"
+    input_data = InputData(webrtc_id=webrtc_id)
+    results = []
+    try:
+        if not args.skip_startup:
+            results.append(("start_up", run_turn(server.start_up(webrtc_id), providers.recorder, AdditionalOutputs)))
+        for _ in range(args.repeat):
+            for name, audio in recordings:
+                results.append((name, run_turn(server.echo(audio, "", input_data), providers.recorder, AdditionalOutputs)))
+    finally:
+        providers.stop()
+
+    print(f"延迟配置: {args.profile}（单位: 毫秒）")
+    print(f"{'轮次':<24}" + "".join(f"{metric:>14}" for metric in METRICS))
+    for name, timings in results:
+        print(f"{name[:24]:<24}" + "".join(f"{_format(timings[metric]):>14}" for metric in METRICS))
+    echo_results = [timings for name, timings in results if name != "start_up"]
+    if echo_results:
+        print(f"{'echo p50':<24}" + "".join(
+            f"{_format(_median([timings[metric] for timings in echo_results])):>14}" for metric in METRICS
+        ))
+
+
+if __name__ == "__main__":
+    main()
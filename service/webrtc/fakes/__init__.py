@@ -0,0 +1,10 @@
+"""
+本地模拟服务模块
+在本机模拟LLM、Whisper、SiliconFlow语音合成和mem0记忆服务，不需要网络和真实API密钥即可运行整个对话流程
+"""
+
+from .profiles import LatencyProfile, PROFILES
+from .recorder import EventRecorder
+from .runner import FakeProviders
+
+__all__ = ['LatencyProfile', 'PROFILES', 'EventRecorder', 'FakeProviders']
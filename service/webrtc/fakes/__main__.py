@@ -0,0 +1,34 @@
+"""
+单独启动模拟服务，供本地手动调试服务端
+
+运行方式（在 service/webrtc 目录下）:
+    python -m fakes --profile typical --base-port 18000
+然后按输出设置环境变量后启动 server.py
+"""
+
+import argparse
+import time
+
+from .profiles import PROFILES
+from .runner import FakeProviders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动本地模拟的LLM、Whisper、SiliconFlow和mem0服务")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical", help="延迟配置")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--base-port", type=int, default=18000, help="第一个服务的端口，其余服务依次加一")
+    args = parser.parse_args()
+
+    with FakeProviders(args.profile, host=args.host, base_port=args.base_port) as providers:
+        for name, value in providers.environment().items():
+            print(f"export {name}={value}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
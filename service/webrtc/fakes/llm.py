@@ -0,0 +1,115 @@
+"""
+模拟的OpenAI兼容聊天接口
+支持流式（SSE）和非流式响应，带 json_schema 格式要求的请求返回符合schema的JSON
+"""
+
+import json
+import re
+import time
+import uuid
+
+from aiohttp import web
+
+DEFAULT_REPLY = "哼，你终于来了。今天的实验数据整理好了吗？我可不是在等你，只是刚好有空而已。说吧，你想聊什么？"
+
+# 英文单词、数字和空白各自作为一个token，其他字符（中日文、标点）每个字符作为一个token
+_TOKEN_PATTERN = re.compile(r"\s+|[A-Za-z]+|\d+|.", re.DOTALL)
+
+
+def split_tokens(text):
+    """把文本切分成模拟的token"""
+    return _TOKEN_PATTERN.findall(text)
+
+
+def _sample_from_schema(schema):
+    """按JSON schema生成一个最简单的合法值"""
+    if "enum" in schema:
+        return schema["enum"][0]
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        properties = schema.get("properties", {})
+        return {key: _sample_from_schema(properties.get(key, {})) for key in schema.get("required", properties)}
+    if schema_type == "array":
+        return []
+    if schema_type in ("integer", "number"):
+        return 0
+    if schema_type == "boolean":
+        return False
+    return "模拟内容"
+
+
+def _completion_text(payload, reply):
+    """非流式请求的回复内容"""
+    response_format = payload.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format.get("json_schema", {}).get("schema", {})
+        return json.dumps(_sample_from_schema(schema), ensure_ascii=False)
+    messages = payload.get("messages") or []
+    last_content = messages[-1].get("content", "") if messages else ""
+    if isinstance(last_content, str) and "翻译" in last_content and "\n\n" in last_content:
+        # 翻译请求：原样返回待翻译的文本
+        return last_content.split("\n\n", 1)[1]
+    return reply
+
+
+def _chunk(completion_id, model, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def add_routes(app, profile, recorder, reply=DEFAULT_REPLY):
+    """
+    注册聊天接口
+
+    参数:
+        app (aiohttp.web.Application): 模拟服务应用
+        profile (LatencyProfile): 延迟配置
+        recorder (EventRecorder): 事件记录
+        reply (str): 对话请求的回复文本
+    """
+
+    async def chat_completions(request):
+        payload = await request.json()
+        model = payload.get("model", "fake-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        stream = bool(payload.get("stream"))
+        recorder.record("llm", "stream_request" if stream else "request")
+        await profile.wait(profile.llm_first_token)
+
+        if not stream:
+            content = _completion_text(payload, reply)
+            recorder.record("llm", "response")
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(split_tokens(content)), "total_tokens": 0},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(data):
+            await response.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        await send(_chunk(completion_id, model, {"role": "assistant", "content": ""}))
+        for index, token in enumerate(split_tokens(reply)):
+            if index and profile.llm_tokens_per_second > 0:
+                await profile.wait(1 / profile.llm_tokens_per_second)
+            await send(_chunk(completion_id, model, {"content": token}))
+            if index == 0:
+                recorder.record("llm", "first_token")
+        await send(_chunk(completion_id, model, {}, finish_reason="stop"))
+        await response.write(b"data: [DONE]\n\n")
+        recorder.record("llm", "stream_done")
+        await response.write_eof()
+        return response
+
+    app.router.add_post("/v1/chat/completions", chat_completions)
@@ -0,0 +1,75 @@
+"""
+模拟的mem0记忆服务接口
+记忆保存在内存中，搜索时按与查询共有的字符数排序
+"""
+
+import uuid
+
+from aiohttp import web
+
+
+def _message_text(messages):
+    """把对话消息拼接成一条记忆文本"""
+    if isinstance(messages, str):
+        return messages
+    return " ".join(str(message.get("content", "")) for message in messages if isinstance(message, dict))
+
+
+def add_routes(app, profile, recorder):
+    """
+    注册记忆服务接口
+
+    参数:
+        app (aiohttp.web.Application): 模拟服务应用
+        profile (LatencyProfile): 延迟配置
+        recorder (EventRecorder): 事件记录
+    """
+    memories = {}  # 用户ID -> [记忆]
+
+    async def ping(request):
+        return web.json_response({
+            "status": "ok",
+            "org_id": "fake-org",
+            "project_id": "fake-project",
+            "user_email": "fake@localhost",
+        })
+
+    async def add(request):
+        payload = await request.json()
+        recorder.record("mem0", "add")
+        await profile.wait(profile.mem0_add_seconds)
+        user_id = payload.get("user_id", "")
+        memory = {
+            "id": uuid.uuid4().hex,
+            "memory": _message_text(payload.get("messages", [])),
+            "user_id": user_id,
+        }
+        memories.setdefault(user_id, []).append(memory)
+        return web.json_response([{"id": memory["id"], "event": "ADD", "data": {"memory": memory["memory"]}}])
+
+    async def search(request):
+        payload = await request.json()
+        recorder.record("mem0", "search")
+        await profile.wait(profile.mem0_search_seconds)
+        user_id = payload.get("user_id") or (payload.get("filters") or {}).get("user_id", "")
+        query = set(payload.get("query", ""))
+        limit = int(payload.get("limit") or payload.get("top_k") or 10)
+        ranked = sorted(
+            memories.get(user_id, []),
+            key=lambda memory: len(query & set(memory["memory"])),
+            reverse=True
+        )
+        results = [dict(memory, score=len(query & set(memory["memory"])) / max(len(query), 1)) for memory in ranked[:limit]]
+        recorder.record("mem0", "search_done")
+        return web.json_response(results)
+
+    async def get_all(request):
+        recorder.record("mem0", "get_all")
+        await profile.wait(profile.mem0_search_seconds)
+        return web.json_response(memories.get(request.query.get("user_id", ""), []))
+
+    app.router.add_get("/v1/ping/", ping)
+    app.router.add_get("/v1/memories/", get_all)
+    app.router.add_post("/v1/memories/", add)
+    app.router.add_post("/v1/memories/search/", search)
+    app.router.add_post("/v2/memories/search/", search)
@@ -0,0 +1,89 @@
+"""
+模拟服务的延迟配置
+"""
+
+import asyncio
+import random
+
+
+class LatencyProfile:
+    """
+    模拟服务的延迟和速率配置
+
+    所有时长单位为秒；jitter 为随机抖动比例，例如 0.2 表示每次等待在 ±20% 范围内随机变化
+    """
+
+    def __init__(
+        self,
+        name,
+        llm_first_token=0.0,
+        llm_tokens_per_second=0.0,
+        stt_seconds=0.0,
+        stt_seconds_per_mb=0.0,
+        tts_first_byte=0.0,
+        tts_realtime_factor=0.0,
+        mem0_search_seconds=0.0,
+        mem0_add_seconds=0.0,
+        jitter=0.0,
+    ):
+        """
+        参数:
+            name (str): 配置名称
+            llm_first_token (float): LLM从收到请求到输出第一个token的时间
+            llm_tokens_per_second (float): LLM每秒输出的token数，0表示不限速
+            stt_seconds (float): Whisper处理一次请求的固定时间
+            stt_seconds_per_mb (float): 上传音频每MB额外增加的时间，模拟上传带宽
+            tts_first_byte (float): 语音合成从收到请求到输出第一个字节的时间
+            tts_realtime_factor (float): 语音合成的速度是实时播放的多少倍，0表示不限速
+            mem0_search_seconds (float): 记忆搜索的时间
+            mem0_add_seconds (float): 添加记忆的时间
+            jitter (float): 随机抖动比例
+        """
+        self.name = name
+        self.llm_first_token = llm_first_token
+        self.llm_tokens_per_second = llm_tokens_per_second
+        self.stt_seconds = stt_seconds
+        self.stt_seconds_per_mb = stt_seconds_per_mb
+        self.tts_first_byte = tts_first_byte
+        self.tts_realtime_factor = tts_realtime_factor
+        self.mem0_search_seconds = mem0_search_seconds
+        self.mem0_add_seconds = mem0_add_seconds
+        self.jitter = jitter
+
+    async def wait(self, seconds):
+        """按配置的抖动等待指定时间"""
+        if seconds <= 0:
+            return
+        if self.jitter:
+            seconds *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        await asyncio.sleep(seconds)
+
+
+# 预设配置：instant 用于只测量本地处理开销，typical 和 slow 大致对应正常和较差网络下的云服务
+PROFILES = {
+    "instant": LatencyProfile("instant"),
+    "typical": LatencyProfile(
+        "typical",
+        llm_first_token=0.45,
+        llm_tokens_per_second=60,
+        stt_seconds=0.35,
+        stt_seconds_per_mb=0.4,
+        tts_first_byte=0.3,
+        tts_realtime_factor=4,
+        mem0_search_seconds=0.25,
+        mem0_add_seconds=0.4,
+        jitter=0.2,
+    ),
+    "slow": LatencyProfile(
+        "slow",
+        llm_first_token=1.2,
+        llm_tokens_per_second=25,
+        stt_seconds=0.9,
+        stt_seconds_per_mb=2.0,
+        tts_first_byte=0.8,
+        tts_realtime_factor=1.5,
+        mem0_search_seconds=0.8,
+        mem0_add_seconds=1.0,
+        jitter=0.3,
+    ),
+}
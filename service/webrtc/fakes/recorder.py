@@ -0,0 +1,47 @@
+"""
+模拟服务的事件记录
+"""
+
+import threading
+import time
+
+
+class EventRecorder:
+    """
+    记录模拟服务处理请求过程中的事件及时间
+
+    时间使用 time.perf_counter，与基准脚本在同一进程中可以直接比较
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []  # [(时间, 服务, 事件)]
+
+    def record(self, provider, event):
+        with self._lock:
+            self._events.append((time.perf_counter(), provider, event))
+
+    def first(self, provider, event, after=0.0):
+        """
+        获取某个时间之后第一次发生的事件时间
+
+        返回:
+            float: 事件时间，没有发生时返回None
+        """
+        with self._lock:
+            for timestamp, event_provider, event_name in self._events:
+                if timestamp >= after and event_provider == provider and event_name == event:
+                    return timestamp
+        return None
+
+    def count(self, provider, event, after=0.0):
+        """统计某个时间之后某事件发生的次数"""
+        with self._lock:
+            return sum(
+                1 for timestamp, event_provider, event_name in self._events
+                if timestamp >= after and event_provider == provider and event_name == event
+            )
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
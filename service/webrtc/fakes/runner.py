@@ -0,0 +1,142 @@
+"""
+模拟服务运行器
+在后台线程的事件循环中启动四个模拟服务，每个服务使用单独的端口
+"""
+
+import asyncio
+import logging
+import socket
+import threading
+
+from aiohttp import web
+
+from . import llm, mem0, siliconflow, whisper
+from .profiles import PROFILES, LatencyProfile
+from .recorder import EventRecorder
+
+PROVIDERS = ("llm", "whisper", "siliconflow", "mem0")
+
+
+class FakeProviders:
+    """
+    本地模拟的LLM、Whisper、SiliconFlow和mem0服务
+
+    用法:
+        with FakeProviders("typical") as providers:
+            os.environ.update(providers.environment())
+            ...
+    """
+
+    def __init__(self, profile="typical", host="127.0.0.1", base_port=0, reply=llm.DEFAULT_REPLY, transcript=whisper.DEFAULT_TRANSCRIPT):
+        """
+        参数:
+            profile (str | LatencyProfile): 延迟配置或预设配置的名称
+            host (str): 监听地址
+            base_port (int): 第一个服务的端口，其余服务依次加一；为0时由系统分配空闲端口
+            reply (str): 模拟LLM的对话回复
+            transcript (str): 模拟Whisper的转录结果
+        """
+        self.profile = profile if isinstance(profile, LatencyProfile) else PROFILES[profile]
+        self.host = host
+        self.base_port = base_port
+        self.reply = reply
+        self.transcript = transcript
+        self.recorder = EventRecorder()
+        self.ports = {}
+        self._loop = None
+        self._thread = None
+        self._runners = []
+
+    def _create_app(self, provider):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        if provider == "llm":
+            llm.add_routes(app, self.profile, self.recorder, reply=self.reply)
+        elif provider == "whisper":
+            whisper.add_routes(app, self.profile, self.recorder, transcript=self.transcript)
+        elif provider == "siliconflow":
+            siliconflow.add_routes(app, self.profile, self.recorder)
+        else:
+            mem0.add_routes(app, self.profile, self.recorder)
+        return app
+
+    async def _start_sites(self):
+        for index, provider in enumerate(PROVIDERS):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((self.host, self.base_port + index if self.base_port else 0))
+            runner = web.AppRunner(self._create_app(provider), access_log=None)
+            await runner.setup()
+            await web.SockSite(runner, sock).start()
+            self._runners.append(runner)
+            self.ports[provider] = sock.getsockname()[1]
+
+    def start(self):
+        """启动全部模拟服务，返回后即可接受请求"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self._start_sites())
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                return
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fake-providers", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        logging.info(f"模拟服务已启动（{self.profile.name}）: {self.ports}")
+        return self
+
+    def stop(self):
+        """停止全部模拟服务"""
+        if self._loop is None:
+            return
+
+        async def cleanup():
+            for runner in self._runners:
+                await runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._runners = []
+
+    def url(self, provider):
+        """某个模拟服务的根地址"""
+        return f"http://{self.host}:{self.ports[provider]}"
+
+    def environment(self):
+        """
+        把服务指向模拟服务所需的环境变量，需要在导入 server 之前设置
+
+        返回:
+            dict: 环境变量名 -> 值
+        """
+        return {
+            "LLM_API_KEY": "fake-llm-key",
+            "LLM_BASE_URL": f"{self.url('llm')}/v1",
+            "AI_MODEL": "fake-model",
+            "WHISPER_API_KEY": "fake-whisper-key",
+            "WHISPER_BASE_URL": f"{self.url('whisper')}/v1",
+            "SILICONFLOW_API_KEY": "fake-siliconflow-key",
+            "SILICONFLOW_BASE_URL": f"{self.url('siliconflow')}/v1",
+            "SILICONFLOW_VOICE": "fake-voice",
+            "MEM0_API_KEY": "fake-mem0-key",
+            "MEM0_HOST": self.url("mem0"),
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
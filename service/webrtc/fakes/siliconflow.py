@@ -0,0 +1,57 @@
+"""
+模拟的SiliconFlow语音合成接口
+按文本长度生成对应时长的PCM音频（s16le，单声道），按配置的速度分块流式输出
+"""
+
+import numpy as np
+from aiohttp import web
+
+# 每个字符对应的音频时长（秒），大致是中文正常语速
+SECONDS_PER_CHARACTER = 0.2
+# 每次写出的音频时长（秒）
+CHUNK_SECONDS = 0.1
+
+
+def synthesize(text, sample_rate):
+    """
+    生成模拟语音：音量较小的正弦音，时长与文本长度成正比
+
+    返回:
+        bytes: s16le 格式的PCM数据
+    """
+    duration = max(len(text.strip()), 1) * SECONDS_PER_CHARACTER
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    return (np.sin(2 * np.pi * 220 * t) * 3000).astype("<i2").tobytes()
+
+
+def add_routes(app, profile, recorder):
+    """
+    注册语音合成接口
+
+    参数:
+        app (aiohttp.web.Application): 模拟服务应用
+        profile (LatencyProfile): 延迟配置
+        recorder (EventRecorder): 事件记录
+    """
+
+    async def speech(request):
+        payload = await request.json()
+        recorder.record("siliconflow", "request")
+        sample_rate = int(payload.get("sample_rate", 32000))
+        pcm = synthesize(payload.get("input", ""), sample_rate)
+        await profile.wait(profile.tts_first_byte)
+
+        response = web.StreamResponse(headers={"Content-Type": "audio/pcm"})
+        await response.prepare(request)
+        chunk_bytes = int(sample_rate * CHUNK_SECONDS) * 2
+        for offset in range(0, len(pcm), chunk_bytes):
+            if offset and profile.tts_realtime_factor > 0:
+                await profile.wait(CHUNK_SECONDS / profile.tts_realtime_factor)
+            await response.write(pcm[offset:offset + chunk_bytes])
+            if offset == 0:
+                recorder.record("siliconflow", "first_byte")
+        recorder.record("siliconflow", "response")
+        await response.write_eof()
+        return response
+
+    app.router.add_post("/v1/audio/speech", speech)
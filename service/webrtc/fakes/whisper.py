@@ -0,0 +1,32 @@
+"""
+模拟的OpenAI兼容语音识别接口
+"""
+
+from aiohttp import web
+
+DEFAULT_TRANSCRIPT = "你好，今天的实验进展得怎么样？"
+
+
+def add_routes(app, profile, recorder, transcript=DEFAULT_TRANSCRIPT):
+    """
+    注册语音识别接口
+
+    参数:
+        app (aiohttp.web.Application): 模拟服务应用
+        profile (LatencyProfile): 延迟配置
+        recorder (EventRecorder): 事件记录
+        transcript (str): 每次请求返回的转录文本
+    """
+
+    async def transcriptions(request):
+        recorder.record("whisper", "request")
+        form = await request.post()
+        upload = form.get("file")
+        upload_bytes = len(upload.file.read()) if upload is not None and hasattr(upload, "file") else 0
+        await profile.wait(profile.stt_seconds + profile.stt_seconds_per_mb * upload_bytes / (1024 * 1024))
+        recorder.record("whisper", "response")
+        if form.get("response_format") == "text":
+            return web.Response(text=transcript)
+        return web.json_response({"text": transcript})
+
+    app.router.add_post("/v1/audio/transcriptions", transcriptions)
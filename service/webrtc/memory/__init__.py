@@ -0,0 +1,16 @@
+"""
+记忆服务模块
+提供共享的mem0客户端、后台记忆写入队列、本地记忆索引和记忆预取
+"""
+
+from .client import DEFAULT_MEM0_HOST, get_memory_client, expire_idle_memory_clients, close_all_memory_clients
+from .write_queue import enqueue_memory_add, flush_memory_writes, get_memory_write_stats
+from .local_index import get_memory_index, get_memory_index_stats, close_memory_index
+from .search import search_memories, search_remote_memories, get_memory_search_stats
+from .prefetch import start_memory_prefetch, search_memories_with_prefetch, get_memory_prefetch_stats
+
+__all__ = ['DEFAULT_MEM0_HOST', 'get_memory_client', 'expire_idle_memory_clients', 'close_all_memory_clients',
+           'enqueue_memory_add', 'flush_memory_writes', 'get_memory_write_stats',
+           'get_memory_index', 'get_memory_index_stats', 'close_memory_index',
+           'search_memories', 'search_remote_memories', 'get_memory_search_stats',
+           'start_memory_prefetch', 'search_memories_with_prefetch', 'get_memory_prefetch_stats']
@@ -0,0 +1,64 @@
+"""
+记忆服务客户端模块
+按API密钥复用mem0客户端，避免每轮对话重新创建客户端并重复校验密钥
+"""
+
+import os
+
+from dotenv import load_dotenv
+from mem0 import AsyncMemoryClient
+
+from utils.async_utils import submit_async
+from utils.client_utils import ClientRegistry
+
+# 加载环境变量
+load_dotenv()
+
+# mem0服务地址，为空时使用mem0官方地址（可指向本地模拟服务）
+DEFAULT_MEM0_HOST = os.getenv("MEM0_HOST") or None
+
+
+def _create_memory_client(host, api_key):
+    """创建mem0客户端，创建时会请求一次服务校验API密钥"""
+    return AsyncMemoryClient(api_key=api_key, host=host or None)
+
+
+def _close_memory_client(client):
+    """mem0客户端的异步HTTP客户端属于共享事件循环，关闭操作也提交到该事件循环中进行"""
+    async_client = getattr(client, "async_client", None)
+    if async_client is not None:
+        submit_async(async_client.aclose)
+
+
+_memory_clients = ClientRegistry("mem0客户端注册表", _create_memory_client, _close_memory_client)
+
+
+def get_memory_client(api_key, host=DEFAULT_MEM0_HOST):
+    """
+    获取API密钥对应的共享mem0客户端
+
+    客户端的请求必须在共享事件循环中执行（通过 run_async 或 submit_async 调用）
+
+    参数:
+        api_key (str): mem0 API 密钥
+        host (str): mem0服务地址，默认使用 MEM0_HOST
+
+    返回:
+        AsyncMemoryClient: 共享的mem0客户端
+    """
+    return _memory_clients.get((host or "", api_key or ""))
+
+
+def expire_idle_memory_clients():
+    """
+    关闭长时间未使用的mem0客户端
+
+    返回:
+        int: 被关闭的客户端数量
+    """
+    return _memory_clients.expire_idle()
+
+
+def close_all_memory_clients():
+    """关闭全部mem0客户端，在服务关闭时调用"""
+    _memory_clients.close_all()
@@ -0,0 +1,367 @@
+"""
+本地记忆索引模块
+在本地保存每个用户的记忆副本，按字符n-gram做BM25检索，搜索记忆时不必每轮都请求mem0
+
+索引只包含从mem0同步的记忆，后台定期整体刷新；写入队列把新的对话写入mem0后也会刷新，
+使mem0从中提取的记忆能在之后的对话中检索到。对话原文不加入索引，最近的对话已经在会话历史中
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter, OrderedDict
+
+from utils.async_utils import submit_async
+from utils.metrics_utils import observe_stage, register_stats
+from .client import get_memory_client
+
+# 是否使用本地记忆索引回答记忆搜索
+MEMORY_LOCAL_INDEX = os.getenv("MEMORY_LOCAL_INDEX", "true").lower() in ("1", "true", "yes")
+# 索引数据库文件
+MEMORY_INDEX_PATH = os.getenv("MEMORY_INDEX_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory_index", "memories.db"))
+# 同一用户两次从mem0刷新之间的最短间隔（秒）
+MEMORY_INDEX_REFRESH_SECONDS = float(os.getenv("MEMORY_INDEX_REFRESH_SECONDS", "300"))
+# 写入mem0成功后等待多久再刷新（秒）；mem0的写入是异步处理的，写入成功后不会马上出现在记忆列表中
+MEMORY_INDEX_WRITE_REFRESH_DELAY = float(os.getenv("MEMORY_INDEX_WRITE_REFRESH_DELAY", "5"))
+# 内存中最多缓存的用户数
+MEMORY_INDEX_CACHED_USERS = int(os.getenv("MEMORY_INDEX_CACHED_USERS", "256"))
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 拉丁字母和数字按单词切分，其他文字（中文、日文等没有空格分词的文字）按单字和相邻两字切分
+_TOKEN_RE = re.compile(r"[0-9a-zÀ-ɏ]+|[^\W0-9a-zÀ-ɏ_]+")
+_LATIN_RE = re.compile(r"[0-9a-zÀ-ɏ]+")
+
+
+def tokenize(text):
+    """
+    把文本切分为检索用的词项
+
+    参数:
+        text (str): 记忆或查询文本
+
+    返回:
+        list: 词项列表，英文等按单词，中文、日文等按单字和相邻两字
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if _LATIN_RE.fullmatch(run):
+            tokens.append(run)
+            continue
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _user_key(api_key, user_id):
+    """索引中的用户键，同一用户ID在不同的mem0账号下是不同的用户；不把API密钥原文写入磁盘"""
+    digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return f"{digest}:{user_id}"
+
+
+def parse_memory_list(result):
+    """mem0的记忆列表接口在不同版本中返回列表或 {"results": [...]}"""
+    if isinstance(result, dict):
+        result = result.get("results", [])
+    return [memory for memory in result or [] if isinstance(memory, dict) and memory.get("memory")]
+
+
+class _UserIndex:
+    """一个用户的倒排索引"""
+
+    def __init__(self, refreshed_at):
+        self.refreshed_at = refreshed_at  # 最近一次从mem0刷新的时间，从未刷新时为None
+        self.docs = {}  # 条目ID -> (文本, 来源, 加入时间, 词项数)
+        self.postings = {}  # 词项 -> {条目ID: 词频}
+        self.total_length = 0
+
+    def add(self, memory_id, text, source, created_at):
+        self.remove(memory_id)
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        self.docs[memory_id] = (text, source, created_at, length)
+        self.total_length += length
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[memory_id] = count
+
+    def remove(self, memory_id):
+        doc = self.docs.pop(memory_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc[3]
+        for term in set(tokenize(doc[0])):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(memory_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query, limit):
+        if not self.docs:
+            return []
+        doc_count = len(self.docs)
+        average_length = self.total_length / doc_count or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for memory_id, count in postings.items():
+                length = self.docs[memory_id][3]
+                norm = count + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[memory_id] = scores.get(memory_id, 0.0) + idf * count * (BM25_K1 + 1) / norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [
+            {"id": memory_id, "memory": self.docs[memory_id][0], "score": score, "source": self.docs[memory_id][1]}
+            for memory_id, score in ranked
+        ]
+
+
+class MemoryIndex:
+    """
+    按用户划分的本地记忆索引
+
+    条目保存在SQLite中，搜索时把用户的全部条目加载到内存中的倒排索引（按LRU缓存最近使用的用户）。
+    从未从mem0刷新过的用户没有可信的本地数据，search 返回None，由调用方改为请求mem0。
+    """
+
+    def __init__(self, path=MEMORY_INDEX_PATH, refresh_interval=MEMORY_INDEX_REFRESH_SECONDS,
+                 cached_users=MEMORY_INDEX_CACHED_USERS):
+        """
+        参数:
+            path (str): SQLite数据库文件，":memory:" 表示只保存在内存中
+            refresh_interval (float): 同一用户两次刷新之间的最短间隔（秒）
+            cached_users (int): 内存中最多缓存的用户数
+        """
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.cached_users = cached_users
+        self._lock = threading.RLock()
+        self._conn = None
+        self._users = OrderedDict()  # 用户键 -> _UserIndex，最近使用的在末尾
+        self._refreshing = set()
+        self._refresh_again = {}  # 刷新进行中又收到强制刷新的用户键 -> 刷新前的等待时间
+        self._stats = {"local_searches": 0, "cold_searches": 0, "refreshes": 0, "refresh_failures": 0}
+
+    def _connection(self):
+        """打开数据库并建表；调用方需持有锁"""
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS memories (
+                    user_key TEXT NOT NULL,
+                    memory_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (user_key, memory_id)
+                );
+                CREATE TABLE IF NOT EXISTS users (
+                    user_key TEXT PRIMARY KEY,
+                    refreshed_at REAL
+                );
+            """)
+            # 旧版本会把对话原文（source 为 turn）加入索引，不再使用
+            with self._conn:
+                self._conn.execute("DELETE FROM memories WHERE source != 'mem0'")
+        return self._conn
+
+    def _user(self, user_key):
+        """获取用户的内存索引，不在缓存中时从数据库加载；调用方需持有锁"""
+        index = self._users.get(user_key)
+        if index is not None:
+            self._users.move_to_end(user_key)
+            return index
+        conn = self._connection()
+        row = conn.execute("SELECT refreshed_at FROM users WHERE user_key = ?", (user_key,)).fetchone()
+        index = _UserIndex(row[0] if row else None)
+        for memory_id, text, source, created_at in conn.execute(
+            "SELECT memory_id, text, source, created_at FROM memories WHERE user_key = ?", (user_key,)
+        ):
+            index.add(memory_id, text, source, created_at)
+        self._users[user_key] = index
+        while len(self._users) > self.cached_users:
+            self._users.popitem(last=False)
+        return index
+
+    def replace_remote(self, api_key, user_id, memories, refresh_started):
+        """
+        用mem0返回的记忆替换用户的全部条目
+
+        参数:
+            api_key (str): mem0 API 密钥
+            user_id (str): 用户ID
+            memories (list): mem0返回的记忆列表
+            refresh_started (float): 开始请求mem0的时间（time.time）
+        """
+        user_key = _user_key(api_key, user_id)
+        with self._lock:
+            conn = self._connection()
+            index = self._user(user_key)
+            with conn:
+                conn.execute("DELETE FROM memories WHERE user_key = ?", (user_key,))
+                for doc_id in list(index.docs):
+                    index.remove(doc_id)
+                for memory in memories:
+                    memory_id = str(memory.get("id") or uuid.uuid4().hex)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO memories (user_key, memory_id, text, source, created_at) VALUES (?, ?, ?, 'mem0', ?)",
+                        (user_key, memory_id, memory["memory"], refresh_started)
+                    )
+                    index.add(memory_id, memory["memory"], "mem0", refresh_started)
+                conn.execute(
+                    "INSERT OR REPLACE INTO users (user_key, refreshed_at) VALUES (?, ?)", (user_key, refresh_started)
+                )
+            index.refreshed_at = refresh_started
+
+    def search(self, api_key, user_id, query, limit=3):
+        """
+        在本地索引中搜索记忆
+
+        参数:
+            api_key (str): mem0 API 密钥
+            user_id (str): 用户ID
+            query (str): 查询文本
+            limit (int): 返回的最大条数
+
+        返回:
+            list: 与mem0搜索结果相同格式的记忆列表，按相关度排序；用户从未从mem0刷新过时返回None
+        """
+        start_time = time.perf_counter()
+        try:
+            with self._lock:
+                index = self._user(_user_key(api_key, user_id))
+                if index.refreshed_at is None:
+                    self._stats["cold_searches"] += 1
+                    return None
+                results = index.search(query, limit)
+                self._stats["local_searches"] += 1
+        except sqlite3.Error as e:
+            logging.error(f"读取本地记忆索引失败: {e}")
+            return None
+        observe_stage("memory_index_search", time.perf_counter() - start_time, provider="local")
+        return results
+
+    def refresh_in_background(self, api_key, user_id, force=False, delay=0.0):
+        """
+        距上次刷新超过间隔时，在共享事件循环中从mem0拉取用户的全部记忆刷新本地索引
+
+        参数:
+            api_key (str): mem0 API 密钥
+            user_id (str): 用户ID
+            force (bool): 忽略刷新间隔；已有刷新在进行时（它可能拿不到刚写入的记忆），在其结束后再刷新一次
+            delay (float): 开始请求mem0前的等待时间（秒）
+
+        返回:
+            concurrent.futures.Future: 刷新任务；未到刷新间隔或已有刷新在进行时返回None
+        """
+        user_key = _user_key(api_key, user_id)
+        with self._lock:
+            if user_key in self._refreshing:
+                if force:
+                    self._refresh_again[user_key] = delay
+                return None
+            try:
+                refreshed_at = self._user(user_key).refreshed_at
+            except sqlite3.Error:
+                refreshed_at = None
+            if not force and refreshed_at is not None and time.time() - refreshed_at < self.refresh_interval:
+                return None
+            self._refreshing.add(user_key)
+        future = submit_async(self._refresh, api_key, user_id, delay)
+        future.add_done_callback(lambda _: self._refresh_done(api_key, user_id, user_key))
+        return future
+
+    def _refresh_done(self, api_key, user_id, user_key):
+        with self._lock:
+            self._refreshing.discard(user_key)
+            again = user_key in self._refresh_again
+            delay = self._refresh_again.pop(user_key, 0.0)
+        if again:
+            self.refresh_in_background(api_key, user_id, force=True, delay=delay)
+
+    async def _refresh(self, api_key, user_id, delay=0.0):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        refresh_started = time.time()
+        try:
+            # 首次创建客户端时会同步请求mem0校验密钥，放到线程中执行，不阻塞共享事件循环
+            client = await asyncio.to_thread(get_memory_client, api_key)
+            memories = parse_memory_list(await client.get_all(user_id=user_id))
+            await asyncio.to_thread(self.replace_remote, api_key, user_id, memories, refresh_started)
+        except Exception as e:
+            with self._lock:
+                self._stats["refresh_failures"] += 1
+            logging.warning(f"从mem0刷新用户 {user_id} 的本地记忆索引失败: {e}")
+            return
+        with self._lock:
+            self._stats["refreshes"] += 1
+        logging.info(f"已从mem0刷新用户 {user_id} 的本地记忆索引: {len(memories)} 条记忆")
+
+    def stats(self):
+        """
+        本地索引的统计信息
+
+        返回:
+            dict: 本地搜索次数、未刷新过只能请求mem0的搜索次数、刷新成功和失败次数、缓存的用户数
+        """
+        with self._lock:
+            return dict(self._stats, cached_users=len(self._users))
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._users.clear()
+
+
+_memory_index = None
+_memory_index_lock = threading.Lock()
+
+
+def get_memory_index():
+    """获取进程内共享的本地记忆索引"""
+    global _memory_index
+    with _memory_index_lock:
+        if _memory_index is None:
+            _memory_index = MemoryIndex()
+        return _memory_index
+
+
+def get_memory_index_stats():
+    """获取本地记忆索引的统计信息"""
+    return get_memory_index().stats()
+
+
+if MEMORY_LOCAL_INDEX:
+    register_stats("amadeus_memory_index", get_memory_index_stats, {
+        "local_searches": ("counter", "在本地记忆索引中完成的搜索次数"),
+        "cold_searches": ("counter", "本地索引尚未从mem0刷新、改为请求mem0的搜索次数"),
+        "refreshes": ("counter", "从mem0刷新本地索引成功的次数"),
+        "refresh_failures": ("counter", "从mem0刷新本地索引失败的次数"),
+        "cached_users": ("gauge", "内存中缓存索引的用户数"),
+    })
+
+
+def close_memory_index():
+    """关闭本地记忆索引，在服务关闭时调用"""
+    with _memory_index_lock:
+        if _memory_index is not None:
+            _memory_index.close()
@@ -0,0 +1,196 @@
+"""
+记忆预取模块
+LLM生成结束、TTS音频还在播放时，用本轮的对话内容提前搜索记忆，下一轮对话直接使用或合并预取的结果
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from utils.async_utils import submit_async
+from utils.metrics_utils import register_stats
+from .search import search_memories
+
+# 是否在每轮对话的LLM生成结束后预取下一轮的记忆
+MEMORY_PREFETCH = os.getenv("MEMORY_PREFETCH", "true").lower() in ("1", "true", "yes")
+# 预取查询的最大字符数，以及预取结果的有效期（秒），用户隔了很久才说话时不再使用
+MEMORY_PREFETCH_QUERY_CHARS = int(os.getenv("MEMORY_PREFETCH_QUERY_CHARS", "400"))
+MEMORY_PREFETCH_MAX_AGE = float(os.getenv("MEMORY_PREFETCH_MAX_AGE", "600"))
+# 合并时最多在本轮搜索结果之外追加的预取记忆条数
+MEMORY_PREFETCH_EXTRA = int(os.getenv("MEMORY_PREFETCH_EXTRA", "2"))
+# 已有预取结果时，本轮请求mem0搜索的时间预算（毫秒）；本地索引的搜索不受影响
+MEMORY_PREFETCH_FRESH_BUDGET_MS = float(os.getenv("MEMORY_PREFETCH_FRESH_BUDGET_MS", "100"))
+
+
+class _PrefetchStats:
+    """预取的统计：发起次数、下一轮使用时已完成和未完成的次数、被放弃的次数，以及合并进提示词的预取记忆条数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.used = 0
+        self.not_ready = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.merged_memories = 0
+
+    def record_started(self):
+        with self._lock:
+            self.started += 1
+
+    def record_cancelled(self):
+        with self._lock:
+            self.cancelled += 1
+
+    def record_lookup(self, outcome, merged=0):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.merged_memories += merged
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "used": self.used,
+                "not_ready": self.not_ready,
+                "expired": self.expired,
+                "cancelled": self.cancelled,
+                "merged_memories": self.merged_memories,
+            }
+
+
+_prefetch_stats = _PrefetchStats()
+
+
+def get_memory_prefetch_stats():
+    """
+    获取记忆预取的统计信息
+
+    返回:
+        dict: 发起的预取次数、下一轮使用时已完成、未完成和已过期的次数、未完成而被放弃的次数，
+              以及合并进提示词的预取记忆条数
+    """
+    return _prefetch_stats.snapshot()
+
+
+register_stats("amadeus_memory_prefetch", get_memory_prefetch_stats, {
+    "started": ("counter", "发起的记忆预取次数"),
+    "used": ("counter", "下一轮对话使用时已完成的预取次数"),
+    "not_ready": ("counter", "下一轮对话使用时尚未完成的预取次数"),
+    "expired": ("counter", "下一轮对话使用时已过期的预取次数"),
+    "cancelled": ("counter", "未完成而被放弃的预取次数"),
+    "merged_memories": ("counter", "合并进提示词的预取记忆条数"),
+})
+
+
+def build_prefetch_query(texts, max_chars=MEMORY_PREFETCH_QUERY_CHARS):
+    """
+    用最近的对话内容拼接预取查询，超出长度时优先保留靠前的内容（用户的话在前，助手的回复在后）
+
+    参数:
+        texts (list): 按顺序排列的对话文本
+        max_chars (int): 查询的最大字符数
+
+    返回:
+        str: 预取查询
+    """
+    query = "\n".join(text.strip() for text in texts if text and text.strip())
+    return query[:max_chars]
+
+
+class MemoryPrefetch:
+    """一次进行中的记忆预取"""
+
+    def __init__(self, api_key, user_id, query, limit):
+        self.api_key = api_key
+        self.user_id = user_id
+        self.query = query
+        self.started_at = time.monotonic()
+        # 搜索可能请求mem0，放到线程中执行，不阻塞共享事件循环；请求mem0使用与普通搜索相同的时间预算，
+        # 超时后线程立即释放，mem0稍后返回的结果仍会保存下来，供下一轮搜索超时时使用
+        self.future = submit_async(asyncio.to_thread, search_memories, api_key, user_id, query, limit)
+
+    def results(self):
+        """
+        获取预取结果，不等待
+
+        返回:
+            list: 预取到的记忆；预取还没完成、失败或已过期时返回None
+        """
+        if time.monotonic() - self.started_at > MEMORY_PREFETCH_MAX_AGE:
+            _prefetch_stats.record_lookup("expired")
+            return None
+        if not self.future.done() or self.future.cancelled() or self.future.exception() is not None:
+            _prefetch_stats.record_lookup("not_ready")
+            return None
+        return self.future.result()
+
+    def cancel(self):
+        """下一轮对话已经开始而预取还没完成时放弃预取，不再等待它的结果"""
+        if self.future.cancel():
+            _prefetch_stats.record_cancelled()
+
+
+def start_memory_prefetch(api_key, user_id, texts, limit=3):
+    """
+    在后台预取下一轮对话可能用到的记忆
+
+    参数:
+        api_key (str): mem0 API 密钥
+        user_id (str): 用户ID
+        texts (list): 最近的对话文本，例如本轮用户的话和助手的回复
+        limit (int): 预取的记忆条数
+
+    返回:
+        MemoryPrefetch: 进行中的预取，保存在会话中供下一轮使用；未启用预取或查询为空时返回None
+    """
+    if not MEMORY_PREFETCH:
+        return None
+    query = build_prefetch_query(texts)
+    if not query:
+        return None
+    _prefetch_stats.record_started()
+    logging.info(f"开始为用户 {user_id} 预取下一轮的记忆")
+    return MemoryPrefetch(api_key, user_id, query, limit)
+
+
+def search_memories_with_prefetch(api_key, user_id, query, prefetch=None, limit=3):
+    """
+    搜索本轮的记忆并合并上一轮预取的结果
+
+    有已完成的预取结果时，本轮请求mem0搜索只等待 MEMORY_PREFETCH_FRESH_BUDGET_MS，
+    超时就直接使用预取的结果；本轮结果排在前面，预取结果去重后最多追加 MEMORY_PREFETCH_EXTRA 条。
+    预取还没完成时放弃预取，只使用本轮的搜索结果。
+
+    参数:
+        api_key (str): mem0 API 密钥
+        user_id (str): 用户ID
+        query (str): 本轮用户的话
+        prefetch (MemoryPrefetch): 上一轮发起的预取，没有时为None
+        limit (int): 本轮搜索的记忆条数
+
+    返回:
+        list: 记忆列表
+    """
+    prefetched = None
+    if prefetch is not None:
+        prefetched = prefetch.results()
+        if prefetched is None:
+            prefetch.cancel()
+    budget = MEMORY_PREFETCH_FRESH_BUDGET_MS / 1000 if prefetched else None
+    results = list(search_memories(api_key, user_id, query, limit, budget))
+    if prefetched is None:
+        return results
+    seen = {memory["memory"] for memory in results}
+    merged = 0
+    for memory in prefetched:
+        if merged >= MEMORY_PREFETCH_EXTRA:
+            break
+        if memory["memory"] not in seen:
+            seen.add(memory["memory"])
+            results.append(memory)
+            merged += 1
+    _prefetch_stats.record_lookup("used", merged)
+    return results
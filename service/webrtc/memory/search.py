@@ -0,0 +1,222 @@
+"""
+记忆搜索模块
+优先在本地记忆索引中搜索，本地没有该用户的数据时请求mem0；请求mem0有时间预算，超时不等待
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.async_utils import submit_async
+from utils.metrics_utils import observe_stage, provider_label, register_stats
+from .client import DEFAULT_MEM0_HOST, get_memory_client
+from .local_index import MEMORY_LOCAL_INDEX, get_memory_index, parse_memory_list
+
+# 请求mem0搜索的时间预算（毫秒），超时后不带新记忆开始生成回复；为0时一直等待
+MEMORY_SEARCH_BUDGET_MS = float(os.getenv("MEMORY_SEARCH_BUDGET_MS", "400"))
+# 最多为多少个用户保留最近一次的mem0搜索结果，超时时用作替代
+MEMORY_SEARCH_CACHED_USERS = int(os.getenv("MEMORY_SEARCH_CACHED_USERS", "1024"))
+
+
+class _SearchStats:
+    """mem0搜索的统计：超时次数、超时后结果才返回的次数，以及时间预算节省的等待时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.timeouts = 0
+        self.cached_fallbacks = 0
+        self.late_results = 0
+        self.late_failures = 0
+        self.saved_seconds = 0.0
+
+    def record(self, timed_out, used_cache=False):
+        with self._lock:
+            self.searches += 1
+            self.timeouts += timed_out
+            self.cached_fallbacks += used_cache
+
+    def record_late(self, saved_seconds, failed):
+        with self._lock:
+            if failed:
+                self.late_failures += 1
+            else:
+                self.late_results += 1
+            self.saved_seconds += saved_seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "searches": self.searches,
+                "timeouts": self.timeouts,
+                "timeout_rate": self.timeouts / self.searches if self.searches else 0.0,
+                "cached_fallbacks": self.cached_fallbacks,
+                "late_results": self.late_results,
+                "late_failures": self.late_failures,
+                "saved_seconds": self.saved_seconds,
+            }
+
+
+_search_stats = _SearchStats()
+# (api_key, user_id) -> 最近一次的mem0搜索结果，包括超时后才返回的结果，最近使用的在末尾
+_recent_results = OrderedDict()
+_recent_results_lock = threading.Lock()
+
+
+def get_memory_search_stats():
+    """
+    获取mem0搜索的统计信息
+
+    返回:
+        dict: 搜索次数、超时次数和比例、使用缓存结果的次数、超时后返回和失败的次数，以及时间预算节省的总等待时间（秒）
+    """
+    return _search_stats.snapshot()
+
+
+register_stats("amadeus_memory_search", get_memory_search_stats, {
+    "searches": ("counter", "请求mem0搜索的次数"),
+    "timeouts": ("counter", "超过时间预算、不再等待的mem0搜索次数"),
+    "cached_fallbacks": ("counter", "超时后使用该用户上一次搜索结果的次数"),
+    "late_results": ("counter", "超时后才返回结果的mem0搜索次数"),
+    "late_failures": ("counter", "超时后最终失败的mem0搜索次数"),
+    "saved_seconds": ("counter", "时间预算节省的等待时间（秒）"),
+})
+
+
+def _remember_results(key, results):
+    with _recent_results_lock:
+        _recent_results[key] = results
+        _recent_results.move_to_end(key)
+        while len(_recent_results) > MEMORY_SEARCH_CACHED_USERS:
+            _recent_results.popitem(last=False)
+
+
+def _cached_results(key):
+    with _recent_results_lock:
+        return _recent_results.get(key)
+
+
+async def _search_remote(api_key, user_id, query, limit):
+    # 首次创建客户端时会同步请求mem0校验密钥，放到线程中执行，计入时间预算但不阻塞共享事件循环
+    memory_client = await asyncio.to_thread(get_memory_client, api_key)
+    return parse_memory_list(await memory_client.search(query=query, user_id=user_id, limit=limit))
+
+
+class _RemoteSearch:
+    """
+    一次带时间预算的mem0搜索
+
+    搜索完成和调用方超时放弃可能同时发生，两者通过一次加锁的状态转换决定结果：
+    先完成的搜索结果交给调用方，先超时的搜索在完成后记为超时后返回，统计只记录一次。
+    """
+
+    _PENDING = "pending"
+    _COMPLETED = "completed"
+    _ABANDONED = "abandoned"
+
+    def __init__(self, key, budget):
+        self.key = key
+        self.budget = budget
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._state = self._PENDING
+
+    def abandon(self):
+        """
+        调用方等待超时时调用
+
+        返回:
+            bool: 搜索已经完成（结果可以直接使用）时返回False，否则标记为放弃并返回True
+        """
+        with self._lock:
+            if self._state == self._COMPLETED:
+                return False
+            self._state = self._ABANDONED
+            return True
+
+    def on_done(self, future):
+        """mem0搜索完成（包括超时之后才完成）时记录耗时并保存结果"""
+        with self._lock:
+            late = self._state == self._ABANDONED
+            self._state = self._COMPLETED
+        elapsed = time.perf_counter() - self.start_time
+        observe_stage("mem0_search", elapsed, provider=provider_label(DEFAULT_MEM0_HOST, "api.mem0.ai"))
+        failed = future.cancelled() or future.exception() is not None
+        if not failed:
+            _remember_results(self.key, future.result())
+        if late:
+            _search_stats.record_late(max(elapsed - self.budget, 0.0), failed)
+            if not failed:
+                logging.info(f"用户 {self.key[1]} 的mem0搜索在超时后返回（{elapsed * 1000:.0f}ms），结果留给下一轮对话")
+
+
+def search_remote_memories(api_key, user_id, query, limit=3, budget=None):
+    """
+    在时间预算内请求mem0搜索
+
+    超时后不再等待，返回该用户最近一次的搜索结果（没有时返回空列表）；请求继续在后台进行，
+    返回的结果会保存下来，供下一轮对话超时时使用。不能在共享事件循环中调用。
+
+    参数:
+        api_key (str): mem0 API 密钥
+        user_id (str): 用户ID
+        query (str): 查询文本
+        limit (int): 返回的最大条数
+        budget (float): 时间预算（秒），默认使用 MEMORY_SEARCH_BUDGET_MS，为0时一直等待
+
+    返回:
+        list: 记忆列表
+    """
+    if budget is None:
+        budget = MEMORY_SEARCH_BUDGET_MS / 1000
+    search = _RemoteSearch((api_key, user_id), budget)
+    future = submit_async(_search_remote, api_key, user_id, query, limit)
+    future.add_done_callback(search.on_done)
+    try:
+        try:
+            results = future.result(timeout=budget or None)
+        except concurrent.futures.TimeoutError:
+            if search.abandon():
+                cached = _cached_results(search.key)
+                _search_stats.record(timed_out=True, used_cache=cached is not None)
+                logging.warning(f"用户 {user_id} 的mem0搜索超过 {budget * 1000:.0f}ms 预算，使用{'缓存的' if cached is not None else '空的'}记忆")
+                return cached or []
+            # 搜索恰好在超时的同时完成
+            results = future.result()
+    except Exception as e:
+        _search_stats.record(timed_out=False)
+        logging.error(f"mem0搜索失败: {e}")
+        return _cached_results(search.key) or []
+    _search_stats.record(timed_out=False)
+    return results
+
+
+def search_memories(api_key, user_id, query, limit=3, budget=None):
+    """
+    搜索与查询相关的用户记忆
+
+    启用本地索引时直接在本地搜索，并在后台按需从mem0刷新索引；用户第一次对话
+    （本地索引还没有从mem0刷新过）时在时间预算内请求mem0搜索。不能在共享事件循环中调用。
+
+    参数:
+        api_key (str): mem0 API 密钥
+        user_id (str): 用户ID
+        query (str): 查询文本
+        limit (int): 返回的最大条数
+        budget (float): 请求mem0的时间预算（秒），默认使用 MEMORY_SEARCH_BUDGET_MS，为0时一直等待
+
+    返回:
+        list: 记忆列表，每条记忆的文本在 "memory" 字段中
+    """
+    if MEMORY_LOCAL_INDEX:
+        index = get_memory_index()
+        results = index.search(api_key, user_id, query, limit)
+        index.refresh_in_background(api_key, user_id)
+        if results is not None:
+            return results
+        logging.info(f"用户 {user_id} 的本地记忆索引尚未从mem0刷新，改为请求mem0搜索")
+    return search_remote_memories(api_key, user_id, query, limit, budget)
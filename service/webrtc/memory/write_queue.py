@@ -0,0 +1,281 @@
+"""
+记忆写入队列模块
+对话结束后的记忆写入先进入队列，由后台线程按用户合并后写入mem0，失败时重试，不占用对话的关键路径
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+
+from utils.async_utils import submit_async
+from utils.metrics_utils import observe_stage, provider_label, register_stats
+from .client import DEFAULT_MEM0_HOST, get_memory_client
+from .local_index import MEMORY_INDEX_WRITE_REFRESH_DELAY, MEMORY_LOCAL_INDEX, get_memory_index
+
+# 同一用户的写入在多长时间内合并为一次请求（秒），以及一次请求最多包含的消息数（达到后立即写入）
+MEMORY_WRITE_DELAY = float(os.getenv("MEMORY_WRITE_DELAY", "2"))
+MEMORY_WRITE_MAX_MESSAGES = int(os.getenv("MEMORY_WRITE_MAX_MESSAGES", "20"))
+# 写入失败后的最大重试次数、首次重试前的等待时间（秒，之后每次翻倍）以及单次写入的超时时间（秒）
+MEMORY_WRITE_MAX_RETRIES = int(os.getenv("MEMORY_WRITE_MAX_RETRIES", "3"))
+MEMORY_WRITE_RETRY_DELAY = float(os.getenv("MEMORY_WRITE_RETRY_DELAY", "1"))
+MEMORY_WRITE_TIMEOUT = float(os.getenv("MEMORY_WRITE_TIMEOUT", "30"))
+# 服务关闭时等待队列写完的最长时间（秒）
+MEMORY_FLUSH_TIMEOUT = float(os.getenv("MEMORY_FLUSH_TIMEOUT", "10"))
+
+# 请求可能已经送达mem0、不知道是否写入成功的错误；遇到这些错误时不重试，避免重复写入记忆
+_UNKNOWN_OUTCOME_ERRORS = (TimeoutError, httpx.ReadTimeout, httpx.WriteTimeout)
+
+
+def _write_to_mem0(api_key, user_id, messages):
+    """把一批消息写入mem0，返回共享事件循环中的Future"""
+    client = get_memory_client(api_key)
+    return submit_async(client.add, messages, user_id=user_id)
+
+
+class _PendingBatch:
+    """某个用户等待写入的消息"""
+
+    def __init__(self, api_key, user_id):
+        self.api_key = api_key
+        self.user_id = user_id
+        self.messages = []
+        self.created_at = time.monotonic()
+        self.attempts = 0
+        self.not_before = 0.0  # 重试时最早的写入时间
+
+
+class MemoryWriteQueue:
+    """
+    记忆写入队列
+
+    同一用户在 delay 秒内的多次写入合并为一次请求；同一用户同时只有一个请求在进行，保证写入顺序，
+    不同用户的请求互不等待。请求明确失败后按指数退避重试，超过重试次数后放弃并记录日志；
+    请求超时（可能已经写入）时取消请求并放弃这批消息，不重试。
+    """
+
+    def __init__(self, write_fn=_write_to_mem0, delay=MEMORY_WRITE_DELAY, max_messages=MEMORY_WRITE_MAX_MESSAGES,
+                 max_retries=MEMORY_WRITE_MAX_RETRIES, retry_delay=MEMORY_WRITE_RETRY_DELAY, timeout=MEMORY_WRITE_TIMEOUT,
+                 on_written=None):
+        """
+        参数:
+            write_fn (callable): write_fn(api_key, user_id, messages) 发起一次写入，返回 concurrent.futures.Future
+            delay (float): 合并写入的时间窗口（秒）
+            max_messages (int): 一次请求最多包含的消息数
+            max_retries (int): 最大重试次数
+            retry_delay (float): 首次重试前的等待时间（秒）
+            timeout (float): 单次写入的超时时间（秒）
+            on_written (callable, optional): on_written(api_key, user_id) 在一批消息成功写入后调用
+        """
+        self._write_fn = write_fn
+        self._on_written_fn = on_written
+        self.delay = delay
+        self.max_messages = max_messages
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._batches = OrderedDict()  # (api_key, user_id) -> _PendingBatch
+        self._inflight = {}  # 正在写入的 (api_key, user_id) -> (Future, 超时时间)，请求发出前为None
+        self._flushing = 0
+        self._thread = None
+        self._stats = {"enqueued": 0, "batches": 0, "messages_written": 0, "retries": 0, "failed_batches": 0, "abandoned_batches": 0}
+
+    def add(self, api_key, user_id, messages):
+        """
+        把一轮对话的消息加入队列，立即返回
+
+        参数:
+            api_key (str): mem0 API 密钥
+            user_id (str): 用户ID
+            messages (list): 要写入的消息
+        """
+        if not messages:
+            return
+        key = (api_key, user_id)
+        with self._condition:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = _PendingBatch(api_key, user_id)
+                self._batches[key] = batch
+            batch.messages.extend(messages)
+            self._stats["enqueued"] += len(messages)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="memory-write-queue", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _is_due(self, key, batch, now):
+        if key in self._inflight or now < batch.not_before:
+            return False
+        return self._flushing or len(batch.messages) >= self.max_messages or now - batch.created_at >= self.delay
+
+    def _next_wakeup(self, now):
+        """距离下一批到期或下一个请求超时的时间，都没有时返回None"""
+        wakeups = []
+        for key, batch in self._batches.items():
+            if key in self._inflight:
+                continue
+            wakeups.append(max(batch.not_before, batch.created_at + self.delay) - now)
+        for inflight in self._inflight.values():
+            if inflight is not None:
+                wakeups.append(inflight[1] - now)
+        return max(min(wakeups), 0.01) if wakeups else None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    due = [key for key, batch in self._batches.items() if self._is_due(key, batch, now)]
+                    expired = [inflight[0] for inflight in self._inflight.values() if inflight is not None and now >= inflight[1]]
+                    if due or expired:
+                        break
+                    self._condition.wait(self._next_wakeup(now))
+                batches = []
+                for key in due:
+                    batch = self._batches.pop(key)
+                    # 一次请求最多包含 max_messages 条消息，其余的留在队列中
+                    if len(batch.messages) > self.max_messages:
+                        remainder = _PendingBatch(batch.api_key, batch.user_id)
+                        remainder.messages = batch.messages[self.max_messages:]
+                        batch.messages = batch.messages[:self.max_messages]
+                        self._batches[key] = remainder
+                    self._inflight[key] = None
+                    batches.append(batch)
+            # 超时的请求已经不会在超时时间内完成，取消后由完成回调放弃这批消息
+            for future in expired:
+                future.cancel()
+            self._write_batches(batches)
+
+    def _write_batches(self, batches):
+        """发出各批次的写入请求，不等待完成；完成后由回调处理结果"""
+        for batch in batches:
+            key = (batch.api_key, batch.user_id)
+            start_time = time.perf_counter()
+            try:
+                future = self._write_fn(batch.api_key, batch.user_id, batch.messages)
+            except Exception as e:
+                # 请求没有发出，可以放心重试
+                self._finish(batch, e)
+                continue
+            with self._condition:
+                self._inflight[key] = (future, time.monotonic() + self.timeout)
+                self._condition.notify_all()
+            future.add_done_callback(functools.partial(self._on_written, batch, start_time))
+
+    def _on_written(self, batch, start_time, future):
+        if future.cancelled():
+            self._finish(batch, TimeoutError(f"写入超过 {self.timeout:g} 秒未完成"))
+            return
+        error = future.exception()
+        if error is None:
+            observe_stage("mem0_add", time.perf_counter() - start_time, provider=provider_label(DEFAULT_MEM0_HOST, "api.mem0.ai"))
+        self._finish(batch, error)
+
+    def _finish(self, batch, error):
+        key = (batch.api_key, batch.user_id)
+        with self._condition:
+            self._inflight.pop(key, None)
+            if error is None:
+                self._stats["batches"] += 1
+                self._stats["messages_written"] += len(batch.messages)
+                logging.info(f"已写入用户 {batch.user_id} 的 {len(batch.messages)} 条记忆消息")
+            elif isinstance(error, _UNKNOWN_OUTCOME_ERRORS):
+                self._stats["abandoned_batches"] += 1
+                logging.error(f"写入用户 {batch.user_id} 的记忆超时，无法确认是否已写入，为避免重复不再重试 {len(batch.messages)} 条消息: {error!r}")
+            elif batch.attempts < self.max_retries:
+                batch.attempts += 1
+                batch.not_before = time.monotonic() + self.retry_delay * 2 ** (batch.attempts - 1)
+                self._stats["retries"] += 1
+                logging.warning(f"写入用户 {batch.user_id} 的记忆失败，第 {batch.attempts} 次重试: {error}")
+                # 失败的消息排在期间新加入的消息之前，保持写入顺序
+                newer = self._batches.pop(key, None)
+                if newer is not None:
+                    batch.messages.extend(newer.messages)
+                self._batches[key] = batch
+            else:
+                self._stats["failed_batches"] += 1
+                logging.error(f"写入用户 {batch.user_id} 的记忆失败，已放弃 {len(batch.messages)} 条消息: {error}")
+            self._condition.notify_all()
+        if error is None and self._on_written_fn is not None:
+            try:
+                self._on_written_fn(batch.api_key, batch.user_id)
+            except Exception as e:
+                logging.error(f"处理用户 {batch.user_id} 的记忆写入完成回调失败: {e}")
+
+    def flush(self, timeout=MEMORY_FLUSH_TIMEOUT):
+        """
+        立即写入队列中的全部消息并等待完成
+
+        参数:
+            timeout (float): 最长等待时间（秒）
+
+        返回:
+            bool: 队列是否已全部写完
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                while self._batches or self._inflight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                done = not self._batches and not self._inflight
+            finally:
+                self._flushing -= 1
+        if not done:
+            logging.warning(f"等待记忆写入超时，仍有 {len(self._batches) + len(self._inflight)} 个用户的消息未写入")
+        return done
+
+    def stats(self):
+        """
+        写入队列的统计信息
+
+        返回:
+            dict: 入队消息数、成功写入的批次数和消息数、重试次数、重试后仍失败而放弃的批次数、
+                  超时后无法确认结果而放弃的批次数以及等待中的用户数
+        """
+        with self._condition:
+            return dict(self._stats, pending=len(self._batches) + len(self._inflight))
+
+
+def _refresh_local_index(api_key, user_id):
+    """写入成功后等mem0处理完成，刷新用户的本地记忆索引，使新提取的记忆能被检索到"""
+    get_memory_index().refresh_in_background(api_key, user_id, force=True, delay=MEMORY_INDEX_WRITE_REFRESH_DELAY)
+
+
+_write_queue = MemoryWriteQueue(on_written=_refresh_local_index if MEMORY_LOCAL_INDEX else None)
+
+
+def enqueue_memory_add(api_key, user_id, messages):
+    """把一轮对话的消息加入记忆写入队列，立即返回"""
+    _write_queue.add(api_key, user_id, messages)
+
+
+def flush_memory_writes(timeout=MEMORY_FLUSH_TIMEOUT):
+    """写入队列中的全部消息并等待完成，在服务关闭时调用"""
+    return _write_queue.flush(timeout)
+
+
+def get_memory_write_stats():
+    """获取记忆写入队列的统计信息"""
+    return _write_queue.stats()
+
+
+register_stats("amadeus_memory_write", get_memory_write_stats, {
+    "enqueued": ("counter", "加入记忆写入队列的消息数"),
+    "batches": ("counter", "成功写入mem0的批次数，与消息数之比反映合并效果"),
+    "messages_written": ("counter", "成功写入mem0的消息数"),
+    "retries": ("counter", "写入失败后的重试次数"),
+    "failed_batches": ("counter", "重试后仍失败而放弃的批次数"),
+    "abandoned_batches": ("counter", "超时后无法确认结果而放弃的批次数"),
+    "pending": ("gauge", "有消息等待写入的用户数"),
+})
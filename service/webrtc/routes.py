@@ -1,12 +1,13 @@
 # 导入必要的库和模块
 from fastapi import APIRouter, Depends, Request, Body
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 import logging
 import json
 import os
 from typing import Dict, List, Any, Optional, cast
 from pydantic import BaseModel
 from fastrtc import ReplyOnPause
+from utils.metrics_utils import render_metrics
 
 
 # 添加一个数据模型来接收前端传入的配置
@@ -92,6 +93,11 @@ async def get_ice_config():
     else:
         return {"iceServers": []}  # 如果没有配置，返回空的ICE服务器列表
 
+# 以Prometheus文本格式导出各处理环节的延迟直方图
+@router.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # 提供服务端和客户端之间的通用通信SSE流
 @router.get("/events")
 async def events(webrtc_id: str):
@@ -10,21 +10,26 @@ import numpy as np  # 用于数值计算和数组操作
 import io  # 用于处理输入输出流
 import requests  # 用于发送HTTP请求
 import asyncio  # 用于异步编程
-from mem0 import AsyncMemoryClient
 import os  # 用于操作系统相关功能
 from io import BytesIO  # 用于在内存中处理二进制数据
 from dotenv import load_dotenv  # 用于加载环境变量
 import aiohttp  # 用于异步HTTP请求
 import json  # 用于JSON处理
+import functools  # 用于绑定转录参数
 from datetime import datetime, timedelta
 from typing import Dict, Optional
-from openai import OpenAI
 # 导入自定义的工具函数
 from utils import run_async, generate_sys_prompt, process_llm_stream, generate_unique_user_id
+from utils.speculative_utils import SpeculativeTurn, cancel_speculative_turn
+from utils.client_utils import get_openai_client, expire_idle_clients, close_all_clients
+from utils.metrics_utils import TurnTrace, stage_timer, provider_label
 from ai import ai_stream, AI_MODEL, predict_emotion  # 从ai模块导入
 from ai.plan import ActionPlanner  # 导入ActionPlanner类
-from stt import transcribe
-from tts import text_to_speech_stream
+from stt import transcribe, detect_speech, trim_silence, check_speech_gate, is_whisper_hallucination, may_be_hallucination
+from stt.vad import STT_TRIM_SILENCE
+from stt.streaming import STT_STREAMING, StreamingReplyOnPause, StreamingTranscription
+from memory import search_memories_with_prefetch, start_memory_prefetch, enqueue_memory_add, flush_memory_writes, expire_idle_memory_clients, close_all_memory_clients, close_memory_index
+from tts import text_to_speech_stream, text_to_speech_stream_async, translate_text
 from routes import router, init_router, get_user_config, InputData  # 导入路由模块及用户配置
 from contextlib import asynccontextmanager
 
@@ -46,6 +51,8 @@ DEFAULT_MEM0_API_KEY = os.getenv("MEM0_API_KEY", "")
 # 添加WebRTC流的时间限制和并发限制环境变量
 DEFAULT_TIME_LIMIT = int(os.getenv("TIME_LIMIT", "600"))
 DEFAULT_CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "10"))
+# 是否在用户空闲时预生成AI主动发起的对话（包括TTS音频），前端触发时直接输出
+PROACTIVE_PREGENERATION = os.getenv("PROACTIVE_PREGENERATION", "true").lower() in ("1", "true", "yes")
 
 # 设置默认的语言选项和参数
 DEFAULT_VOICE_OUTPUT_LANGUAGE = 'ja'
@@ -62,9 +69,6 @@ user_sessions = {}
 # 用户会话最后活动时间
 user_sessions_last_active = {}
 
-# 初始化OpenAI客户端字典，为每个用户创建一个客户端
-openai_clients = {}
-
 # 异步清理过期会话
 async def cleanup_expired_sessions():
     while True:
@@ -81,11 +85,18 @@ async def cleanup_expired_sessions():
             # 清理过期会话
             for webrtc_id in expired_sessions:
                 logging.info(f"清理过期会话: {webrtc_id}")
-                user_sessions.pop(webrtc_id, None)
+                session = user_sessions.pop(webrtc_id, None)
+                if session:
+                    cancel_speculative_turn(session, "会话已过期")
+                    memory_prefetch = session.pop("memory_prefetch", None)
+                    if memory_prefetch is not None:
+                        memory_prefetch.cancel()
                 user_sessions_last_active.pop(webrtc_id, None)
-                openai_clients.pop(webrtc_id, None)
+            
+            # 关闭长时间未使用的共享客户端
+            expired_clients = expire_idle_clients() + expire_idle_memory_clients()
                 
-            logging.info(f"清理完成，当前活跃会话数: {len(user_sessions)}")
+            logging.info(f"清理完成，当前活跃会话数: {len(user_sessions)}，关闭空闲客户端数: {expired_clients}")
         except Exception as e:
             logging.error(f"清理过期会话时出错: {e}")
 
@@ -125,26 +136,26 @@ def get_user_session(webrtc_id: str):
     
     return user_sessions[webrtc_id]
 
-# 获取用户的OpenAI客户端
+# 获取用户的OpenAI客户端，使用相同配置的用户共享同一个客户端及其连接池
 def get_user_openai_client(webrtc_id: str):
     # 更新用户最后活动时间
     user_sessions_last_active[webrtc_id] = time.time()
     
-    if webrtc_id not in openai_clients:
-        config = get_user_config(webrtc_id)
-        api_key = config.llm_api_key if config and config.llm_api_key else DEFAULT_LLM_API_KEY
-        base_url = config.llm_base_url if config and config.llm_base_url else DEFAULT_LLM_BASE_URL   
-        openai_clients[webrtc_id] = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
-    return openai_clients[webrtc_id]
+    config = get_user_config(webrtc_id)
+    api_key = config.llm_api_key if config and config.llm_api_key else DEFAULT_LLM_API_KEY
+    base_url = config.llm_base_url if config and config.llm_base_url else DEFAULT_LLM_BASE_URL   
+    return get_openai_client(base_url, api_key)
 
 # 获取用户的AI模型
 def get_user_ai_model(webrtc_id: str):
     config = get_user_config(webrtc_id)
     return config.ai_model if config and config.ai_model else DEFAULT_AI_MODEL
 
+# 开始一轮对话的计时，指标按用户使用的LLM服务商和模型分类
+def start_turn_trace(webrtc_id: str):
+    client = get_user_openai_client(webrtc_id)
+    return TurnTrace(provider_label(str(client.base_url)), get_user_ai_model(webrtc_id))
+
 # 获取用户的语音转文本API配置
 def get_user_whisper_config(webrtc_id: str):
     config = get_user_config(webrtc_id)
@@ -180,6 +191,52 @@ rtc_configuration = {
     ]
 }
 
+def start_speculative_turn(webrtc_id, session, next_action, action_planner):
+    """
+    在后台预生成AI主动发起的对话
+    
+    使用与触发时相同的对话历史和配置运行完整的LLM+TTS流程，输出缓存在会话中；
+    用户先开口、配置改变或对话历史改变时作废
+    """
+    cancel_speculative_turn(session, "已重新规划下一步行动")
+    if not PROACTIVE_PREGENERATION or not next_action:
+        return
+    config = get_user_config(webrtc_id)
+    if config and config.is_camera_on:
+        # 摄像头开启时需要触发时刻的视频帧，无法提前生成
+        return
+    
+    messages = session["messages"].copy()
+    client = get_user_openai_client(webrtc_id)
+    model = get_user_ai_model(webrtc_id)
+    siliconflow_config = get_user_siliconflow_config(webrtc_id)
+    voice_output_language = session["voice_output_language"]
+    text_output_language = session["text_output_language"]
+    is_same_language = session["is_same_language"]
+    
+    def generate():
+        for item in process_llm_stream(
+            client=client,
+            messages=messages,
+            model=model,
+            siliconflow_config=siliconflow_config,
+            voice_output_language=voice_output_language,
+            text_output_language=text_output_language,
+            is_same_language=is_same_language,
+            run_predict_emotion=run_predict_emotion,
+            ai_stream=ai_stream,
+            text_to_speech_stream=text_to_speech_stream,
+            text_to_speech_stream_async=text_to_speech_stream_async,
+            translate_text=translate_text,
+            max_context_length=20,
+        ):
+            if isinstance(item, str):
+                action_planner.next_response = item
+            yield item
+    
+    logging.info(f"用户 {webrtc_id} 开始预生成主动对话，下一步行动: {next_action}")
+    session["speculative_turn"] = SpeculativeTurn(next_action, len(session["messages"]), generate)
+
 def start_up(webrtc_id):
     logging.info(f"用户 {webrtc_id} 开始函数已执行")
     
@@ -214,6 +271,7 @@ def start_up(webrtc_id):
     
     # 使用封装的流处理函数
     welcome_text = ""
+    trace = start_turn_trace(webrtc_id)
     stream_generator = process_llm_stream(
         client=client,
         messages=temp_messages,
@@ -225,8 +283,11 @@ def start_up(webrtc_id):
         run_predict_emotion=run_predict_emotion,
         ai_stream=ai_stream,
         text_to_speech_stream=text_to_speech_stream,
+        text_to_speech_stream_async=text_to_speech_stream_async,
+        translate_text=translate_text,
         max_tokens=100,
         max_context_length=20,
+        trace=trace,
     )
     
     # 处理生成器的输出
@@ -235,6 +296,7 @@ def start_up(webrtc_id):
             welcome_text = item
         else:
             yield item
+    trace.mark("turn_done")
     try:
         # 创建ActionPlanner实例
         action_planner = ActionPlanner(conversation_history=session["messages"][-2:])
@@ -247,6 +309,9 @@ def start_up(webrtc_id):
         # 通知前端下一步行动计划
         next_action_json = json.dumps({"type": "next_action", "data": next_action})
         yield AdditionalOutputs(next_action_json)
+        
+        # 趁用户空闲预生成主动对话
+        start_speculative_turn(webrtc_id, session, next_action, action_planner)
     except Exception as e:
         logging.error(f"规划初始下一步行动失败: {str(e)}")
         session["next_action"] = "share_memory"  # 失败时默认为分享记忆
@@ -265,11 +330,52 @@ async def run_predict_emotion(message, client=None):
     """
     return await predict_emotion(message, client)
 
+# 用户说话过程中切出的录音窗口，立即提交转录（仅在启用流式转录时调用）
+def on_speech_window(window_audio, start_sample, end_sample, message, input_data, *args):
+    session = get_user_session(input_data.webrtc_id)
+    if start_sample == 0:
+        # 一句新的话开始，丢弃上一句残留的分段转录
+        stale_transcription = session.pop("partial_transcription", None)
+        if stale_transcription is not None:
+            stale_transcription.cancel()
+        whisper_config = get_user_whisper_config(input_data.webrtc_id)
+        session["partial_transcription"] = StreamingTranscription(
+            # 窗口转录失败时抛出异常，finish 据此改为整句转录，而不是把失败当作没有说话
+            functools.partial(transcribe, api_key=whisper_config["api_key"], base_url=whisper_config["base_url"], model=whisper_config["model"], raise_on_error=True),
+            window_audio[0]
+        )
+    partial_transcription = session.get("partial_transcription")
+    if partial_transcription is None or partial_transcription.transcribed_samples != start_sample:
+        return  # 之前的窗口已丢失，这句话在停顿后整句转录
+    # 没有语音的窗口不必转录
+    window_16k, speech_seconds, speech_chunks = detect_speech(window_audio, vad_model)
+    partial_transcription.add_window(
+        window_audio if speech_chunks else None, end_sample,
+        may_be_hallucination(window_16k, speech_seconds, speech_chunks)
+    )
+
+# 转录分段转录剩余的最后一段并拼接完整文本，无法使用分段结果时返回None
+def finish_streaming_transcription(partial_transcription, audio):
+    tail_audio = partial_transcription.tail(audio)
+    if tail_audio is None:
+        partial_transcription.cancel()
+        return None
+    tail_audio, tail_seconds, tail_chunks = detect_speech(tail_audio, vad_model)
+    filter_hallucination = may_be_hallucination(tail_audio, tail_seconds, tail_chunks)
+    if not tail_chunks:
+        # 最后一段只有停顿，之前的窗口已经包含全部语音
+        tail_audio = None
+    elif STT_TRIM_SILENCE:
+        tail_audio, _ = trim_silence(tail_audio, tail_chunks)
+    return partial_transcription.finish(tail_audio, filter_hallucination)
+
 # 定义echo函数，处理音频输入并返回音频输出
 def echo(audio: tuple[int, np.ndarray], message: str, input_data: InputData, next_action = "", video_frames = None):
     # 获取用户会话状态
     session = get_user_session(input_data.webrtc_id)
     whisper_config = get_user_whisper_config(input_data.webrtc_id)
+    # 本轮对话的计时，从检测到用户停顿（或主动对话触发）开始
+    trace = start_turn_trace(input_data.webrtc_id)
     logging.info(f"摄像头状态: {input_data.is_camera_on}")
     
     # 记录视频帧信息
@@ -279,24 +385,69 @@ def echo(audio: tuple[int, np.ndarray], message: str, input_data: InputData, nex
     
     prompt = "[AI主动发起对话]next Action: " + next_action
     user_id = generate_unique_user_id(session["user_name"])
+    
+    # 检查预生成的主动对话能否直接使用：必须是主动触发、行动相同、对话历史未变且不需要视频帧
+    speculative_turn = session.pop("speculative_turn", None)
+    if speculative_turn is not None:
+        if next_action == "":
+            speculative_turn.cancel()
+            logging.info("预生成的主动对话已作废: 用户先开口")
+            speculative_turn = None
+        elif not speculative_turn.matches(next_action, len(session["messages"])) or (video_frames and input_data.is_camera_on):
+            speculative_turn.cancel()
+            logging.info("预生成的主动对话已作废: 与当前触发不匹配")
+            speculative_turn = None
+    
     if next_action == "":
         stt_time = time.time()  # 记录开始时间
         logging.info(f"用户 {input_data.webrtc_id} 正在执行STT")  # 记录日志
-        # 使用工具函数运行异步转录函数，传入配置
-        prompt = run_async(transcribe, audio, whisper_config["api_key"], whisper_config["base_url"], whisper_config["model"])
+        # 启用流式转录时，用户说话过程中已经转录的窗口
+        partial_transcription = session.pop("partial_transcription", None)
+        # 用VAD模型找出语音区域，咳嗽、杂音等不像说话的输入直接丢弃，不调用STT、LLM和TTS
+        utterance_audio = audio
+        with stage_timer("vad", provider="local", model="humaware_vad"):
+            audio, speech_seconds, speech_chunks = detect_speech(audio, vad_model)
+            drop_reason = check_speech_gate(audio, speech_seconds, speech_chunks)
+        speech_audio = audio  # 未裁剪的16kHz录音，语音片段的位置以此为准
+        trace.mark("vad_done")
+        if drop_reason is not None:
+            logging.info(f"丢弃非语音输入: {drop_reason}，语音时长 {speech_seconds:.2f} 秒")
+            if partial_transcription is not None:
+                partial_transcription.cancel()
+            return
+        prompt = None
+        if partial_transcription is not None:
+            # 只需转录最后一段，再与之前各窗口的结果拼接
+            prompt = finish_streaming_transcription(partial_transcription, utterance_audio)
+        if prompt is None:
+            if STT_TRIM_SILENCE:
+                # 裁掉首尾的静音后再上传，减少上传体积和识别耗时
+                audio, _ = trim_silence(audio, speech_chunks)
+            # 使用工具函数运行异步转录函数，传入配置
+            prompt = run_async(transcribe, audio, whisper_config["api_key"], whisper_config["base_url"], whisper_config["model"])
         # 生成用户唯一ID
         if prompt == "":  # 如果转录结果为空
             logging.info("STT返回空字符串")  # 记录日志
             return  # 结束函数
+        if is_whisper_hallucination(prompt, speech_audio, speech_seconds, speech_chunks):  # 短或安静的输入上常见的幻觉文本，不开始新一轮对话
+            logging.info(f"丢弃疑似Whisper幻觉的转录结果: {prompt}")
+            return
+        trace.mark("stt_done")
         logging.info(f"STT响应: {prompt}")  # 记录转录结果
     mem0_config = get_user_mem0_config(input_data.webrtc_id)
-    memory_client = AsyncMemoryClient(api_key=mem0_config["api_key"])
-    search_result = run_async(memory_client.search, query=prompt, user_id=user_id, limit=3)
-    logging.info(f"搜索结果: {search_result}")
-    # 确保从搜索结果中正确获取记忆
-    memories_text = "\n".join(memory["memory"] for memory in search_result)
-    logging.info(f"记忆文本: {memories_text}")
-    final_prompt = f"Relevant Memories/Facts:\n{memories_text}\n\nUser Question: {prompt}"
+    # 上一轮LLM生成结束后预取的记忆
+    memory_prefetch = session.pop("memory_prefetch", None)
+    if speculative_turn is None:
+        # 优先在本地记忆索引中搜索，本地没有该用户的数据时请求mem0，并合并预取的记忆
+        search_result = search_memories_with_prefetch(mem0_config["api_key"], user_id, prompt, memory_prefetch, limit=3)
+        logging.info(f"搜索结果: {search_result}")
+        # 确保从搜索结果中正确获取记忆
+        memories_text = "\n".join(memory["memory"] for memory in search_result)
+        logging.info(f"记忆文本: {memories_text}")
+        final_prompt = f"Relevant Memories/Facts:\n{memories_text}\n\nUser Question: {prompt}"
+    elif memory_prefetch is not None:
+        # 使用预生成的主动对话时不搜索记忆，上一轮的预取已经用不上
+        memory_prefetch.cancel()
     if next_action == "":
         # 将用户的输入添加到用户消息历史
         session["messages"].append({"role": "user", "content": final_prompt})
@@ -343,28 +494,48 @@ def echo(audio: tuple[int, np.ndarray], message: str, input_data: InputData, nex
             }
             messages_for_api.append(sys_msg_with_frames)
     
-    # 使用封装的流处理函数
+    # LLM生成结束后，趁剩余的TTS音频还在播放，用本轮对话预取下一轮的记忆
+    def prefetch_next_memories(response_text):
+        user_text = prompt if next_action == "" else ""
+        session["memory_prefetch"] = start_memory_prefetch(mem0_config["api_key"], user_id, [user_text, response_text])
+
+    # 使用封装的流处理函数，有可用的预生成对话时直接输出预生成的内容
     full_response = ""
-    stream_generator = process_llm_stream(
-        client=client,
-        messages=messages_for_api,  # 使用可能包含视频帧的消息副本
-        model=model,
-        siliconflow_config=siliconflow_config,
-        voice_output_language=session["voice_output_language"],
-        text_output_language=session["text_output_language"],
-        is_same_language=session["is_same_language"],
-        run_predict_emotion=run_predict_emotion,
-        ai_stream=ai_stream,
-        text_to_speech_stream=text_to_speech_stream,
-        max_context_length=20,
-    )
+    if speculative_turn is not None:
+        logging.info(f"使用预生成的主动对话，下一步行动: {next_action}")
+        stream_generator = speculative_turn.replay()
+    else:
+        stream_generator = process_llm_stream(
+            client=client,
+            messages=messages_for_api,  # 使用可能包含视频帧的消息副本
+            model=model,
+            siliconflow_config=siliconflow_config,
+            voice_output_language=session["voice_output_language"],
+            text_output_language=session["text_output_language"],
+            is_same_language=session["is_same_language"],
+            run_predict_emotion=run_predict_emotion,
+            ai_stream=ai_stream,
+            text_to_speech_stream=text_to_speech_stream,
+            text_to_speech_stream_async=text_to_speech_stream_async,
+            translate_text=translate_text,
+            max_context_length=20,
+            trace=trace,
+            on_llm_done=prefetch_next_memories,
+        )
     
     # 处理生成器的输出
     for item in stream_generator:
         if isinstance(item, str):
             full_response = item
         else:
+            if speculative_turn is not None and not isinstance(item, AdditionalOutputs):
+                # 预生成的内容在生成时没有计时，按实际输出时间记录首个音频块
+                trace.mark("first_audio")
             yield item
+    trace.mark("turn_done")
+    if speculative_turn is not None:
+        # 预生成的内容没有经过本轮的LLM生成，输出结束后再预取
+        prefetch_next_memories(full_response)
 
     # 将助手的响应添加到用户消息历史
     conversation_messages = [
@@ -374,8 +545,8 @@ def echo(audio: tuple[int, np.ndarray], message: str, input_data: InputData, nex
     session["messages"].append({"role": "assistant", "content": full_response + " "})
     logging.info(f"LLM响应: {full_response}")  # 记录LLM响应
     
-    # 保存对话记忆
-    memory_client.add(conversation_messages, user_id=user_id)
+    # 保存对话记忆（由后台队列合并写入，不阻塞本轮对话）
+    enqueue_memory_add(mem0_config["api_key"], user_id, conversation_messages)
     logging.info(f"LLM耗时 {time.time() - llm_time} 秒")  # 记录LLM所用时间
     
     # LLM响应完成后，规划下一步行动
@@ -391,6 +562,9 @@ def echo(audio: tuple[int, np.ndarray], message: str, input_data: InputData, nex
         # 通知前端下一步行动计划
         next_action_json = json.dumps({"type": "next_action", "data": next_action})
         yield AdditionalOutputs(next_action_json)
+        
+        # 趁用户空闲预生成主动对话
+        start_speculative_turn(input_data.webrtc_id, session, next_action, action_planner)
     except Exception as e:
         logging.error(f"规划下一步行动失败: {str(e)}")
         session["next_action"] = "share_memory"  # 失败时默认为分享记忆
@@ -400,12 +574,20 @@ def startup_wrapper(*args):
     logging.info(f"startup_wrapper: {args}")
     return start_up(args[1].webrtc_id)
 
-# 使用echo函数直接作为回调
-reply_handler = ReplyOnPause(echo,
-    startup_fn=startup_wrapper,
-    can_interrupt=True,
-    model=vad_model
-    )
+# 使用echo函数直接作为回调；启用流式转录时，用户说话过程中就按窗口分段转录
+if STT_STREAMING:
+    reply_handler = StreamingReplyOnPause(echo,
+        startup_fn=startup_wrapper,
+        can_interrupt=True,
+        model=vad_model,
+        on_speech_window=on_speech_window
+        )
+else:
+    reply_handler = ReplyOnPause(echo,
+        startup_fn=startup_wrapper,
+        can_interrupt=True,
+        model=vad_model
+        )
 
 # 创建Stream对象，用于处理WebRTC流
 stream = Stream(reply_handler, 
@@ -428,6 +610,11 @@ async def lifespan(app: fastapi.FastAPI):
         await cleanup_task
     except asyncio.CancelledError:
         logging.info("清理任务已取消")
+    # 先写完队列中的对话记忆，再关闭客户端
+    await asyncio.to_thread(flush_memory_writes)
+    close_all_memory_clients()
+    close_memory_index()
+    close_all_clients()
 
 # 创建FastAPI应用，使用lifespan参数
 app = fastapi.FastAPI(lifespan=lifespan)
@@ -449,6 +636,9 @@ def handle_config_update(webrtc_id, message, data):
         if webrtc_id in user_sessions:
             session = user_sessions[webrtc_id]
             
+            # 预生成的主动对话基于旧配置，不能再使用
+            cancel_speculative_turn(session, "用户配置已更新")
+            
             # 更新用户会话的配置
             if data.voice_output_language:
                 session["voice_output_language"] = data.voice_output_language
@@ -478,15 +668,7 @@ def handle_config_update(webrtc_id, message, data):
             else:
                 session["messages"].insert(0, {"role": "system", "content": sys_prompt})
         
-        # 如果用户有OpenAI客户端，则根据新配置更新客户端
-        if webrtc_id in openai_clients and (data.llm_api_key or data.llm_base_url):
-            api_key = data.llm_api_key if data.llm_api_key else DEFAULT_LLM_API_KEY
-            base_url = data.llm_base_url if data.llm_base_url else DEFAULT_LLM_BASE_URL
-            
-            openai_clients[webrtc_id] = OpenAI(
-                api_key=api_key,
-                base_url=base_url
-            )
+        # OpenAI客户端按配置从注册表获取，新配置在下次获取客户端时自动生效
 
 # 初始化路由器，传递配置处理函数
 init_router(stream, rtc_configuration, handle_config_update)
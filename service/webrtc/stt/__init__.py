@@ -4,5 +4,10 @@
 """
 
 from .transcribe import transcribe
+from .vad import detect_speech, trim_silence, get_trim_stats
+from .gate import check_speech_gate, may_be_hallucination, is_whisper_hallucination, get_speech_gate_stats
+from .streaming import StreamingTranscription, StreamingReplyOnPause
 
-__all__ = ['transcribe'] 
\ No newline at end of file
+__all__ = ['transcribe', 'detect_speech', 'trim_silence', 'get_trim_stats',
+           'check_speech_gate', 'may_be_hallucination', 'is_whisper_hallucination', 'get_speech_gate_stats',
+           'StreamingTranscription', 'StreamingReplyOnPause'] 
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+语音识别上传编码模块
+把录音整理成16kHz单声道后编码为上传给语音识别服务的文件
+"""
+
+import io
+import logging
+import subprocess
+import wave
+
+import numpy as np
+
+# 语音识别模型的输入采样率，更高的采样率只会增加上传体积
+STT_SAMPLE_RATE = 16000
+
+# 支持的上传格式：格式名 -> (文件名, ffmpeg编码参数)，wav 由标准库编码，不需要ffmpeg
+UPLOAD_FORMATS = {
+    "wav": ("audio.wav", None),
+    "flac": ("audio.flac", ["-c:a", "flac", "-f", "flac"]),
+    "opus": ("audio.ogg", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg"]),
+}
+
+
+def to_mono_16k(audio):
+    """
+    把录音下混为单声道并重采样到16kHz
+
+    参数:
+        audio (tuple): (采样率, 音频数组)，数组可以是一维，也可以是 (声道, 样本) 或 (样本, 声道) 形式的二维数组
+
+    返回:
+        numpy.ndarray: 16kHz单声道的int16样本
+    """
+    sample_rate, samples = audio
+    samples = np.asarray(samples)
+    if samples.size == 0:
+        return np.zeros(0, dtype=np.int16)
+    # 浮点样本的范围是 [-1, 1]，需要先记下原始类型，下混后数组总是浮点
+    is_float = samples.dtype.kind == "f"
+    if samples.ndim == 2:
+        # 声道数总是远小于样本数，按较短的维度下混
+        channel_axis = 0 if samples.shape[0] <= samples.shape[1] else 1
+        samples = samples.mean(axis=channel_axis)
+    samples = samples.reshape(-1)
+    samples = samples.astype(np.float32)
+    if is_float:
+        samples = samples * 32768.0
+
+    if sample_rate != STT_SAMPLE_RATE:
+        if sample_rate % STT_SAMPLE_RATE == 0:
+            # 整数倍降采样（例如48kHz）：先按块求平均做简单低通，再抽取
+            factor = sample_rate // STT_SAMPLE_RATE
+            usable = samples.size - samples.size % factor
+            samples = samples[:usable].reshape(-1, factor).mean(axis=1)
+        else:
+            target_size = int(round(samples.size * STT_SAMPLE_RATE / sample_rate))
+            positions = np.arange(target_size, dtype=np.float64) * (sample_rate / STT_SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(samples.size), samples).astype(np.float32)
+
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def _encode_wav(pcm):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(STT_SAMPLE_RATE)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def _encode_with_ffmpeg(pcm, codec_args):
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "s16le", "-ar", str(STT_SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+        *codec_args, "pipe:1",
+    ]
+    result = subprocess.run(command, input=pcm.tobytes(), capture_output=True, check=True)
+    return result.stdout
+
+
+def encode_for_upload(audio, upload_format="wav"):
+    """
+    把录音编码为上传文件
+
+    参数:
+        audio (tuple): (采样率, 音频数组)
+        upload_format (str): 'wav'、'flac' 或 'opus'；ffmpeg编码失败时退回 wav
+
+    返回:
+        tuple: (文件名, 文件内容, 实际使用的格式)
+    """
+    if upload_format not in UPLOAD_FORMATS:
+        logging.warning(f"不支持的语音识别上传格式 {upload_format}，改用 wav")
+        upload_format = "wav"
+    pcm = to_mono_16k(audio)
+    filename, codec_args = UPLOAD_FORMATS[upload_format]
+    if codec_args is not None:
+        try:
+            return filename, _encode_with_ffmpeg(pcm, codec_args), upload_format
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.error(f"使用ffmpeg编码 {upload_format} 失败，改用 wav: {e}")
+            filename, upload_format = UPLOAD_FORMATS["wav"][0], "wav"
+    return filename, _encode_wav(pcm), upload_format
+
@@ -0,0 +1,180 @@
+"""
+语音门限模块
+在转录前丢弃咳嗽、杂音等非语音输入，在转录后过滤Whisper常见的幻觉文本
+"""
+
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from utils.metrics_utils import register_stats
+
+# 是否启用语音门限
+STT_SPEECH_GATE = os.getenv("STT_SPEECH_GATE", "true").lower() in ("1", "true", "yes")
+# VAD检测到的语音总时长下限（秒），更短的输入（咳嗽、单个杂音）不会送去转录
+STT_MIN_SPEECH_SECONDS = float(os.getenv("STT_MIN_SPEECH_SECONDS", "0.25"))
+# 语音区域的音量下限（dBFS），更小的声音视为背景噪声
+STT_MIN_SPEECH_DBFS = float(os.getenv("STT_MIN_SPEECH_DBFS", "-45"))
+# 只有语音总时长不超过该值（秒）或音量低于该值（dBFS）的输入才检查幻觉文本，清楚的长句不会被误丢弃
+STT_HALLUCINATION_MAX_SECONDS = float(os.getenv("STT_HALLUCINATION_MAX_SECONDS", "2"))
+STT_HALLUCINATION_MAX_DBFS = float(os.getenv("STT_HALLUCINATION_MAX_DBFS", "-35"))
+
+# Whisper在静音或噪声上常见的幻觉文本（去掉空白和标点、转小写后与整个转录结果比较）
+WHISPER_HALLUCINATIONS = frozenset({
+    "谢谢观看", "谢谢大家观看", "感谢观看", "谢谢收看", "请订阅", "订阅我的频道",
+    "字幕志愿者", "中文字幕志愿者", "字幕by索兰娅", "优优独播剧场", "优优独播剧场youkudrama",
+    "優優獨播劇場", "優優獨播劇場youkudrama",
+    "ご視聴ありがとうございました", "ご清聴ありがとうございました", "チャンネル登録お願いします",
+    "thankyouforwatching", "thanksforwatching", "pleasesubscribe",
+})
+# 训练数据中常见的字幕署名，同样与整个（规范化后的）转录结果匹配，不匹配句子中的片段
+WHISPER_HALLUCINATION_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r"(中文)?字幕由.{0,12}提供",
+    r"字幕(提供|制作).{0,12}",
+    r".{0,12}amaraorg.{0,12}",
+    r"(请不吝)?点赞订阅转发(打赏支持)?(明镜与点点栏目)?",
+    r"明镜与点点栏目",
+))
+
+_PUNCTUATION_PATTERN = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+class _GateStats:
+    """统计被门限丢弃的输入数量及原因"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.dropped = {}  # 原因 -> 次数
+
+    def record(self, reason=None):
+        with self._lock:
+            self.checked += 1
+            if reason is not None:
+                self.dropped[reason] = self.dropped.get(reason, 0) + 1
+
+    def record_dropped(self, reason):
+        """转录后才发现需要丢弃的输入，转录前已经计入检查次数"""
+        with self._lock:
+            self.dropped[reason] = self.dropped.get(reason, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            dropped = sum(self.dropped.values())
+            return {
+                "checked": self.checked,
+                "dropped": dropped,
+                "dropped_share": dropped / self.checked if self.checked else 0.0,
+                "reasons": dict(self.dropped),
+            }
+
+
+_gate_stats = _GateStats()
+
+
+def get_speech_gate_stats():
+    """
+    获取语音门限的统计信息
+
+    返回:
+        dict: 检查次数、丢弃次数、丢弃比例（dropped_share）以及各原因的丢弃次数（reasons）
+    """
+    return _gate_stats.snapshot()
+
+
+register_stats("amadeus_speech_gate", get_speech_gate_stats, {
+    "checked": ("counter", "经过语音门限检查的输入次数"),
+    "dropped": ("counter", "被语音门限或幻觉过滤丢弃的输入次数"),
+    "reasons": ("counter", "按原因统计的丢弃次数", "reason"),
+    "dropped_share": ("gauge", "被丢弃的输入占检查次数的比例"),
+})
+
+
+def _speech_dbfs(samples, chunks):
+    """计算语音片段内的均方根音量（dBFS）"""
+    if chunks:
+        samples = np.concatenate([samples[int(chunk["start"]):int(chunk["end"])] for chunk in chunks])
+    if samples.size == 0:
+        return float("-inf")
+    rms = np.sqrt(np.mean(np.square(samples.astype(np.float64)))) / 32768.0
+    return 20 * np.log10(rms) if rms > 0 else float("-inf")
+
+
+def check_speech_gate(audio, speech_seconds, chunks):
+    """
+    判断输入是否像一句真正的话，不像时不必转录
+
+    参数:
+        audio (tuple): detect_speech 返回的16kHz单声道录音
+        speech_seconds (float): detect_speech 返回的语音总时长
+        chunks (list): detect_speech 返回的语音片段
+
+    返回:
+        str: 输入应被丢弃时返回原因，否则返回None
+    """
+    if not STT_SPEECH_GATE:
+        return None
+    reason = None
+    if speech_seconds < STT_MIN_SPEECH_SECONDS:
+        reason = "too_short"
+    elif _speech_dbfs(audio[1], chunks) < STT_MIN_SPEECH_DBFS:
+        reason = "too_quiet"
+    _gate_stats.record(reason)
+    return reason
+
+
+def may_be_hallucination(audio, speech_seconds, chunks):
+    """
+    判断输入是否短或安静到容易让Whisper产生幻觉文本，只有这样的输入才需要过滤转录结果
+
+    参数:
+        audio (tuple): detect_speech 返回的16kHz单声道录音
+        speech_seconds (float): detect_speech 返回的语音总时长
+        chunks (list): detect_speech 返回的语音片段
+
+    返回:
+        bool: 需要检查幻觉文本时返回True；未启用语音门限时总是返回False
+    """
+    if not STT_SPEECH_GATE:
+        return False
+    return speech_seconds <= STT_HALLUCINATION_MAX_SECONDS or _speech_dbfs(audio[1], chunks) < STT_HALLUCINATION_MAX_DBFS
+
+
+def matches_whisper_hallucination(text):
+    """
+    判断整个转录结果是否就是Whisper常见的幻觉文本，不统计
+
+    参数:
+        text (str): 转录结果
+
+    返回:
+        bool: 是幻觉文本时返回True
+    """
+    normalized = _PUNCTUATION_PATTERN.sub("", unicodedata.normalize("NFKC", text or "")).lower()
+    if not normalized:
+        return False
+    return normalized in WHISPER_HALLUCINATIONS or any(pattern.fullmatch(normalized) for pattern in WHISPER_HALLUCINATION_PATTERNS)
+
+
+def is_whisper_hallucination(text, audio, speech_seconds, chunks):
+    """
+    判断一句话的转录结果是否是Whisper常见的幻觉文本
+
+    只检查短或安静的输入；每句话只应调用一次，被丢弃时计入语音门限的统计。
+
+    参数:
+        text (str): 转录结果
+        audio (tuple): detect_speech 返回的16kHz单声道录音
+        speech_seconds (float): detect_speech 返回的语音总时长
+        chunks (list): detect_speech 返回的语音片段
+
+    返回:
+        bool: 是幻觉文本时返回True
+    """
+    hallucination = may_be_hallucination(audio, speech_seconds, chunks) and matches_whisper_hallucination(text)
+    if hallucination:
+        _gate_stats.record_dropped("hallucination")
+    return hallucination
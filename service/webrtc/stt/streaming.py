@@ -0,0 +1,252 @@
+"""
+流式转录模块
+用户说话时按窗口分段转录，检测到停顿后只需转录最后一段，完整的转录结果几乎在停顿时就能得到
+"""
+
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from fastrtc import ReplyOnPause
+
+from utils.async_utils import submit_async
+from .gate import matches_whisper_hallucination
+
+# 是否在用户说话时分段转录，以及每段的目标时长（秒）
+STT_STREAMING = os.getenv("STT_STREAMING", "false").lower() in ("1", "true", "yes")
+STT_STREAMING_WINDOW_SECONDS = float(os.getenv("STT_STREAMING_WINDOW_SECONDS", "4"))
+# 停顿后等待各窗口转录结果的最长时间（秒），超时视为失败，改为整句转录
+STT_STREAMING_WINDOW_TIMEOUT = float(os.getenv("STT_STREAMING_WINDOW_TIMEOUT", "10"))
+# 处理窗口（VAD、提交转录）的线程数，所有连接共用；同一连接的窗口按顺序处理
+STT_STREAMING_WORKERS = int(os.getenv("STT_STREAMING_WORKERS", "4"))
+# 检测到停顿后，调用对话函数前等待本连接未处理完的窗口的最长时间（秒）
+_WINDOW_DRAIN_TIMEOUT = 1.0
+# 在窗口末尾多长的范围内寻找最安静的位置作为切分点（秒），以及比较音量时的帧长（秒），避免把一个字切成两半
+_CUT_SEARCH_SECONDS = 1.0
+_CUT_FRAME_SECONDS = 0.02
+
+
+def find_cut_point(samples, start, end, sample_rate):
+    """
+    在 [start, end) 的末尾一段中找出最安静的帧，返回该帧中点的位置
+
+    参数:
+        samples (numpy.ndarray): 一维音频样本
+        start (int): 窗口起点
+        end (int): 窗口终点
+        sample_rate (int): 采样率
+
+    返回:
+        int: 切分点的样本位置
+    """
+    frame = max(1, int(sample_rate * _CUT_FRAME_SECONDS))
+    search_start = max(start, end - int(sample_rate * _CUT_SEARCH_SECONDS))
+    frames = (end - search_start) // frame
+    if frames <= 0:
+        return end
+    region = samples[search_start:search_start + frames * frame].astype(np.float32).reshape(frames, frame)
+    quietest = int(np.argmin(np.square(region).mean(axis=1)))
+    return search_start + quietest * frame + frame // 2
+
+
+def _join_transcripts(parts):
+    """按顺序拼接各段转录结果，两侧都是英文字母或数字时用空格分隔"""
+    text = ""
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        if text and text[-1].isascii() and text[-1].isalnum() and part[0].isascii() and part[0].isalnum():
+            text += " "
+        text += part
+    return text
+
+
+class StreamingTranscription:
+    """
+    一句话的分段转录
+
+    每个窗口的转录立即提交到共享事件循环，与用户继续说话并行进行；finish 只需再转录
+    最后一段，然后按顺序拼接各段结果。
+    """
+
+    def __init__(self, transcribe_fn, sample_rate):
+        """
+        初始化分段转录
+
+        参数:
+            transcribe_fn (callable): 协程函数，transcribe_fn(audio) 返回一段录音的转录文本，失败时必须抛出异常
+            sample_rate (int): 录音的采样率，窗口位置都以此采样率下的样本数表示
+        """
+        self._transcribe_fn = transcribe_fn
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._futures = []  # (转录的Future, 是否需要过滤幻觉文本)
+        self.transcribed_samples = 0  # 已提交转录的录音长度
+
+    def add_window(self, audio, end_sample, filter_hallucination=False):
+        """
+        提交一个窗口的转录
+
+        参数:
+            audio (tuple): 窗口录音 (采样率, 音频数组)，窗口中没有语音时传入None，只推进位置
+            end_sample (int): 窗口在整句录音中的终点
+            filter_hallucination (bool): 窗口的语音短或安静（见 may_be_hallucination），转录结果整段是幻觉文本时丢弃
+        """
+        with self._lock:
+            if audio is not None:
+                self._futures.append((submit_async(self._transcribe_fn, audio), filter_hallucination))
+            self.transcribed_samples = end_sample
+
+    def tail(self, audio):
+        """
+        取出整句录音中尚未转录的部分
+
+        参数:
+            audio (tuple): 停顿后得到的整句录音
+
+        返回:
+            tuple: 剩余部分的录音；整句录音与已转录的窗口对不上时返回None
+        """
+        sample_rate, samples = audio
+        samples = np.asarray(samples).reshape(-1)
+        if sample_rate != self.sample_rate or samples.size < self.transcribed_samples:
+            return None
+        return sample_rate, samples[self.transcribed_samples:]
+
+    def finish(self, tail_audio, filter_hallucination=False):
+        """
+        转录最后一段并拼接完整的转录结果
+
+        参数:
+            tail_audio (tuple): 最后一段录音，没有语音时传入None
+            filter_hallucination (bool): 最后一段的语音短或安静，转录结果整段是幻觉文本时丢弃
+
+        返回:
+            str: 完整的转录结果；有窗口转录出错时返回None，由调用方改为整句转录
+        """
+        with self._lock:
+            futures = list(self._futures)
+        if tail_audio is not None:
+            futures.append((submit_async(self._transcribe_fn, tail_audio), filter_hallucination))
+        parts = []
+        for future, filter_window in futures:
+            try:
+                text = future.result(timeout=STT_STREAMING_WINDOW_TIMEOUT)
+            except Exception as e:
+                logging.error(f"分段转录出错或超时，改为整句转录: {e!r}")
+                self.cancel()
+                return None
+            # 语音短或安静的窗口容易出现幻觉文本，只丢弃这一段；整句的幻觉检查和统计由调用方在拼接后进行
+            if text and not (filter_window and matches_whisper_hallucination(text)):
+                parts.append(text)
+        logging.info(f"分段转录完成: 共 {len(futures)} 段，最后一段{'需要' if tail_audio is not None else '不需要'}转录")
+        return _join_transcripts(parts)
+
+    def cancel(self):
+        """取消尚未完成的窗口转录"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future, _ in futures:
+            future.cancel()
+
+
+_window_executor = ThreadPoolExecutor(max_workers=STT_STREAMING_WORKERS, thread_name_prefix="stt-window")
+
+
+class StreamingReplyOnPause(ReplyOnPause):
+    """
+    在用户说话过程中按窗口切出录音的 ReplyOnPause
+
+    用户开始说话后，每累积约 window_seconds 秒的录音就在末尾最安静的位置切出一个窗口，
+    交给 on_speech_window 回调；检测到停顿后仍按原来的方式调用对话函数。
+    回调（VAD、编码和提交转录）在共享的线程池中按顺序执行，不占用接收音频帧的线程。
+    """
+
+    def __init__(self, fn, *args, on_speech_window=None, window_seconds=STT_STREAMING_WINDOW_SECONDS, **kwargs):
+        """
+        初始化处理器
+
+        参数:
+            fn (callable): 对话函数，与 ReplyOnPause 相同
+            on_speech_window (callable): 窗口回调，参数为 (窗口录音, 窗口起点, 窗口终点, *对话函数的附加参数)，
+                窗口起点为0表示一句新的话
+            window_seconds (float): 每个窗口的目标时长（秒）
+            其余参数与 ReplyOnPause 相同
+        """
+        super().__init__(fn, *args, **kwargs)
+        self.on_speech_window = on_speech_window
+        self.window_seconds = window_seconds
+        self._window_state = None
+        self._window_offset = 0
+        self._window_lock = threading.Lock()
+        self._pending_windows = deque()
+        self._windows_idle = threading.Event()
+        self._windows_idle.set()
+
+    def copy(self):
+        return StreamingReplyOnPause(
+            self.fn,
+            startup_fn=self.startup_fn,
+            algo_options=self.algo_options,
+            model_options=self.model_options,
+            can_interrupt=self.can_interrupt,
+            expected_layout=self.expected_layout,
+            output_sample_rate=self.output_sample_rate,
+            input_sample_rate=self.input_sample_rate,
+            model=self.model,
+            on_speech_window=self.on_speech_window,
+            window_seconds=self.window_seconds,
+        )
+
+    def receive(self, frame):
+        super().receive(frame)
+        if self.on_speech_window is None:
+            return
+        state = self.state
+        if state is not self._window_state:
+            # 上一句话已经处理完，状态被重置
+            self._window_state = state
+            self._window_offset = 0
+        if not state.started_talking or state.pause_detected or state.stream is None or not self.args_set.is_set():
+            return
+        sample_rate = state.sampling_rate
+        stream = state.stream
+        if len(stream) - self._window_offset < self.window_seconds * sample_rate:
+            return
+        start = self._window_offset
+        end = find_cut_point(stream, start, len(stream), sample_rate)
+        self._window_offset = end
+        self._submit_window((sample_rate, stream[start:end].copy()), start, end, *self.latest_args[1:])
+
+    def _submit_window(self, *window_args):
+        """把窗口交给线程池；同一连接同时只有一个任务在处理窗口，保证窗口按顺序处理"""
+        with self._window_lock:
+            self._pending_windows.append(window_args)
+            if not self._windows_idle.is_set():
+                return
+            self._windows_idle.clear()
+        _window_executor.submit(self._process_windows)
+
+    def _process_windows(self):
+        while True:
+            with self._window_lock:
+                if not self._pending_windows:
+                    self._windows_idle.set()
+                    return
+                window_args = self._pending_windows.popleft()
+            try:
+                self.on_speech_window(*window_args)
+            except Exception as e:
+                logging.error(f"处理转录窗口时出错: {e}")
+
+    def emit(self):
+        # 检测到停顿、即将调用对话函数时，先让已切出的窗口处理完，对话函数才能看到这句话完整的分段转录；
+        # 回复输出过程中不等待，避免卡住音频输出
+        starting_reply = self.event.is_set() and getattr(self, "generator", None) is None
+        if starting_reply and not self._windows_idle.wait(_WINDOW_DRAIN_TIMEOUT):
+            logging.warning("等待转录窗口处理超时，这句话可能改为整句转录")
+        return super().emit()
@@ -3,11 +3,14 @@
 提供将音频转换为文本的功能
 """
 
+import asyncio
 import logging
 import os
-from fastrtc import audio_to_bytes
+import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from utils.client_utils import get_openai_client
+from utils.metrics_utils import Histogram, observe_stage, provider_label, register_histogram
+from .encoding import encode_for_upload
 
 # 加载环境变量
 load_dotenv()
@@ -16,8 +19,45 @@ load_dotenv()
 DEFAULT_WHISPER_API_KEY = os.getenv("WHISPER_API_KEY", "")
 DEFAULT_WHISPER_BASE_URL = os.getenv("WHISPER_BASE_URL", "")
 DEFAULT_WHISPER_MODEL = os.getenv("WHISPER_MODEL", "whisper-large-v3")
+# 上传给语音识别服务的音频格式：wav（不压缩，编码最快）、flac（无损压缩）或 opus（体积最小）
+STT_UPLOAD_FORMAT = os.getenv("STT_UPLOAD_FORMAT", "wav").lower()
 
-async def transcribe(audio, api_key=None, base_url=None, model=None):
+# 按上传格式统计上传体积和整次转录（编码、上传和识别）耗时，用于为当前部署选择总耗时最低的格式，
+# 编码耗时见 amadeus_stage_seconds{stage="stt_encode"}，其中 model 标签为上传格式
+UPLOAD_BYTES = register_histogram(Histogram(
+    "amadeus_stt_upload_bytes",
+    "上传给语音识别服务的音频体积（字节）",
+    ("format",),
+    buckets=(8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576, 2097152, 4194304),
+))
+TRANSCRIBE_SECONDS = register_histogram(Histogram(
+    "amadeus_stt_transcribe_seconds",
+    "整次转录的耗时（秒），包括编码、上传和识别",
+    ("format",),
+))
+
+def _transcribe_sync(client, audio, model, upload_format, provider=""):
+    """在工作线程中编码音频并请求转录，同时记录各阶段耗时"""
+    start_time = time.perf_counter()
+    filename, data, upload_format = encode_for_upload(audio, upload_format)
+    encode_seconds = time.perf_counter() - start_time
+    response = client.audio.transcriptions.create(
+        model=model,
+        file=(filename, data),
+        response_format="json"
+    )
+    total_seconds = time.perf_counter() - start_time
+    UPLOAD_BYTES.observe(len(data), format=upload_format)
+    TRANSCRIBE_SECONDS.observe(total_seconds, format=upload_format)
+    observe_stage("stt_encode", encode_seconds, provider="local", model=upload_format)
+    observe_stage("stt_request", total_seconds - encode_seconds, provider=provider, model=model)
+    logging.info(
+        f"转录耗时: 格式 {upload_format}，编码 {encode_seconds * 1000:.1f}ms，"
+        f"上传 {len(data)} 字节，上传和识别 {(total_seconds - encode_seconds) * 1000:.1f}ms"
+    )
+    return response
+
+async def transcribe(audio, api_key=None, base_url=None, model=None, upload_format=None, raise_on_error=False):
     """
     将音频数据转换为文本
     
@@ -26,6 +66,8 @@ async def transcribe(audio, api_key=None, base_url=None, model=None):
         api_key (str, optional): Whisper API 密钥，如不指定则使用默认值
         base_url (str, optional): Whisper API 基础 URL，如不指定则使用默认值
         model (str, optional): Whisper 模型名称，如不指定则使用默认值
+        upload_format (str, optional): 上传的音频格式（wav、flac 或 opus），如不指定则使用 STT_UPLOAD_FORMAT
+        raise_on_error (bool): 失败时抛出异常而不是返回空字符串，供需要区分"没有说话"和"转录失败"的调用方使用
         
     返回:
         str: 识别的文本，如果失败则返回空字符串
@@ -40,6 +82,8 @@ async def transcribe(audio, api_key=None, base_url=None, model=None):
     # 检查必要的 API 密钥和基础 URL
     if not whisper_api_key or not whisper_base_url:
         logging.error("缺少 Whisper API 密钥或基础 URL，无法进行转录")
+        if raise_on_error:
+            raise RuntimeError("缺少 Whisper API 密钥或基础 URL")
         return ""
     
     # 日志记录使用的模型
@@ -47,16 +91,17 @@ async def transcribe(audio, api_key=None, base_url=None, model=None):
     
     # 尝试使用 OpenAI 客户端
     try:
-        # 为每次请求创建一个新的客户端
-        transcription_client = OpenAI(
-            api_key=whisper_api_key,
-            base_url=whisper_base_url
-        )
+        # 从注册表获取共享客户端，复用长连接
+        transcription_client = get_openai_client(whisper_base_url, whisper_api_key)
         
-        response = transcription_client.audio.transcriptions.create(
-            model=whisper_model,
-            file=("audio-file.mp3", audio_to_bytes(audio)),
-            response_format="json"
+        # 音频先下混、重采样为16kHz单声道再编码；编码和同步客户端的请求都放到线程中执行，避免阻塞共享事件循环
+        response = await asyncio.to_thread(
+            _transcribe_sync,
+            transcription_client,
+            audio,
+            whisper_model,
+            upload_format or STT_UPLOAD_FORMAT,
+            provider_label(whisper_base_url)
         )
         # 打印完整响应到日志
         logging.info(f"转录API响应: {response}")
@@ -77,4 +122,6 @@ async def transcribe(audio, api_key=None, base_url=None, model=None):
     except Exception as e:
         # 记录错误
         logging.error(f"转录失败: {str(e)}")
+        if raise_on_error:
+            raise
         return ""  # 失败时返回空字符串 
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+语音活动检测模块
+使用已加载的VAD模型找出录音中的语音区域，在上传前裁掉首尾的静音
+"""
+
+import logging
+import os
+import threading
+
+from utils.metrics_utils import Histogram, register_histogram, register_stats
+
+from .encoding import STT_SAMPLE_RATE, to_mono_16k
+
+# 是否在转录前裁掉录音首尾的静音，以及语音区域两侧保留的余量（毫秒）
+STT_TRIM_SILENCE = os.getenv("STT_TRIM_SILENCE", "true").lower() in ("1", "true", "yes")
+STT_TRIM_PADDING_MS = int(os.getenv("STT_TRIM_PADDING_MS", "200"))
+
+# 每轮对话裁掉的静音时长（秒）
+TRIMMED_SECONDS = register_histogram(Histogram(
+    "amadeus_stt_trimmed_seconds",
+    "每轮对话转录前裁掉的静音时长（秒）",
+    (),
+    buckets=(0.0, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0),
+))
+
+
+def detect_speech(audio, vad_model):
+    """
+    检测录音中的语音区域
+
+    参数:
+        audio (tuple): (采样率, 音频数组)
+        vad_model: fastrtc 的停顿检测模型（例如 HumAwareVADModel），vad 方法返回语音时长和语音片段
+
+    返回:
+        tuple: (16kHz单声道录音, 语音总时长（秒）, 语音片段列表)，片段的 start/end 是16kHz下的样本位置
+    """
+    samples = to_mono_16k(audio)
+    if samples.size == 0:
+        return (STT_SAMPLE_RATE, samples), 0.0, []
+    speech_seconds, chunks = vad_model.vad((STT_SAMPLE_RATE, samples), None)
+    return (STT_SAMPLE_RATE, samples), speech_seconds, list(chunks)
+
+
+class _TrimStats:
+    """统计每轮对话裁掉的静音时长"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.input_seconds = 0.0
+        self.removed_seconds = 0.0
+
+    def record(self, input_seconds, removed_seconds):
+        with self._lock:
+            self.turns += 1
+            self.input_seconds += input_seconds
+            self.removed_seconds += removed_seconds
+        TRIMMED_SECONDS.observe(removed_seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "input_seconds": self.input_seconds,
+                "removed_seconds": self.removed_seconds,
+                "removed_per_turn": self.removed_seconds / self.turns if self.turns else 0.0,
+                "removed_share": self.removed_seconds / self.input_seconds if self.input_seconds else 0.0,
+            }
+
+
+_trim_stats = _TrimStats()
+
+
+def get_trim_stats():
+    """
+    获取静音裁剪的统计信息
+
+    返回:
+        dict: 轮数、录音总时长、裁掉的总时长、平均每轮裁掉的时长（removed_per_turn）以及裁掉的比例（removed_share）
+    """
+    return _trim_stats.snapshot()
+
+
+register_stats("amadeus_stt_trim", get_trim_stats, {
+    "input_seconds": ("counter", "进入静音裁剪的录音总时长（秒）"),
+    "removed_share": ("gauge", "裁掉的静音占录音总时长的比例"),
+})
+
+
+def trim_silence(audio, chunks, padding_ms=STT_TRIM_PADDING_MS):
+    """
+    按语音片段裁掉录音首尾的静音，语音片段之间的停顿保留不变
+
+    参数:
+        audio (tuple): detect_speech 返回的16kHz单声道录音
+        chunks (list): detect_speech 返回的语音片段
+        padding_ms (int): 语音区域两侧保留的余量（毫秒），避免切掉轻声的开头和结尾
+
+    返回:
+        tuple: (裁剪后的录音, 裁掉的时长（秒）)；没有检测到语音时原样返回
+    """
+    sample_rate, samples = audio
+    if samples.size == 0:
+        return audio, 0.0
+    if not chunks:
+        _trim_stats.record(samples.size / sample_rate, 0.0)
+        return audio, 0.0
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(0, int(chunks[0]["start"]) - padding)
+    end = min(samples.size, int(chunks[-1]["end"]) + padding)
+    removed_seconds = (samples.size - (end - start)) / sample_rate
+    _trim_stats.record(samples.size / sample_rate, removed_seconds)
+    logging.info(f"裁掉静音 {removed_seconds:.2f} 秒，剩余 {(end - start) / sample_rate:.2f} 秒")
+    return (sample_rate, samples[start:end]), removed_seconds
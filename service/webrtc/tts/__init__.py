@@ -3,6 +3,6 @@
 提供将文本转换为语音的功能
 """
 
-from .speech import text_to_speech_stream, translate_text
+from .speech import text_to_speech_stream, text_to_speech_stream_async, text_to_speech_stream_via_async, translate_text, get_tts_cache_stats, get_translation_cache_stats
 
-__all__ = ['text_to_speech_stream', 'translate_text'] 
\ No newline at end of file
+__all__ = ['text_to_speech_stream', 'text_to_speech_stream_async', 'text_to_speech_stream_via_async', 'translate_text', 'get_tts_cache_stats', 'get_translation_cache_stats'] 
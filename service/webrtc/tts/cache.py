@@ -0,0 +1,252 @@
+"""
+合成音频缓存模块
+缓存短句的PCM合成结果，相同的问候语、拒绝语和口头禅不必每次都重新请求TTS服务
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# 磁盘缓存文件的扩展名，临时文件写完后再改名，避免读到写了一半的文件
+_CACHE_FILE_SUFFIX = ".pcm"
+_TEMP_FILE_SUFFIX = ".tmp"
+
+
+def normalize_text(text):
+    """
+    规范化待合成的文本，让只有空白或全半角差异的文本命中同一条缓存
+
+    参数:
+        text (str): 原始文本
+
+    返回:
+        str: 规范化后的文本
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_cache_key(text, voice, model, sample_rate, endpoint=""):
+    """
+    根据规范化文本、声音、模型、采样率和TTS服务地址生成缓存键
+
+    不同服务（例如本地的模拟服务和正式服务）合成的音频不会混用同一条缓存。
+
+    返回:
+        str: 十六进制的缓存键，同时用作磁盘缓存的文件名
+    """
+    material = "\x1f".join((normalize_text(text), voice or "", model or "", str(sample_rate), endpoint or ""))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TtsAudioCache:
+    """
+    两级PCM音频缓存
+
+    第一级是按字节数限制大小的内存LRU；第二级是磁盘目录，每条缓存一个文件，
+    命中时通过内存映射读取，由操作系统页缓存负责热数据，不需要把整个文件读进内存。
+    磁盘命中的数据会提升到内存层。两级都按最近使用时间淘汰。
+    """
+
+    def __init__(self, memory_limit_bytes, disk_dir=None, disk_limit_bytes=0):
+        """
+        初始化缓存
+
+        参数:
+            memory_limit_bytes (int): 内存层最多保存的PCM字节数，为0时不使用内存层
+            disk_dir (str, optional): 磁盘层目录，不指定时不使用磁盘层
+            disk_limit_bytes (int): 磁盘层最多保存的PCM字节数，为0时不使用磁盘层
+        """
+        self.memory_limit_bytes = memory_limit_bytes
+        self.disk_limit_bytes = disk_limit_bytes if disk_dir else 0
+        self.disk_dir = disk_dir if self.disk_limit_bytes > 0 else None
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # 缓存键 -> PCM字节，最近使用的在末尾
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # 缓存键 -> 文件大小，最近使用的在末尾
+        self._disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            self._load_disk_index()
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key + _CACHE_FILE_SUFFIX)
+
+    def _load_disk_index(self):
+        """扫描磁盘目录重建索引，按文件修改时间恢复使用顺序"""
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.disk_dir):
+                path = os.path.join(self.disk_dir, name)
+                if name.endswith(_TEMP_FILE_SUFFIX):
+                    # 上次进程退出时没有写完的临时文件
+                    os.remove(path)
+                    continue
+                if not name.endswith(_CACHE_FILE_SUFFIX):
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-len(_CACHE_FILE_SUFFIX)], stat.st_size))
+        except OSError as e:
+            logging.error(f"读取TTS磁盘缓存目录失败，不使用磁盘缓存: {e}")
+            self.disk_dir = None
+            self.disk_limit_bytes = 0
+            return
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        logging.info(f"TTS磁盘缓存已加载: {len(self._disk)} 条, {self._disk_bytes} 字节")
+
+    def _evict_memory(self):
+        while self._memory_bytes > self.memory_limit_bytes and self._memory:
+            _, data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_limit_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _remember(self, key, data):
+        """把数据放入内存层，超过单条上限的数据不进入内存层；调用方需持有锁"""
+        if len(data) > self.memory_limit_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        self._evict_memory()
+
+    @contextmanager
+    def open(self, key):
+        """
+        查找缓存条目
+
+        内存命中时返回缓存的字节；磁盘命中时返回只读的内存映射，离开上下文时关闭。
+        调用方必须在上下文内用完数据，且不能保留指向内存映射的视图。
+
+        用法:
+            with cache.open(key) as data:
+                if data is not None:
+                    ...
+
+        返回:
+            bytes | mmap.mmap | None: 缓存的PCM数据，未命中时为None
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            elif key in self._disk:
+                self._disk.move_to_end(key)
+            else:
+                self.misses += 1
+                key = None
+        if data is not None or key is None:
+            yield data
+            return
+
+        mapped = self._map_file(key)
+        if mapped is None:
+            with self._lock:
+                self.misses += 1
+            yield None
+            return
+        try:
+            # 复制到内存层在锁外进行，不阻塞其他线程查找缓存
+            promoted = bytes(mapped) if 0 < len(mapped) <= self.memory_limit_bytes else None
+            with self._lock:
+                self.disk_hits += 1
+                if promoted is not None:
+                    self._remember(key, promoted)
+            yield mapped
+        finally:
+            mapped.close()
+
+    def _map_file(self, key):
+        """以只读方式映射磁盘缓存文件，文件丢失或损坏时从索引中移除"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # 更新修改时间，重启后仍能按使用顺序淘汰
+            os.utime(path)
+            return mapped
+        except (OSError, ValueError) as e:
+            logging.warning(f"读取TTS磁盘缓存文件失败: {e}")
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+
+    def put(self, key, data):
+        """
+        保存一条合成结果到两级缓存
+
+        参数:
+            key (str): make_cache_key 生成的缓存键
+            data (bytes): 完整的PCM字节
+        """
+        if not data:
+            return
+        data = bytes(data)
+        with self._lock:
+            if self.memory_limit_bytes > 0:
+                self._remember(key, data)
+            if not self.disk_dir or key in self._disk or len(data) > self.disk_limit_bytes:
+                return
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}{_TEMP_FILE_SUFFIX}"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"写入TTS磁盘缓存文件失败: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+                self._evict_disk()
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        返回:
+            dict: 各级命中次数、未命中次数、命中率以及两级缓存的条目数和字节数
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
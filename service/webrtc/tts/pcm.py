@@ -0,0 +1,152 @@
+"""
+PCM音频分帧模块
+把网络上任意大小到达的16位PCM数据切分成固定时长的音频帧
+"""
+
+import numpy as np
+
+# int16 样本转换为 -1 到 1 之间浮点数的缩放系数
+_INT16_SCALE = np.float32(1.0 / 32768.0)
+
+
+def _convert_pcm(raw, output_dtype):
+    """把一段连续的原始字节转换为输出数组，这是每帧唯一的一次内存分配"""
+    samples = np.frombuffer(raw, dtype=np.int16)
+    if output_dtype == "int16":
+        return samples.copy()
+    out = np.empty(samples.shape[0], dtype=np.float32)
+    np.multiply(samples, _INT16_SCALE, out=out)
+    return out
+
+
+class PcmFramer:
+    """
+    16位PCM数据的固定时长分帧器
+
+    网络数据写入预先分配的环形缓冲区，每凑满一帧就输出一帧。缓冲区容量是帧大小的整数倍，
+    读位置总是对齐到帧边界，因此每一帧在缓冲区中都是连续的，可以直接在原内存上转换，
+    不需要先切片复制。每帧只分配一次输出数组：float32 输出直接把换算结果写入输出数组，
+    int16 输出则原样复制，不做任何转换。
+    """
+
+    def __init__(self, sample_rate, frame_ms=20, output_dtype="float32", capacity_frames=32):
+        """
+        初始化分帧器
+
+        参数:
+            sample_rate (int): 采样率
+            frame_ms (int): 每帧时长（毫秒），默认20毫秒，与WebRTC的打包间隔一致
+            output_dtype (str): 输出数据类型，'float32'（-1到1之间）或 'int16'（原始样本）
+            capacity_frames (int): 环形缓冲区初始可容纳的帧数，数据突发超过容量时自动扩容
+        """
+        if output_dtype not in ("float32", "int16"):
+            raise ValueError(f"不支持的输出数据类型: {output_dtype}")
+        self.sample_rate = sample_rate
+        self.frame_samples = max(1, sample_rate * frame_ms // 1000)
+        self.frame_bytes = self.frame_samples * 2
+        self.output_dtype = output_dtype
+        self._ring = bytearray(self.frame_bytes * capacity_frames)
+        self._view = memoryview(self._ring)
+        self._read = 0  # 读位置，总是对齐到帧边界
+        self._size = 0  # 缓冲区中尚未输出的字节数
+
+    def _grow(self, needed):
+        """扩容环形缓冲区，并把未输出的数据按顺序搬到新缓冲区开头"""
+        capacity = len(self._ring)
+        while capacity < needed:
+            capacity *= 2
+        ring = bytearray(capacity)
+        first = min(self._size, len(self._ring) - self._read)
+        ring[:first] = self._view[self._read:self._read + first]
+        ring[first:self._size] = self._view[:self._size - first]
+        self._view.release()
+        self._ring = ring
+        self._view = memoryview(ring)
+        self._read = 0
+
+    def _write(self, data):
+        """把数据写入环形缓冲区的空闲位置，必要时在缓冲区末尾折返"""
+        length = len(data)
+        if self._size + length > len(self._ring):
+            self._grow(self._size + length)
+        capacity = len(self._ring)
+        start = (self._read + self._size) % capacity
+        first = min(length, capacity - start)
+        self._view[start:start + first] = data[:first]
+        if first < length:
+            self._view[:length - first] = data[first:]
+        self._size += length
+
+    def _take(self, length):
+        """从读位置取出指定字节数并转换，读位置随后前进"""
+        raw = self._view[self._read:self._read + length]
+        try:
+            frame = _convert_pcm(raw, self.output_dtype)
+        finally:
+            raw.release()
+        self._read = (self._read + length) % len(self._ring)
+        self._size -= length
+        return frame
+
+    def feed(self, data):
+        """
+        写入新到达的PCM数据
+
+        参数:
+            data (bytes): 任意长度的原始PCM字节
+
+        返回:
+            list: 本次凑满的完整音频帧列表
+        """
+        if data:
+            self._write(data)
+        frames = []
+        while self._size >= self.frame_bytes:
+            frames.append(self._take(self.frame_bytes))
+        return frames
+
+    def flush(self):
+        """
+        取出流结束时缓冲区中剩余的完整样本（不足一帧），不足一个样本的字节直接丢弃
+
+        返回:
+            numpy.ndarray: 剩余样本组成的音频帧，没有剩余样本时返回None
+        """
+        remaining = (self._size // 2) * 2
+        frame = self._take(remaining) if remaining else None
+        self._read = 0
+        self._size = 0
+        return frame
+
+
+def iter_pcm_frames(data, sample_rate, frame_ms=20, output_dtype="float32"):
+    """
+    把一段完整的16位PCM数据切分成固定时长的音频帧
+
+    与 PcmFramer 的分帧结果相同，但数据已经全部在内存（或内存映射文件）中，
+    每帧直接在原数据上转换，不经过环形缓冲区
+
+    参数:
+        data (bytes-like): 完整的原始PCM字节，支持 bytes、memoryview 和 mmap
+        sample_rate (int): 采样率
+        frame_ms (int): 每帧时长（毫秒）
+        output_dtype (str): 输出数据类型，'float32' 或 'int16'
+
+    返回:
+        generator: 依次生成音频帧，除最后一帧外每帧时长固定
+    """
+    if output_dtype not in ("float32", "int16"):
+        raise ValueError(f"不支持的输出数据类型: {output_dtype}")
+    frame_bytes = max(1, sample_rate * frame_ms // 1000) * 2
+    view = memoryview(data)
+    try:
+        total = (len(view) // 2) * 2
+        for start in range(0, total, frame_bytes):
+            raw = view[start:min(start + frame_bytes, total)]
+            try:
+                frame = _convert_pcm(raw, output_dtype)
+            finally:
+                raw.release()
+            yield frame
+    finally:
+        view.release()
@@ -3,14 +3,23 @@
 提供将文本转换为语音的功能
 """
 
+import asyncio
+import functools
 import logging
 import os
+import threading
+import time
+from contextlib import closing
+import aiohttp
 import requests
-import numpy as np
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor
-import json
-from openai import OpenAI
+from utils.async_utils import iterate_async_generator
+from utils.client_utils import get_openai_client
+from utils.metrics_utils import observe_stage, provider_label, register_stats
+from .pcm import PcmFramer, iter_pcm_frames
+from .cache import TtsAudioCache, make_cache_key, normalize_text
 
 # 加载环境变量
 load_dotenv()
@@ -18,21 +27,148 @@ load_dotenv()
 # 从环境变量获取默认的 API 密钥和语音模型
 DEFAULT_SILICONFLOW_API_KEY = os.getenv("SILICONFLOW_API_KEY", "")
 DEFAULT_SILICONFLOW_VOICE = os.getenv("SILICONFLOW_VOICE", "speech:siliconflow-kurisu:clzv7bjjm041fufyct2z0setm:mphrsbbmvrjfophbsted")
+# SiliconFlow API 基础 URL，可以指向本地的模拟服务进行基准测试
+DEFAULT_SILICONFLOW_BASE_URL = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1")
+DEFAULT_SILICONFLOW_MODEL = os.getenv("SILICONFLOW_TTS_MODEL", "FunAudioLLM/CosyVoice2-0.5B")
+
+# TTS HTTP 连接池配置：池中保持的最大长连接数，以及连接和读取超时（秒）
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", "10"))
+TTS_CONNECT_TIMEOUT = float(os.getenv("TTS_CONNECT_TIMEOUT", "5"))
+TTS_READ_TIMEOUT = float(os.getenv("TTS_READ_TIMEOUT", "30"))
+# TTS输出的音频帧时长（毫秒）和数据类型，默认20毫秒一帧与WebRTC打包间隔一致
+# 数据类型为 float32 时输出-1到1之间的浮点数，为 int16 时直接输出原始样本
+TTS_FRAME_MS = int(os.getenv("TTS_FRAME_MS", "20"))
+TTS_OUTPUT_DTYPE = os.getenv("TTS_OUTPUT_DTYPE", "float32")
+# 异步TTS客户端同时打开的最大连接数，一个事件循环即可驱动数百个TTS流
+TTS_ASYNC_POOL_SIZE = int(os.getenv("TTS_ASYNC_POOL_SIZE", "200"))
+# 翻译结果缓存的最大条目数，按 (文本, 源语言, 目标语言) 缓存，重复的句子不再请求翻译模型
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "1024"))
+# 合成音频缓存配置：内存层和磁盘层的容量（MB），磁盘层目录，以及可缓存文本的最大长度
+# 只缓存问候语、口头禅之类的短句，容量设为0即关闭对应的缓存层
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "512"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tts_cache"))
+TTS_CACHE_MAX_TEXT_LENGTH = int(os.getenv("TTS_CACHE_MAX_TEXT_LENGTH", "40"))
 
 # 从环境变量获取OpenAI API密钥
 LLM_BASE_URL = os.getenv("LLM_BASE_URL")
 LLM_API_KEY = os.getenv("LLM_API_KEY")
 
-# 创建OpenAI客户端
-client = OpenAI(api_key=LLM_API_KEY, base_url=LLM_BASE_URL)
-
 # 创建一个模块级别的线程池用于翻译任务
 _translate_pool = ThreadPoolExecutor(max_workers=2)
 
+# 所有TTS线程共享的HTTP会话，延迟创建
+_tts_session = None
+_tts_session_lock = threading.Lock()
+
+# 异步TTS客户端共享的aiohttp会话，在共享事件循环中延迟创建
+_async_tts_session = None
+
+# 合成音频缓存，延迟创建
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+def get_tts_session():
+    """
+    获取所有TTS线程共享的HTTP会话
+    
+    会话挂载了固定大小的连接池并保持长连接，每个段落的请求都复用已建立的TCP+TLS连接，
+    不再为每句话重新握手
+    
+    返回:
+        requests.Session: 共享的HTTP会话
+    """
+    global _tts_session
+    if _tts_session is None:
+        with _tts_session_lock:
+            if _tts_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TTS_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _tts_session = session
+    return _tts_session
+
+def get_tts_cache():
+    """
+    获取合成音频缓存
+    
+    返回:
+        TtsAudioCache: 进程内共享的两级PCM缓存
+    """
+    global _tts_cache
+    if _tts_cache is None:
+        with _tts_cache_lock:
+            if _tts_cache is None:
+                _tts_cache = TtsAudioCache(
+                    memory_limit_bytes=int(TTS_CACHE_MEMORY_MB * 1024 * 1024),
+                    disk_dir=TTS_CACHE_DIR,
+                    disk_limit_bytes=int(TTS_CACHE_DISK_MB * 1024 * 1024)
+                )
+    return _tts_cache
+
+def get_tts_cache_stats():
+    """
+    获取合成音频缓存的命中率等统计信息
+    
+    返回:
+        dict: 缓存统计信息，见 TtsAudioCache.stats
+    """
+    return get_tts_cache().stats()
+
+register_stats("amadeus_tts_cache", get_tts_cache_stats, {
+    "memory_hits": ("counter", "合成音频缓存内存层的命中次数"),
+    "disk_hits": ("counter", "合成音频缓存磁盘层的命中次数"),
+    "misses": ("counter", "合成音频缓存的未命中次数"),
+    "hit_rate": ("gauge", "合成音频缓存的命中率"),
+    "memory_entries": ("gauge", "内存层的条目数"),
+    "memory_bytes": ("gauge", "内存层的PCM字节数"),
+    "disk_entries": ("gauge", "磁盘层的条目数"),
+    "disk_bytes": ("gauge", "磁盘层的PCM字节数"),
+})
+
+@functools.lru_cache(maxsize=TRANSLATION_CACHE_SIZE)
+def _translate_text_cached(text, target_language, source_language):
+    """
+    调用翻译模型翻译文本，结果按 (文本, 目标语言, 源语言) 缓存
+    
+    翻译失败时抛出异常，lru_cache 不会缓存异常，下次遇到相同文本时会重新请求
+    """
+    # 构建语言名称映射
+    language_map = {
+        'zh': '中文',
+        'en': '英语',
+        'ja': '日语'
+    }
+    
+    source_lang_name = language_map.get(source_language, source_language)
+    target_lang_name = language_map.get(target_language, target_language)
+    
+    # 构建翻译提示
+    system_prompt = f'你是一个专业的翻译助手，负责将{source_lang_name}翻译成{target_lang_name}。请直接提供翻译结果，不要添加任何解释或额外内容。'
+    user_prompt = f"请将以下{source_lang_name}文本翻译成{target_lang_name}，只返回翻译结果，不要添加任何解释或额外内容：\n\n{text}"
+    
+    # 使用OpenAI SDK发送请求，客户端从注册表获取，复用长连接
+    response = get_openai_client(LLM_BASE_URL, LLM_API_KEY).chat.completions.create(
+        model="gpt-4.1-nano",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=0.3  # 使用较低的温度以获得更确定性的翻译
+    )
+    
+    # 获取翻译结果
+    translated_text = response.choices[0].message.content.strip()
+    logging.info(f"文本翻译成功: {text[:30]}... -> {translated_text[:30]}...")
+    return translated_text
+
 def translate_text(text, target_language, source_language='zh'):
     """
     使用OpenAI的GPT-4.1-nano模型将文本从源语言翻译到目标语言
     
+    成功的翻译结果会被缓存，相同的文本和语言对直接返回缓存结果
+    
     参数:
         text (str): 要翻译的文本
         target_language (str): 目标语言代码
@@ -50,54 +186,45 @@ def translate_text(text, target_language, source_language='zh'):
         return text
     
     try:
-        # 构建语言名称映射
-        language_map = {
-            'zh': '中文',
-            'en': '英语',
-            'ja': '日语'
-        }
-        
-        source_lang_name = language_map.get(source_language, source_language)
-        target_lang_name = language_map.get(target_language, target_language)
-        
-        # 构建翻译提示
-        system_prompt = f'你是一个专业的翻译助手，负责将{source_lang_name}翻译成{target_lang_name}。请直接提供翻译结果，不要添加任何解释或额外内容。'
-        user_prompt = f"请将以下{source_lang_name}文本翻译成{target_lang_name}，只返回翻译结果，不要添加任何解释或额外内容：\n\n{text}"
-        
-        # 使用OpenAI SDK发送请求
-        response = client.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3  # 使用较低的温度以获得更确定性的翻译
-        )
-        
-        # 获取翻译结果
-        translated_text = response.choices[0].message.content.strip()
-        logging.info(f"文本翻译成功: {text[:30]}... -> {translated_text[:30]}...")
-        return translated_text
+        return _translate_text_cached(text, target_language, source_language)
     except Exception as e:
         logging.error(f"使用OpenAI SDK进行翻译时出错: {e}")
         return text
 
-def text_to_speech_stream(text, voice=None, sample_rate=32000, api_key=None):
+def get_translation_cache_stats():
     """
-    将文本转换为语音流
+    获取翻译缓存的统计信息
     
-    参数:
-        text (str): 要转换为语音的文本
-        voice (str): 使用的声音模型，如不指定则使用环境变量中的设置
-        sample_rate (int): 采样率，默认为32000Hz
-        api_key (str): SiliconFlow API 密钥，如不指定则使用环境变量中的设置
-        
     返回:
-        generator: 生成(sample_rate, audio_array)元组的生成器
+        dict: 命中次数、未命中次数、命中率、当前条目数和最大条目数
+    """
+    info = _translate_text_cached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+        "entries": info.currsize,
+        "max_entries": info.maxsize,
+    }
+
+register_stats("amadeus_translation_cache", get_translation_cache_stats, {
+    "hits": ("counter", "TTS前翻译缓存的命中次数"),
+    "misses": ("counter", "TTS前翻译缓存的未命中次数"),
+    "hit_rate": ("gauge", "TTS前翻译缓存的命中率"),
+    "entries": ("gauge", "翻译缓存当前的条目数"),
+})
+
+def _prepare_tts_request(text, voice=None, sample_rate=32000, api_key=None, base_url=None):
+    """
+    准备SiliconFlow语音合成请求
+    
+    返回:
+        tuple: (url, headers, data)，参数无效时返回None
     """
     if not text or not text.strip():
         logging.warning("文本为空，不进行转换")
-        return
+        return None
     
     # 如果未指定voice参数，则使用环境变量中的设置
     if voice is None:
@@ -110,7 +237,11 @@ def text_to_speech_stream(text, voice=None, sample_rate=32000, api_key=None):
     # 检查API密钥是否有效
     if not api_key:
         logging.error("缺少SiliconFlow API密钥，无法进行文本转语音")
-        return
+        return None
+    
+    # 如果未指定base_url参数，则使用环境变量中的设置
+    if base_url is None:
+        base_url = DEFAULT_SILICONFLOW_BASE_URL
         
     # 设置请求头
     headers = {
@@ -120,66 +251,231 @@ def text_to_speech_stream(text, voice=None, sample_rate=32000, api_key=None):
     
     # 设置请求数据
     data = {
-        'model': 'FunAudioLLM/CosyVoice2-0.5B',
+        'model': DEFAULT_SILICONFLOW_MODEL,
         'input': text,
         'voice': voice,
         'sample_rate': sample_rate,
         'response_format': 'pcm',
     }
     
+    return f"{base_url}/audio/speech", headers, data
+
+def _create_framer(sample_rate, frame_ms=None, output_dtype=None):
+    """按参数或环境变量中的默认值创建PCM分帧器"""
+    return PcmFramer(
+        sample_rate,
+        frame_ms=frame_ms if frame_ms is not None else TTS_FRAME_MS,
+        output_dtype=output_dtype if output_dtype is not None else TTS_OUTPUT_DTYPE
+    )
+
+def _tts_cache_key(url, data):
+    """
+    计算请求对应的缓存键，文本过长或缓存关闭时返回None；请求地址也计入缓存键
+    """
+    if TTS_CACHE_MEMORY_MB <= 0 and TTS_CACHE_DISK_MB <= 0:
+        return None
+    if len(normalize_text(data['input'])) > TTS_CACHE_MAX_TEXT_LENGTH:
+        return None
+    return make_cache_key(data['input'], data['voice'], data['model'], data['sample_rate'], url)
+
+def _iter_cached_frames(cache_key, sample_rate, frame_ms=None, output_dtype=None):
+    """
+    命中缓存时直接从缓存的PCM数据分帧输出，未命中时不生成任何内容
+    
+    返回:
+        generator: 生成(sample_rate, audio_array)元组的生成器
+    """
+    with get_tts_cache().open(cache_key) as cached:
+        if cached is None:
+            return
+        # 先关闭分帧生成器，释放指向内存映射的视图，缓存才能关闭映射
+        with closing(iter_pcm_frames(
+            cached,
+            sample_rate,
+            frame_ms=frame_ms if frame_ms is not None else TTS_FRAME_MS,
+            output_dtype=output_dtype if output_dtype is not None else TTS_OUTPUT_DTYPE
+        )) as frames:
+            for frame in frames:
+                yield (sample_rate, frame)
+
+def _read_cached_frames(cache_key, sample_rate, frame_ms=None, output_dtype=None):
+    """
+    一次取出缓存条目的全部音频帧（每帧都是独立的数组，不引用内存映射），未命中时返回空列表
+    
+    缓存的都是短句，异步版本在线程中调用，避免在共享事件循环中读磁盘
+    """
+    with closing(_iter_cached_frames(cache_key, sample_rate, frame_ms, output_dtype)) as cached_frames:
+        return list(cached_frames)
+
+def text_to_speech_stream(text, voice=None, sample_rate=32000, api_key=None, base_url=None, frame_ms=None, output_dtype=None):
+    """
+    将文本转换为语音流
+    
+    参数:
+        text (str): 要转换为语音的文本
+        voice (str): 使用的声音模型，如不指定则使用环境变量中的设置
+        sample_rate (int): 采样率，默认为32000Hz
+        api_key (str): SiliconFlow API 密钥，如不指定则使用环境变量中的设置
+        base_url (str): SiliconFlow API 基础 URL，如不指定则使用环境变量中的设置
+        frame_ms (int): 每个音频帧的时长（毫秒），如不指定则使用环境变量中的设置
+        output_dtype (str): 音频帧的数据类型，'float32' 或 'int16'，如不指定则使用环境变量中的设置
+        
+    返回:
+        generator: 生成(sample_rate, audio_array)元组的生成器，除最后一帧外每帧时长固定
+    """
+    request = _prepare_tts_request(text, voice, sample_rate, api_key, base_url)
+    if request is None:
+        return
+    url, headers, data = request
+    
+    # 短句先查缓存，命中时不再请求TTS服务
+    cache_key = _tts_cache_key(url, data)
+    if cache_key is not None:
+        hit = False
+        with closing(_iter_cached_frames(cache_key, sample_rate, frame_ms, output_dtype)) as cached_frames:
+            for item in cached_frames:
+                hit = True
+                yield item
+        if hit:
+            logging.info(f"TTS缓存命中: {text[:30]}")
+            return
+    
     try:
-        # 发送请求，获取流式响应
-        response = requests.post(
-            'https://api.siliconflow.cn/v1/audio/speech',
+        request_start = time.perf_counter()
+        # 通过共享会话发送请求，复用连接池中的长连接，获取流式响应
+        # 使用with确保响应被完整读取或关闭，连接才能归还到连接池
+        with get_tts_session().post(
+            url,
             json=data,
             headers=headers,
-            stream=True
+            stream=True,
+            timeout=(TTS_CONNECT_TIMEOUT, TTS_READ_TIMEOUT)
+        ) as response:
+            
+            # 处理流式响应
+            if response.status_code == 200:
+                # 分帧器把网络上任意大小的块切成固定时长的音频帧
+                framer = _create_framer(sample_rate, frame_ms, output_dtype)
+                # 可缓存的短句同时保留原始PCM数据，完整收到后写入缓存
+                pcm_data = bytearray() if cache_key is not None else None
+                
+                # 处理流式响应的每个块
+                for chunk in response.iter_content(chunk_size=None): # chunk_size=None以便获取任意大小的块
+                    if request_start is not None:
+                        # 记录每段TTS的首字节时间
+                        observe_stage("tts_first_byte", time.perf_counter() - request_start, provider=provider_label(url), model=data['model'])
+                        request_start = None
+                    if pcm_data is not None:
+                        pcm_data += chunk
+                    for frame in framer.feed(chunk):
+                        yield (sample_rate, frame)
+                
+                # 输出流结束时剩余的不足一帧的样本
+                frame = framer.flush()
+                if frame is not None:
+                    yield (sample_rate, frame)
+                
+                if pcm_data:
+                    get_tts_cache().put(cache_key, pcm_data)
+            else:
+                logging.error(f"SILICONFLOW API返回错误: {response.status_code} {response.text}")
+    except Exception as e:
+        logging.error(f"调用文本转语音API时出错: {e}")
+
+async def get_async_tts_session():
+    """
+    获取异步TTS客户端共享的aiohttp会话
+    
+    会话绑定在共享事件循环上，只能在该事件循环中使用；连接器保持长连接，
+    并限制同时打开的连接数
+    
+    返回:
+        aiohttp.ClientSession: 共享的异步HTTP会话
+    """
+    global _async_tts_session
+    if _async_tts_session is None or _async_tts_session.closed:
+        _async_tts_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=TTS_ASYNC_POOL_SIZE, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(sock_connect=TTS_CONNECT_TIMEOUT, sock_read=TTS_READ_TIMEOUT)
         )
+    return _async_tts_session
+
+async def text_to_speech_stream_async(text, voice=None, sample_rate=32000, api_key=None, base_url=None, frame_ms=None, output_dtype=None):
+    """
+    将文本转换为语音流的异步版本
+    
+    在共享事件循环中运行，单个事件循环即可同时驱动大量TTS流，不再为每个流占用一个阻塞线程
+    
+    参数:
+        text (str): 要转换为语音的文本
+        voice (str): 使用的声音模型，如不指定则使用环境变量中的设置
+        sample_rate (int): 采样率，默认为32000Hz
+        api_key (str): SiliconFlow API 密钥，如不指定则使用环境变量中的设置
+        base_url (str): SiliconFlow API 基础 URL，如不指定则使用环境变量中的设置
+        frame_ms (int): 每个音频帧的时长（毫秒），如不指定则使用环境变量中的设置
+        output_dtype (str): 音频帧的数据类型，'float32' 或 'int16'，如不指定则使用环境变量中的设置
         
-        # 处理流式响应
-        if response.status_code == 200:
-            # 创建一个缓冲区来存储接收到的数据
-            buffer = bytearray() # 创建一个缓冲区来存储接收到的数据
-            
-            # 处理流式响应的每个块
-            for chunk in response.iter_content(chunk_size=None): # chunk_size=None以便获取任意大小的块
-                if chunk:
-                    # 将新接收的块数据追加到缓冲区
-                    buffer.extend(chunk)
-                    
-                    # 计算缓冲区中完整的样本数 (每个样本2字节)
-                    num_samples = len(buffer) // 2
-                    
-                    if num_samples > 0:
-                        # 提取所有完整的样本数据
-                        process_len = num_samples * 2
-                        data_to_process = buffer[:process_len]
-                        
-                        # 从缓冲区移除已提取的数据
-                        buffer = buffer[process_len:]
-                        
-                        try:
-                            # 将字节数据转换为16位整数，然后转换为-1到1之间的浮点数
-                            audio_array = np.frombuffer(data_to_process, dtype=np.int16).astype(np.float32) / 32768.0
-                            yield (sample_rate, audio_array)
-                        except Exception as e:
-                            logging.error(f"处理音频数据时出错: {e}")
-            
-            # 处理循环结束后缓冲区中可能剩余的完整样本
-            # (通常情况下，如果API正确结束流，这里不应该有太多数据，但为了健壮性处理)
-            if len(buffer) >= 2 : # 确保至少有一个完整样本
-                num_samples = len(buffer) // 2
-                if num_samples > 0:
-                    process_len = num_samples * 2
-                    data_to_process = buffer[:process_len]
-                    # 此时缓冲区中不足一个样本的部分将被丢弃，这是合理的，因为流已结束
-                    buffer = buffer[process_len:] # 清空或保留不足一个样本的部分
-                    try:
-                        audio_array = np.frombuffer(data_to_process, dtype=np.int16).astype(np.float32) / 32768.0
-                        yield (sample_rate, audio_array)
-                    except Exception as e:
-                        logging.error(f"处理剩余音频数据时出错: {e}")
-        else:
-            logging.error(f"SILICONFLOW API返回错误: {response.status_code} {response.text}")
+    返回:
+        async generator: 生成(sample_rate, audio_array)元组的异步生成器，除最后一帧外每帧时长固定
+    """
+    request = _prepare_tts_request(text, voice, sample_rate, api_key, base_url)
+    if request is None:
+        return
+    url, headers, data = request
+    
+    # 短句先查缓存，命中时不再请求TTS服务；读缓存可能读磁盘，放到线程中进行
+    cache_key = _tts_cache_key(url, data)
+    if cache_key is not None:
+        cached_frames = await asyncio.to_thread(_read_cached_frames, cache_key, sample_rate, frame_ms, output_dtype)
+        if cached_frames:
+            for item in cached_frames:
+                yield item
+            logging.info(f"TTS缓存命中: {text[:30]}")
+            return
+    
+    try:
+        request_start = time.perf_counter()
+        session = await get_async_tts_session()
+        async with session.post(url, json=data, headers=headers) as response:
+            if response.status == 200:
+                framer = _create_framer(sample_rate, frame_ms, output_dtype)
+                pcm_data = bytearray() if cache_key is not None else None
+                # 网络上到达多少数据就处理多少，凑满一帧就输出一帧
+                async for chunk in response.content.iter_any():
+                    if request_start is not None:
+                        observe_stage("tts_first_byte", time.perf_counter() - request_start, provider=provider_label(url), model=data['model'])
+                        request_start = None
+                    if pcm_data is not None:
+                        pcm_data += chunk
+                    for frame in framer.feed(chunk):
+                        yield (sample_rate, frame)
+                
+                frame = framer.flush()
+                if frame is not None:
+                    yield (sample_rate, frame)
+                
+                if pcm_data:
+                    # 写磁盘缓存放到线程中进行，不阻塞共享事件循环
+                    await asyncio.to_thread(get_tts_cache().put, cache_key, pcm_data)
+            else:
+                response_text = await response.text()
+                logging.error(f"SILICONFLOW API返回错误: {response.status} {response_text}")
     except Exception as e:
-        logging.error(f"调用文本转语音API时出错: {e}")
\ No newline at end of file
+        logging.error(f"调用文本转语音API时出错: {e}")
+
+def text_to_speech_stream_via_async(text, voice=None, sample_rate=32000, api_key=None, base_url=None, frame_ms=None, output_dtype=None):
+    """
+    异步TTS客户端的同步生成器适配器
+    
+    接口与 text_to_speech_stream 相同，可以直接交给 run_tts_in_thread 等同步调用方使用，
+    实际的网络请求在共享事件循环中完成
+    
+    返回:
+        generator: 生成(sample_rate, audio_array)元组的生成器
+    """
+    yield from iterate_async_generator(
+        text_to_speech_stream_async(
+            text, voice=voice, sample_rate=sample_rate, api_key=api_key, base_url=base_url,
+            frame_ms=frame_ms, output_dtype=output_dtype
+        )
+    )
@@ -3,9 +3,9 @@
 提供各种工具函数
 """
 
-from .async_utils import run_async
+from .async_utils import run_async, submit_async
 from .prompt_utils import generate_sys_prompt, get_language_text
 from .stream_utils import process_llm_stream
 from .user_utils import generate_unique_user_id
 
-__all__ = ['run_async', 'generate_sys_prompt', 'get_language_text', 'process_llm_stream', 'generate_unique_user_id'] 
\ No newline at end of file
+__all__ = ['run_async', 'submit_async', 'generate_sys_prompt', 'get_language_text', 'process_llm_stream', 'generate_unique_user_id'] 
\ No newline at end of file
@@ -4,11 +4,34 @@
 """
 
 import asyncio
+import queue
+import threading
+
+# 常驻后台线程中运行的共享事件循环，延迟创建
+_background_loop = None
+_background_thread = None
+_background_loop_lock = threading.Lock()
+
+def submit_async(async_func, *args, **kwargs):
+    """
+    把异步函数提交到共享事件循环中运行，可以在任意线程中调用，不会阻塞
+    
+    参数:
+        async_func: 要运行的异步函数
+        *args, **kwargs: 传递给异步函数的参数
+        
+    返回:
+        concurrent.futures.Future: 异步函数的结果
+    """
+    return asyncio.run_coroutine_threadsafe(async_func(*args, **kwargs), get_background_loop())
 
 def run_async(async_func, *args, **kwargs):
     """
     在同步环境中运行异步函数
     
+    异步函数在共享事件循环中运行，调用方线程阻塞等待结果。所有调用共用同一个事件循环，
+    异步客户端的连接池可以跨调用、跨轮次复用，不再为每次调用创建和关闭事件循环
+    
     参数:
         async_func: 要运行的异步函数
         *args, **kwargs: 传递给异步函数的参数
@@ -16,9 +39,63 @@ def run_async(async_func, *args, **kwargs):
     返回:
         异步函数的返回值
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    if threading.current_thread() is _background_thread:
+        # 在共享事件循环内部阻塞等待它自己执行的任务会造成死锁
+        raise RuntimeError("不能在共享事件循环的线程中调用 run_async，请直接 await 异步函数")
+    return submit_async(async_func, *args, **kwargs).result()
+
+def get_background_loop():
+    """
+    获取在常驻后台线程中运行的共享事件循环，首次调用时启动
+    
+    同一个事件循环可以同时驱动大量异步IO任务（例如数百个TTS流），
+    不再为每个任务占用一个阻塞线程。在其中运行的协程不能直接调用阻塞函数，
+    同步的网络请求需要通过 asyncio.to_thread 放到线程中执行
+    
+    返回:
+        asyncio.AbstractEventLoop: 共享事件循环
+    """
+    global _background_loop, _background_thread
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                _background_thread = threading.Thread(target=loop.run_forever, name="async-background-loop", daemon=True)
+                _background_thread.start()
+                _background_loop = loop
+    return _background_loop
+
+def iterate_async_generator(async_gen):
+    """
+    在共享事件循环中驱动异步生成器，并以同步生成器的形式逐个返回结果
+    
+    异步生成器在后台持续产出结果并放入队列，调用方线程只需从队列读取；
+    调用方提前停止迭代时会取消后台任务
+    
+    参数:
+        async_gen: 要驱动的异步生成器
+        
+    返回:
+        generator: 依次产生异步生成器结果的同步生成器
+    """
+    items = queue.Queue()
+    finished = object()
+    
+    async def pump():
+        try:
+            async for item in async_gen:
+                items.put(item)
+        finally:
+            items.put(finished)
+    
+    future = asyncio.run_coroutine_threadsafe(pump(), get_background_loop())
     try:
-        return loop.run_until_complete(async_func(*args, **kwargs))
+        while True:
+            item = items.get()
+            if item is finished:
+                break
+            yield item
+        # 异步生成器抛出的异常在这里重新抛出
+        future.result()
     finally:
-        loop.close() 
\ No newline at end of file
+        future.cancel()
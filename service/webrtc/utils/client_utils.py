@@ -0,0 +1,208 @@
+"""
+客户端工具模块
+按 (base_url, api_key) 复用OpenAI客户端和aiohttp会话，避免每轮对话重新创建客户端和TLS连接
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import aiohttp
+import httpx
+from openai import OpenAI
+
+from .async_utils import get_background_loop, submit_async
+
+# 每个客户端的最大连接数、空闲长连接的保持时间（秒），以及客户端空闲多久后被关闭（秒）
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", "20"))
+CLIENT_KEEPALIVE_SECONDS = float(os.getenv("CLIENT_KEEPALIVE_SECONDS", "60"))
+CLIENT_IDLE_EXPIRY_SECONDS = float(os.getenv("CLIENT_IDLE_EXPIRY_SECONDS", "900"))
+
+
+class ClientRegistry:
+    """
+    按键复用的客户端注册表
+
+    同一个键第一次使用时创建客户端，之后一直复用；超过空闲时间未使用的客户端在
+    expire_idle 时被移除并关闭。注册表本身是线程安全的；创建客户端（可能需要请求服务端）
+    时只持有该键的锁，不影响其他键的获取。
+    """
+
+    def __init__(self, name, factory, close, idle_expiry=CLIENT_IDLE_EXPIRY_SECONDS):
+        """
+        初始化注册表
+
+        参数:
+            name (str): 注册表名称，用于记录日志
+            factory (callable): 根据键创建客户端的函数
+            close (callable): 关闭客户端的函数
+            idle_expiry (float): 客户端空闲多少秒后被关闭
+        """
+        self.name = name
+        self._factory = factory
+        self._close = close
+        self.idle_expiry = idle_expiry
+        self._lock = threading.Lock()
+        self._clients = {}  # 键 -> [客户端, 最近使用时间]
+        self._creating = {}  # 正在创建客户端的键 -> 该键的锁
+
+    def _lookup(self, key):
+        """在持有 self._lock 时查找客户端并更新最近使用时间，不存在时返回None"""
+        entry = self._clients.get(key)
+        if entry is None:
+            return None
+        entry[1] = time.monotonic()
+        return entry[0]
+
+    def get(self, key):
+        """获取键对应的客户端，不存在时创建；同一个键同时只创建一次"""
+        with self._lock:
+            client = self._lookup(key)
+            if client is not None:
+                return client
+            key_lock = self._creating.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                client = self._lookup(key)
+            if client is not None:
+                return client
+            try:
+                client = self._factory(*key)
+            finally:
+                # 注册新客户端和移除创建锁在同一次加锁中完成，之后的调用要么查到客户端，要么（创建失败时）重新创建
+                with self._lock:
+                    if client is not None:
+                        self._clients[key] = [client, time.monotonic()]
+                    if self._creating.get(key) is key_lock:
+                        del self._creating[key]
+                    count = len(self._clients)
+        logging.info(f"{self.name} 已创建新客户端: {key[0]}，当前客户端数: {count}")
+        return client
+
+    def _discard(self, entries):
+        for client in entries:
+            try:
+                self._close(client)
+            except Exception as e:
+                logging.warning(f"{self.name} 关闭客户端时出错: {e}")
+
+    def discard(self, key):
+        """移除并关闭键对应的客户端"""
+        with self._lock:
+            entry = self._clients.pop(key, None)
+        if entry is not None:
+            self._discard([entry[0]])
+
+    def expire_idle(self):
+        """
+        关闭超过空闲时间未使用的客户端
+
+        返回:
+            int: 被关闭的客户端数量
+        """
+        deadline = time.monotonic() - self.idle_expiry
+        with self._lock:
+            expired = [key for key, (_, last_used) in self._clients.items() if last_used < deadline]
+            clients = [self._clients.pop(key)[0] for key in expired]
+        self._discard(clients)
+        return len(clients)
+
+    def close_all(self):
+        """关闭全部客户端"""
+        with self._lock:
+            clients = [client for client, _ in self._clients.values()]
+            self._clients.clear()
+        self._discard(clients)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+
+def _create_openai_client(base_url, api_key):
+    """创建使用固定大小连接池并保持长连接的OpenAI客户端"""
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=CLIENT_POOL_SIZE,
+            max_keepalive_connections=CLIENT_POOL_SIZE,
+            keepalive_expiry=CLIENT_KEEPALIVE_SECONDS
+        )
+    )
+    return OpenAI(api_key=api_key, base_url=base_url or None, http_client=http_client)
+
+
+def _create_aiohttp_session(base_url, api_key):
+    """创建带有鉴权请求头的aiohttp会话，只能在共享事件循环中调用"""
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return aiohttp.ClientSession(
+        headers=headers,
+        connector=aiohttp.TCPConnector(limit=CLIENT_POOL_SIZE, keepalive_timeout=CLIENT_KEEPALIVE_SECONDS)
+    )
+
+
+def _close_aiohttp_session(session):
+    """aiohttp会话属于共享事件循环，关闭操作也提交到该事件循环中进行"""
+    if not session.closed:
+        submit_async(session.close)
+
+
+_openai_clients = ClientRegistry("OpenAI客户端注册表", _create_openai_client, lambda client: client.close())
+_aiohttp_sessions = ClientRegistry("aiohttp会话注册表", _create_aiohttp_session, _close_aiohttp_session)
+
+
+def get_openai_client(base_url, api_key):
+    """
+    获取 (base_url, api_key) 对应的共享OpenAI客户端
+
+    参数:
+        base_url (str): API 基础 URL，为空时使用OpenAI官方地址
+        api_key (str): API 密钥
+
+    返回:
+        OpenAI: 共享的OpenAI客户端，可以在多个线程中同时使用
+    """
+    return _openai_clients.get((base_url or "", api_key or ""))
+
+
+async def get_aiohttp_session(base_url, api_key):
+    """
+    获取 (base_url, api_key) 对应的共享aiohttp会话
+
+    会话已带有 Content-Type 和鉴权请求头，必须在共享事件循环中使用
+
+    参数:
+        base_url (str): API 基础 URL
+        api_key (str): API 密钥
+
+    返回:
+        aiohttp.ClientSession: 共享的aiohttp会话
+    """
+    if asyncio.get_running_loop() is not get_background_loop():
+        raise RuntimeError("共享aiohttp会话只能在共享事件循环中使用，请通过 run_async 或 submit_async 调用")
+    key = (base_url or "", api_key or "")
+    session = _aiohttp_sessions.get(key)
+    if session.closed:
+        # 会话在别处被关闭，丢弃后重新创建
+        _aiohttp_sessions.discard(key)
+        session = _aiohttp_sessions.get(key)
+    return session
+
+
+def expire_idle_clients():
+    """
+    关闭所有长时间未使用的客户端，由会话清理任务定期调用
+
+    返回:
+        int: 被关闭的客户端数量
+    """
+    return _openai_clients.expire_idle() + _aiohttp_sessions.expire_idle()
+
+
+def close_all_clients():
+    """关闭全部共享客户端，在服务关闭时调用"""
+    _openai_clients.close_all()
+    _aiohttp_sessions.close_all()
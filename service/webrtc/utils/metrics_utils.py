@@ -0,0 +1,263 @@
+"""
+延迟指标工具模块
+记录每轮对话各处理环节的耗时，以Prometheus文本格式通过 /metrics 接口导出；
+其他模块的统计（缓存命中、超时、丢弃次数等）通过 register_stats 登记后由同一个接口导出
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# 直方图的桶上限（秒），覆盖从本地处理的几毫秒到云服务的十几秒
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """
+    线程安全的Prometheus直方图
+
+    每组标签值各自累计桶计数、总和与次数，导出时按Prometheus文本格式输出
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        """
+        参数:
+            name (str): 指标名称
+            documentation (str): 指标说明
+            labelnames (tuple): 标签名称
+            buckets (tuple): 桶上限，从小到大排列
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # 标签值 -> [各桶计数, 总和, 次数]
+
+    def observe(self, value, **labels):
+        """记录一次观测值，未给出的标签取空字符串"""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0]
+                self._series[key] = series
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        """
+        按Prometheus文本格式输出
+
+        返回:
+            list: 输出的各行
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items()]
+        for key, (counts, total, count) in sorted(series_items):
+            labels = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(self.labelnames, key))
+            prefix = labels + "," if labels else ""
+            suffix = f"{{{labels}}}" if labels else ""
+            for upper_bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{upper_bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+# /metrics 导出的直方图，按登记顺序输出
+_histograms = []
+# 其他模块登记的统计快照：(指标名前缀, 获取快照的函数, 字段说明, 分组标签名)
+_stats_sources = []
+_registry_lock = threading.Lock()
+
+
+def register_histogram(histogram):
+    """
+    登记一个直方图，由 /metrics 导出
+
+    参数:
+        histogram (Histogram): 要导出的直方图
+
+    返回:
+        Histogram: 传入的直方图，便于在定义时直接登记
+    """
+    with _registry_lock:
+        _histograms.append(histogram)
+    return histogram
+
+
+def register_stats(prefix, snapshot, fields, label=None):
+    """
+    登记一个模块的统计快照，/metrics 导出时调用 snapshot() 并把其中的字段输出为指标
+
+    参数:
+        prefix (str): 指标名前缀，例如 "amadeus_memory_search"，指标名为 前缀_字段名
+        snapshot (callable): 返回统计字典的函数，例如模块的 get_xxx_stats
+        fields (dict): 字段名 -> (指标类型, 说明) 或 (指标类型, 说明, 标签名)。指标类型为 "counter" 或 "gauge"，
+            counter 的指标名加 _total 后缀；给出标签名时该字段的值是 {标签值: 数值} 字典，按标签分别输出
+        label (str, optional): 快照是 {标签值: 统计字典} 的形式时（例如按上传格式分组）的标签名
+    """
+    with _registry_lock:
+        _stats_sources.append((prefix, snapshot, dict(fields), label))
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+def _render_stats(prefix, snapshot, fields, label):
+    """按Prometheus文本格式输出一个统计快照"""
+    try:
+        stats = snapshot()
+    except Exception as e:
+        logging.warning(f"获取统计 {prefix} 失败: {e}")
+        return []
+    # 统一成 [(分组标签, 统计字典)]
+    groups = sorted(stats.items()) if label else [(None, stats)]
+    lines = []
+    for field, spec in fields.items():
+        kind, documentation = spec[0], spec[1]
+        field_label = spec[2] if len(spec) > 2 else None
+        name = f"{prefix}_{field}"
+        if kind == "counter" and not name.endswith("_total"):
+            name += "_total"
+        samples = []
+        for group, values in groups:
+            value = values.get(field)
+            if value is None:
+                continue
+            base_labels = [(label, group)] if label else []
+            if field_label:
+                for key, item in sorted(value.items()):
+                    samples.append((base_labels + [(field_label, key)], item))
+            else:
+                samples.append((base_labels, value))
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            rendered = ",".join(f'{key}="{_escape_label(item)}"' for key, item in labels)
+            lines.append(f"{name}{{{rendered}}} {_format_value(value)}" if rendered else f"{name} {_format_value(value)}")
+    return lines
+
+
+# 各处理环节自身的耗时，例如STT编码、STT请求、记忆搜索、每段TTS的首字节时间
+STAGE_SECONDS = register_histogram(Histogram(
+    "amadeus_stage_seconds",
+    "各处理环节的耗时（秒）",
+    ("stage", "provider", "model")
+))
+# 从一轮对话开始（检测到用户停顿或主动对话触发）到各个节点的时间，例如首个LLM token、首段文本、首个音频块
+TURN_SECONDS = register_histogram(Histogram(
+    "amadeus_turn_seconds",
+    "从一轮对话开始到各个节点的时间（秒）",
+    ("milestone", "provider", "model")
+))
+
+
+def provider_label(base_url, default="default"):
+    """
+    根据API基础URL生成服务商标签
+
+    参数:
+        base_url (str): API 基础 URL
+        default (str): URL为空时使用的标签
+
+    返回:
+        str: URL的主机名（含端口）
+    """
+    if not base_url:
+        return default
+    return urlparse(base_url).netloc or base_url
+
+
+def observe_stage(stage, seconds, provider="", model=""):
+    """记录一个处理环节的耗时"""
+    STAGE_SECONDS.observe(seconds, stage=stage, provider=provider, model=model)
+
+
+@contextmanager
+def stage_timer(stage, provider="", model=""):
+    """
+    记录代码块耗时的上下文管理器，代码块抛出异常时同样记录
+
+    用法:
+        with stage_timer("mem0_search", provider="mem0"):
+            ...
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start_time, provider=provider, model=model)
+
+
+class TurnTrace:
+    """
+    一轮对话的计时
+
+    从创建时开始计时，mark 记录到达各节点的时间，同一节点只记录第一次到达
+    """
+
+    def __init__(self, provider="", model="", start_time=None):
+        """
+        参数:
+            provider (str): 本轮LLM服务商标签
+            model (str): 本轮LLM模型
+            start_time (float): 开始时间（time.perf_counter），默认为创建时
+        """
+        self.provider = provider
+        self.model = model
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self._lock = threading.Lock()
+        self._milestones = {}
+
+    def mark(self, milestone):
+        """
+        记录到达节点的时间
+
+        返回:
+            float: 距本轮开始的秒数；该节点已记录过时返回None
+        """
+        elapsed = time.perf_counter() - self.start_time
+        with self._lock:
+            if milestone in self._milestones:
+                return None
+            self._milestones[milestone] = elapsed
+        TURN_SECONDS.observe(elapsed, milestone=milestone, provider=self.provider, model=self.model)
+        logging.debug(f"对话节点 {milestone}: {elapsed * 1000:.0f}ms")
+        return elapsed
+
+    def milestones(self):
+        """已记录的全部节点：节点名 -> 距本轮开始的秒数"""
+        with self._lock:
+            return dict(self._milestones)
+
+
+def render_metrics():
+    """
+    导出全部已登记的直方图和统计快照
+
+    返回:
+        str: Prometheus文本格式的指标
+    """
+    with _registry_lock:
+        histograms = list(_histograms)
+        stats_sources = list(_stats_sources)
+    lines = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+    for source in stats_sources:
+        lines.extend(_render_stats(*source))
+    return "\n".join(lines) + "\n"
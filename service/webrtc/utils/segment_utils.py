@@ -0,0 +1,314 @@
+"""
+段落工具模块
+提供文本分段以及按段落组织流式音频的数据结构
+"""
+
+import re
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Tuple
+
+# 标点符号：中英文常见标点符号
+PUNCTUATION_CHARS = ",.?!，。？！;；"
+# 标点符号模式，预先编译避免每次分段时重复编译
+_PUNCTUATION_SPLIT_RE = re.compile(f"([{PUNCTUATION_CHARS}])")
+_PUNCTUATION_RE = re.compile(f"[{PUNCTUATION_CHARS}]")
+_ENDING_PUNCTUATION_RE = re.compile(f"[{PUNCTUATION_CHARS}]$")
+
+def split_text_by_punctuation(text, min_segment_length=15):
+    """
+    根据标点符号分割文本，并确保每个分段具有最小长度
+    
+    参数:
+        text (str): 要分割的文本
+        min_segment_length (int): 分段的最小长度，短于此长度的片段将尝试与相邻片段合并
+        
+    返回:
+        list: 分割后的文本片段列表
+    """
+    # 第一步：按标点符号分割
+    segments = _PUNCTUATION_SPLIT_RE.split(text)
+    
+    # 第二步：合并标点和前面的文本
+    intermediate_result = []
+    i = 0
+    while i < len(segments):
+        if i + 1 < len(segments) and _PUNCTUATION_RE.match(segments[i + 1]):
+            intermediate_result.append(segments[i] + segments[i + 1])
+            i += 2
+        else:
+            if segments[i].strip():  # 只添加非空片段
+                intermediate_result.append(segments[i])
+            i += 1
+    
+    # 第三步：合并长度过短的片段
+    result = []
+    current_segment = ""
+    
+    for segment in intermediate_result:
+        # 处理第一个片段或当前累积片段为空的情况
+        if not current_segment:
+            current_segment = segment
+            continue
+            
+        # 如果当前片段结尾有标点符号，表示是一个自然的分割点
+        has_ending_punctuation = bool(_ENDING_PUNCTUATION_RE.search(current_segment))
+        
+        # 判断当前累积片段是否足够长
+        if len(current_segment) >= min_segment_length and has_ending_punctuation:
+            # 如果当前累积片段足够长且有标点符号，将其添加到结果中并重置
+            result.append(current_segment)
+            current_segment = segment
+        else:
+            # 如果当前累积片段不够长或没有标点符号，继续累积
+            current_segment += segment
+    
+    # 处理最后剩余的片段
+    if current_segment:
+        result.append(current_segment)
+    
+    # 过滤掉任何仍然太短且不包含有意义内容的片段
+    result = [seg for seg in result if len(seg.strip()) >= 2]  # 至少保留两个字符的内容
+                
+    return result
+
+
+def _visible_count(text):
+    """统计文本中的非空白字符数量，最多数到2（足以判断片段去除首尾空白后是否至少有两个字符）"""
+    count = 0
+    for char in text:
+        if not char.isspace():
+            count += 1
+            if count >= 2:
+                break
+    return count
+
+
+class StreamingSegmenter:
+    """
+    LLM文本流的增量分段器
+
+    每次输入一个文本片段，返回新完成的段落。分段结果与对累积文本反复调用
+    split_text_by_punctuation 并保留最后一段继续累积的做法完全一致，但每个字符只需处理常数次，
+    不再随缓冲区长度重复扫描。
+
+    开启 first_segment_min_length 后，每轮对话的第一个段落只需达到该长度即可输出，
+    让TTS尽早开始；之后的段落仍按 min_segment_length 合并。
+    """
+
+    def __init__(self, min_segment_length=15, first_segment_min_length=None):
+        """
+        初始化分段器
+        
+        参数:
+            min_segment_length (int): 分段的最小长度，短于此长度的片段将与后续片段合并
+            first_segment_min_length (int, optional): 第一个段落的最小长度，不指定则与 min_segment_length 相同
+        """
+        self.min_segment_length = min_segment_length
+        self.first_segment_min_length = first_segment_min_length
+        self.emitted_count = 0  # 已输出的段落数量
+        self._reset("")
+
+    def _reset(self, text):
+        """以给定文本作为新的缓冲区重新建立分段状态"""
+        self._buffer_parts: List[str] = []  # 当前缓冲区的原始文本
+        self._results: List[str] = []  # 已确定边界但尚未输出的段落
+        self._current = ""  # 正在合并的段落，总是以标点结尾
+        self._current_visible = 0
+        self._tail_parts: List[str] = []  # 最后一个标点之后的文本
+        self._tail_visible = 0
+        if text:
+            self._consume(text)
+
+    def _min_length(self):
+        """当前生效的最小段落长度"""
+        if self.emitted_count == 0 and self.first_segment_min_length is not None:
+            return self.first_segment_min_length
+        return self.min_segment_length
+
+    def _add_piece(self, piece):
+        """合并一个以标点结尾的片段，规则与 split_text_by_punctuation 的第三步一致"""
+        visible = _visible_count(piece)
+        if not self._current:
+            self._current, self._current_visible = piece, visible
+        elif len(self._current) >= self._min_length():
+            self._results.append(self._current)
+            self._current, self._current_visible = piece, visible
+        else:
+            self._current += piece
+            self._current_visible = min(2, self._current_visible + visible)
+
+    def _consume(self, text):
+        """把文本追加到缓冲区，只扫描新增的字符"""
+        self._buffer_parts.append(text)
+        start = 0
+        for match in _PUNCTUATION_RE.finditer(text):
+            end = match.end()
+            self._tail_parts.append(text[start:end])
+            self._add_piece("".join(self._tail_parts))
+            self._tail_parts = []
+            self._tail_visible = 0
+            start = end
+        if start < len(text):
+            rest = text[start:]
+            self._tail_parts.append(rest)
+            if self._tail_visible < 2:
+                self._tail_visible = min(2, self._tail_visible + _visible_count(rest))
+
+    def _split_buffer(self):
+        """
+        计算当前缓冲区的分段结果，等价于对缓冲区调用 split_text_by_punctuation
+        
+        尾部文本只在确实有段落完成时才需要拼接，因此这里返回 (段落开头文本, 是否拼接尾部文本) 的列表
+        """
+        entries = [(segment, False, _visible_count(segment)) for segment in self._results]
+        head, head_visible, include_tail = self._current, self._current_visible, False
+        if self._tail_visible:
+            if head and len(head) >= self._min_length():
+                entries.append((head, False, head_visible))
+                head, head_visible = "", 0
+            include_tail = True
+            head_visible = min(2, head_visible + self._tail_visible)
+        if head or include_tail:
+            entries.append((head, include_tail, head_visible))
+        # 过滤掉去除首尾空白后不足两个字符的片段
+        return [(head, include_tail) for head, include_tail, visible in entries if visible >= 2]
+
+    def feed(self, text):
+        """
+        输入一个LLM文本片段
+        
+        返回:
+            list: 新完成的段落列表，可能为空
+        """
+        if not text:
+            return []
+        self._consume(text)
+        segments = self._split_buffer()
+        if len(segments) <= 1:
+            return []
+        tail = "".join(self._tail_parts)
+        segments = [head + tail if include_tail else head for head, include_tail in segments]
+        completed = segments[:-1]
+        self.emitted_count += len(completed)
+        # 最后一段继续作为缓冲区累积后续文本
+        self._reset(segments[-1])
+        return completed
+
+    def flush(self):
+        """
+        LLM生成结束时取出缓冲区中剩余的文本
+        
+        返回:
+            str: 剩余的原始文本（未去除首尾空白），没有剩余时为空字符串
+        """
+        remaining = "".join(self._buffer_parts)
+        self._reset("")
+        return remaining
+
+
+class _SegmentSlot:
+    """单个段落在重排缓冲区中的状态"""
+
+    __slots__ = ("chunks", "closed", "chunk_count")
+
+    def __init__(self):
+        self.chunks: Deque[Any] = deque()  # 尚未输出的音频块
+        self.closed = False  # 段落的TTS是否已结束（完成、失败或超时）
+        self.chunk_count = 0  # 段落累计收到的音频块数量
+
+
+class SegmentReorderBuffer:
+    """
+    TTS音频块的段落重排缓冲区
+
+    每个段落在登记时获得递增的序号，并拥有独立的音频块队列。多个段落的TTS可以并发、
+    乱序地写入，输出时严格按照序号顺序：当前段落的音频块输出完且该段落已结束后，
+    才切换到下一个序号。写入、输出和切换段落都是常数时间，与段落总数无关。
+    """
+
+    def __init__(self):
+        self._slots: Dict[int, _SegmentSlot] = {}  # 尚未输出完毕的段落
+        self._next_seq = 0  # 下一个登记段落的序号
+        self._output_seq = 0  # 当前正在输出的段落序号
+        self._open_count = 0  # 尚未结束的段落数量
+        self._buffered = 0  # 缓冲区中尚未输出的音频块总数
+
+    def open_segment(self) -> int:
+        """登记一个新段落并返回它的序号"""
+        seq = self._next_seq
+        self._next_seq += 1
+        self._slots[seq] = _SegmentSlot()
+        self._open_count += 1
+        return seq
+
+    def push(self, seq: int, chunk: Any) -> bool:
+        """
+        向段落追加一个音频块
+
+        返回:
+            bool: 段落仍在进行中时返回True；段落已结束（例如已超时被放弃）时丢弃该块并返回False
+        """
+        slot = self._slots.get(seq)
+        if slot is None or slot.closed:
+            return False
+        slot.chunks.append(chunk)
+        slot.chunk_count += 1
+        self._buffered += 1
+        return True
+
+    def close(self, seq: int) -> int:
+        """
+        标记段落的TTS已结束，已缓冲的音频块仍会按顺序输出
+
+        返回:
+            int: 段落累计收到的音频块数量；段落不存在或已结束时返回-1
+        """
+        slot = self._slots.get(seq)
+        if slot is None or slot.closed:
+            return -1
+        slot.closed = True
+        self._open_count -= 1
+        return slot.chunk_count
+
+    def is_open(self, seq: int) -> bool:
+        """段落是否仍在等待TTS结果"""
+        slot = self._slots.get(seq)
+        return slot is not None and not slot.closed
+
+    @property
+    def open_count(self) -> int:
+        """尚未结束的段落数量"""
+        return self._open_count
+
+    @property
+    def output_seq(self) -> int:
+        """当前正在输出的段落序号"""
+        return self._output_seq
+
+    def __len__(self) -> int:
+        """缓冲区中尚未输出的音频块数量"""
+        return self._buffered
+
+    def pop_ready(self) -> Iterator[Tuple[int, Any]]:
+        """按段落顺序取出当前可以输出的音频块，遇到仍在进行且暂无音频的段落时停止"""
+        slots = self._slots
+        while self._output_seq < self._next_seq:
+            slot = slots[self._output_seq]
+            while slot.chunks:
+                self._buffered -= 1
+                yield self._output_seq, slot.chunks.popleft()
+            if not slot.closed:
+                return
+            del slots[self._output_seq]
+            self._output_seq += 1
+
+    def drain(self) -> Iterator[Tuple[int, Any]]:
+        """按段落顺序取出全部已缓冲的音频块，不再等待未结束的段落"""
+        for seq in list(self._slots):
+            slot = self._slots.pop(seq)
+            if not slot.closed:
+                self._open_count -= 1
+            while slot.chunks:
+                self._buffered -= 1
+                yield seq, slot.chunks.popleft()
+        self._output_seq = self._next_seq
@@ -0,0 +1,111 @@
+"""
+预生成工具模块
+在用户空闲时提前生成AI主动发起的对话，触发时直接输出
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Iterator, List, Optional
+
+
+class SpeculativeTurn:
+    """
+    在后台线程中提前运行的一轮对话
+
+    后台线程消费生成函数返回的生成器，把产生的音频块、额外输出和完整响应文本按顺序缓存起来。
+    触发时通过 replay 输出：已缓存的内容立即输出，尚未生成的部分边生成边输出。
+    用户先开口或配置改变时调用 cancel 作废，生成器会被关闭，其中的LLM和TTS任务随之停止。
+    """
+
+    def __init__(self, next_action: str, history_length: int, generate: Callable[[], Iterator[Any]]):
+        """
+        创建并立即开始预生成
+
+        参数:
+            next_action (str): 预生成所依据的下一步行动，触发时的行动不同则不能使用
+            history_length (int): 预生成开始时会话消息的数量，用于判断对话历史是否已经改变
+            generate (callable): 无参数函数，返回产生本轮全部输出的生成器
+        """
+        self.next_action = next_action
+        self.history_length = history_length
+        self._generate = generate
+        self._outputs: List[Any] = []
+        self._condition = threading.Condition()
+        self._finished = False
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="speculative-turn", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        generator = None
+        try:
+            generator = self._generate()
+            for item in generator:
+                if self._cancelled.is_set():
+                    break
+                with self._condition:
+                    self._outputs.append(item)
+                    self._condition.notify_all()
+        except Exception as e:
+            logging.error(f"预生成对话出错: {e}")
+            self._cancelled.set()
+        finally:
+            if generator is not None:
+                generator.close()
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def cancel(self):
+        """作废预生成结果，并尽快停止仍在进行的生成"""
+        self._cancelled.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    @property
+    def cancelled(self) -> bool:
+        """预生成是否已作废（包括生成过程中出错）"""
+        return self._cancelled.is_set()
+
+    def matches(self, next_action: str, history_length: int) -> bool:
+        """预生成结果能否用于当前触发：未作废，行动相同，且对话历史没有改变"""
+        return not self.cancelled and self.next_action == next_action and self.history_length == history_length
+
+    def replay(self) -> Iterator[Any]:
+        """
+        按顺序输出预生成的全部内容，生成尚未结束时等待后续内容
+
+        返回:
+            generator: 与生成函数返回的生成器产生相同的内容；预生成中途作废时提前结束
+        """
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._outputs) and not self._finished and not self._cancelled.is_set():
+                    self._condition.wait()
+                if self._cancelled.is_set():
+                    return
+                ready = self._outputs[index:]
+                finished = self._finished
+            index += len(ready)
+            yield from ready
+            if finished and index >= len(self._outputs):
+                return
+
+
+def cancel_speculative_turn(session: dict, reason: str) -> Optional[SpeculativeTurn]:
+    """
+    取出并作废会话中的预生成对话
+
+    参数:
+        session (dict): 用户会话状态
+        reason (str): 作废原因，用于记录日志
+
+    返回:
+        SpeculativeTurn: 被作废的预生成对话，没有时返回None
+    """
+    speculative_turn = session.pop("speculative_turn", None)
+    if speculative_turn is not None:
+        speculative_turn.cancel()
+        logging.info(f"预生成的主动对话已作废: {reason}")
+    return speculative_turn
@@ -5,6 +5,7 @@
 
 import logging
 import json
+import os
 import re
 import asyncio
 from fastrtc import AdditionalOutputs
@@ -15,252 +16,268 @@ from concurrent.futures import ThreadPoolExecutor, Future
 import queue
 from collections import deque
 
-from .async_utils import run_async
-from tts.speech import translate_text
-
-def split_text_by_punctuation(text, min_segment_length=15):
-    """
-    根据标点符号分割文本，并确保每个分段具有最小长度
-    
-    参数:
-        text (str): 要分割的文本
-        min_segment_length (int): 分段的最小长度，短于此长度的片段将尝试与相邻片段合并
-        
-    返回:
-        list: 分割后的文本片段列表
-    """
-    # 标点符号模式：中英文常见标点符号
-    punctuation_pattern = r'([,.?!，。？！;；])'
-    
-    # 第一步：按标点符号分割
-    segments = re.split(punctuation_pattern, text)
-    
-    # 第二步：合并标点和前面的文本
-    intermediate_result = []
-    i = 0
-    while i < len(segments):
-        if i + 1 < len(segments) and re.match(punctuation_pattern, segments[i + 1]):
-            intermediate_result.append(segments[i] + segments[i + 1])
-            i += 2
-        else:
-            if segments[i].strip():  # 只添加非空片段
-                intermediate_result.append(segments[i])
-            i += 1
-    
-    # 第三步：合并长度过短的片段
-    result = []
-    current_segment = ""
-    
-    for segment in intermediate_result:
-        # 处理第一个片段或当前累积片段为空的情况
-        if not current_segment:
-            current_segment = segment
-            continue
-            
-        # 如果当前片段结尾有标点符号，表示是一个自然的分割点
-        has_ending_punctuation = bool(re.search(r'[,.?!，。？！;；]$', current_segment))
-        
-        # 判断当前累积片段是否足够长
-        if len(current_segment) >= min_segment_length and has_ending_punctuation:
-            # 如果当前累积片段足够长且有标点符号，将其添加到结果中并重置
-            result.append(current_segment)
-            current_segment = segment
-        else:
-            # 如果当前累积片段不够长或没有标点符号，继续累积
-            current_segment += segment
-    
-    # 处理最后剩余的片段
-    if current_segment:
-        result.append(current_segment)
-    
-    # 过滤掉任何仍然太短且不包含有意义内容的片段
-    result = [seg for seg in result if len(seg.strip()) >= 2]  # 至少保留两个字符的内容
-                
-    return result
+from .async_utils import submit_async
+from .segment_utils import SegmentReorderBuffer, StreamingSegmenter
 
 # 创建线程池执行器
 _thread_pool = ThreadPoolExecutor(max_workers=4)
 _tts_pool = ThreadPoolExecutor(max_workers=4)  # 专门用于TTS转换的线程池
 
-# 使用共享队列存储TTS音频块，实现真正的流式传输
-_audio_chunk_queue = queue.Queue()
+# 每轮第一个段落的最小长度，大于0时开启首段提前输出，让TTS尽早开始；为0时与其他段落使用相同的最小长度
+FIRST_SEGMENT_MIN_LENGTH = int(os.getenv("FIRST_SEGMENT_MIN_LENGTH", "0"))
 
-def run_emotion_analysis_in_thread(run_predict_emotion, text, client):
-    """
-    在线程池中运行情感分析以避免阻塞主流程
-    
-    参数:
-        run_predict_emotion: 情感分析函数
-        text: 要分析的文本
-        client: 客户端对象
-        
-    返回:
-        情感分析结果
-    """
-    try:
-        return run_async(run_predict_emotion, text, client)
-    except Exception as e:
-        logging.error(f"情感分析出错: {e}")
-        return None
+# 单个段落TTS的截止时间（秒）：段落的TTS开始执行后或收到最近一个音频块后，超过该时间仍无进展则放弃该段落
+TTS_SEGMENT_TIMEOUT = float(os.getenv("TTS_SEGMENT_TIMEOUT", "30"))
+# 段落提交后等待TTS开始执行的最长时间（秒），TTS线程池或事件循环长时间被占满时放弃该段落，避免整轮对话卡住
+TTS_SEGMENT_QUEUE_TIMEOUT = float(os.getenv("TTS_SEGMENT_QUEUE_TIMEOUT", "120"))
+
+# 本轮事件通道中的事件类型，事件格式统一为 (事件类型, 段落ID, 数据)
+_EVENT_LLM_TEXT = "llm_text"  # LLM产生了新的文本片段，数据为 (text_chunk, full_response)
+_EVENT_LLM_DONE = "llm_done"  # LLM生成结束，数据为 None 或生成过程中抛出的异常
+_EVENT_SEGMENT_STARTED = "segment_started"  # 段落的TTS开始执行，数据为 None
+_EVENT_AUDIO = "audio"  # TTS产生了新的音频块，数据为 (sample_rate, audio_array)
+_EVENT_SEGMENT_DONE = "segment_done"  # 段落的TTS已结束，数据为 None
+_EVENT_TASK_DONE = "task_done"  # 某个后台任务（翻译、情感分析）已完成，只用于唤醒调度循环，数据为 None
+
+# 段落翻译的最长等待时间（秒），超时后改用原文，不再等待
+SEGMENT_TRANSLATION_TIMEOUT = float(os.getenv("SEGMENT_TRANSLATION_TIMEOUT", "5"))
 
-def run_tts_in_thread(text_to_speech_stream, segment, voice, segment_id):
+# 是否在后台对完整响应再做一次整体翻译，检查逐段翻译拼接结果的连贯性
+# 完整响应事件直接使用逐段翻译的拼接结果，不等待这次翻译；整体翻译在本轮结束前完成且与拼接结果不同时，
+# 额外产生一个 llm_response_revision 事件
+TRANSLATION_CONSISTENCY_PASS = os.getenv("TRANSLATION_CONSISTENCY_PASS", "false").lower() in ("1", "true", "yes")
+
+# 单次情感分析的最长等待时间（秒），超时后不再等待该次结果
+EMOTION_TIMEOUT = float(os.getenv("EMOTION_TIMEOUT", "10"))
+
+def run_tts_in_thread(text_to_speech_stream, segment, voice, segment_seq, turn_events):
     """
-    在线程池中运行TTS转换，并将音频块实时添加到共享队列
+    在线程池中运行TTS转换，并将音频块实时添加到本轮对话的事件通道
     
     参数:
         text_to_speech_stream: TTS函数
         segment: 要转换的文本段落
         voice: 语音配置
-        segment_id: 段落ID，用于标识音频块所属段落
+        segment_seq: 段落序号，用于标识音频块所属段落
+        turn_events: 本轮对话独占的事件通道，由 process_llm_stream 创建
         
     返回:
-        None (结果通过队列传递)
+        None (结果通过事件通道传递)
     """
     try:
-        logging.info(f"开始TTS转换 - 段落ID: {segment_id}, 文本长度: {len(segment)}, 文本预览: {segment[:50]}...")
+        # 段落的截止时间从TTS真正开始执行时计算，不包括在线程池中排队的时间
+        turn_events.put((_EVENT_SEGMENT_STARTED, segment_seq, None))
+        logging.info(f"开始TTS转换 - 段落序号: {segment_seq}, 文本长度: {len(segment)}, 文本预览: {segment[:50]}...")
         
         chunk_count = 0
         start_time = time.time()
         
         for audio_chunk in text_to_speech_stream(segment, voice=voice):
             chunk_count += 1
-            # 直接将音频块放入共享队列，实现实时流式传输
-            # 添加时间戳和块序号以便调试
+            # 直接将音频块放入本轮的事件通道，调度循环会被立即唤醒
             chunk_with_meta = (audio_chunk[0], audio_chunk[1])  # (sample_rate, audio_array)
-            _audio_chunk_queue.put((segment_id, chunk_with_meta))
+            turn_events.put((_EVENT_AUDIO, segment_seq, chunk_with_meta))
             
         end_time = time.time()
-        logging.info(f"TTS转换完成 - 段落ID: {segment_id}, 生成音频块数量: {chunk_count}, 耗时: {end_time - start_time:.2f}秒")
+        logging.info(f"TTS转换完成 - 段落序号: {segment_seq}, 生成音频块数量: {chunk_count}, 耗时: {end_time - start_time:.2f}秒")
         
     except Exception as e:
-        logging.error(f"TTS转换出错 - 段落ID: {segment_id}, 错误: {e}, 文本: {segment[:30]}...")
+        logging.error(f"TTS转换出错 - 段落序号: {segment_seq}, 错误: {e}, 文本: {segment[:30]}...")
     finally:
-        # 添加一个None标记表示这个段落的TTS已经完成
-        _audio_chunk_queue.put((segment_id, None))
-        logging.info(f"TTS任务结束标记已发送 - 段落ID: {segment_id}")
+        # 发送段落完成标记，表示这个段落的TTS已经结束
+        turn_events.put((_EVENT_SEGMENT_DONE, segment_seq, None))
+        logging.info(f"TTS任务结束标记已发送 - 段落序号: {segment_seq}")
 
-def check_and_process_tts_tasks(
-    pending_tts_tasks: Dict[str, int],  # 改为int，value表示已产生的chunk数量
-    audio_queue: Deque[Tuple[str, Any]], 
-    segment_order: List[str],
-    current_output_segment_id: List[Optional[str]]
-):
-    """检查并处理已完成的TTS任务，从共享队列获取音频块"""
-    # 从共享队列中获取所有可用的音频块
-    temp_chunks = []  # 临时存储新获取的音频块
-    completed_segments = []  # 记录正常完成的段落 (segment_id, chunk_count)
-    failed_segments = []  # 记录失败（无音频块）的段落
-    
-    while not _audio_chunk_queue.empty():
-        try:
-            segment_id, audio_chunk = _audio_chunk_queue.get_nowait()
-            
-            # 如果是None标记，表示该段落的TTS已完成
-            if audio_chunk is None:
-                # TTS流标记完成，pop出来拿到它的chunk计数
-                count = pending_tts_tasks.pop(segment_id, 0)
-                if count == 0:
-                    # 真正失败，没有产生任何音频块
-                    failed_segments.append(segment_id)
-                else:
-                    # 正常完成，记录产生的块数
-                    completed_segments.append((segment_id, count))
-            else:
-                # 真正的音频块，增加计数
-                pending_tts_tasks[segment_id] = pending_tts_tasks.get(segment_id, 0) + 1
-                temp_chunks.append((segment_id, audio_chunk))
-        except queue.Empty:
-            break
-    
-    # 处理失败的段落：从segment_order中彻底移除
-    for failed_segment_id in failed_segments:
-        if failed_segment_id in segment_order:
-            segment_order.remove(failed_segment_id)
-            logging.warning(f"段落 {failed_segment_id} 的TTS完成但真没有音频块，已从处理序列中移除")
-            
-            # 如果当前输出段落指向失败的段落，需要切换到下一个
-            if current_output_segment_id[0] == failed_segment_id:
-                _skip_to_next_segment(segment_order, current_output_segment_id)
+async def run_tts_async(text_to_speech_stream_async, segment, voice, segment_seq, turn_events):
+    """
+    在共享事件循环中运行异步TTS转换，并将音频块实时添加到本轮对话的事件通道
     
-    # 记录正常完成的段落
-    if completed_segments:
-        completed_ids = [seg_id for seg_id, count in completed_segments]
-        logging.info(f"TTS正常完成的段落: {completed_ids}, 剩余待处理段落: {list(pending_tts_tasks.keys())}")
+    与 run_tts_in_thread 产生相同的事件，但不占用TTS线程池中的线程
     
-    # 按照segment_order对新获取的音频块进行排序，然后添加到队列
-    if temp_chunks:
-        # 创建一个映射，将segment_id映射到它在segment_order中的位置
-        segment_position = {seg_id: idx for idx, seg_id in enumerate(segment_order)}
+    参数:
+        text_to_speech_stream_async: 异步TTS函数
+        segment: 要转换的文本段落
+        voice: 语音配置
+        segment_seq: 段落序号，用于标识音频块所属段落
+        turn_events: 本轮对话独占的事件通道，由 process_llm_stream 创建
+    """
+    try:
+        turn_events.put((_EVENT_SEGMENT_STARTED, segment_seq, None))
+        logging.info(f"开始异步TTS转换 - 段落序号: {segment_seq}, 文本长度: {len(segment)}, 文本预览: {segment[:50]}...")
         
-        # 按照在segment_order中的位置对音频块进行排序
-        temp_chunks.sort(key=lambda x: segment_position.get(x[0], float('inf')))
+        chunk_count = 0
+        start_time = time.time()
         
-        # 记录音频块信息
-        chunk_info = [(seg_id, f"pos_{segment_position.get(seg_id, 'unknown')}") for seg_id, _ in temp_chunks]
-        logging.info(f"处理音频块: {chunk_info}, 当前队列长度: {len(audio_queue)}")
+        async for audio_chunk in text_to_speech_stream_async(segment, voice=voice):
+            chunk_count += 1
+            turn_events.put((_EVENT_AUDIO, segment_seq, (audio_chunk[0], audio_chunk[1])))
         
-        # 将排序后的音频块添加到输出队列
-        for segment_id, audio_chunk in temp_chunks:
-            audio_queue.append((segment_id, audio_chunk))
+        logging.info(f"异步TTS转换完成 - 段落序号: {segment_seq}, 生成音频块数量: {chunk_count}, 耗时: {time.time() - start_time:.2f}秒")
+    except asyncio.CancelledError:
+        logging.info(f"异步TTS转换已取消 - 段落序号: {segment_seq}")
+        raise
+    except Exception as e:
+        logging.error(f"异步TTS转换出错 - 段落序号: {segment_seq}, 错误: {e}, 文本: {segment[:30]}...")
+    finally:
+        # 发送段落完成标记，表示这个段落的TTS已经结束
+        turn_events.put((_EVENT_SEGMENT_DONE, segment_seq, None))
+
+def _pump_llm_stream(ai_stream, client, messages, model, max_tokens, max_context_length, turn_events, stop_event):
+    """
+    在独立线程中消费LLM流，把每个文本片段作为事件放入本轮事件通道
     
-    return None
+    这样调度循环只需要阻塞等待事件通道，文本片段和音频块到达时都能立即被处理
+    """
+    try:
+        for text_chunk, current_full_response in ai_stream(client, messages, model=model, max_tokens=max_tokens, max_context_length=max_context_length):
+            if stop_event.is_set():
+                logging.info("本轮对话已结束，停止读取LLM流")
+                break
+            turn_events.put((_EVENT_LLM_TEXT, None, (text_chunk, current_full_response)))
+        turn_events.put((_EVENT_LLM_DONE, None, None))
+    except Exception as e:
+        logging.error(f"LLM流式生成出错: {e}")
+        turn_events.put((_EVENT_LLM_DONE, None, e))
 
-def yield_ready_audio_chunks(audio_queue, segment_order, current_output_segment_id, force_all=False, pending_tts_tasks=None):
-    """按照段落顺序输出准备好的音频块"""
-    # 如果当前没有正在输出的段落，取第一个
-    if current_output_segment_id[0] is None and segment_order:
-        current_output_segment_id[0] = segment_order[0]
-        logging.info(f"开始输出第一个段落: {current_output_segment_id[0]}")
+def _wait_for_turn_events(turn_events, timeout):
+    """阻塞等待本轮事件通道中的下一个事件，并一次性取出所有已到达的事件"""
+    events = []
+    try:
+        events.append(turn_events.get(timeout=timeout))
+    except queue.Empty:
+        return events
+    while True:
+        try:
+            events.append(turn_events.get_nowait())
+        except queue.Empty:
+            return events
+
+def _route_tts_events(tts_events, reorder_buffer, segment_deadlines):
+    """把从事件通道取出的TTS事件写入段落重排缓冲区，并维护各段落的截止时间"""
+    for kind, segment_seq, audio_chunk in tts_events:
+        if kind == _EVENT_SEGMENT_STARTED:
+            # 段落开始执行TTS，截止时间从现在开始计算；已被放弃的段落不再登记
+            if reorder_buffer.is_open(segment_seq):
+                segment_deadlines[segment_seq] = time.time() + TTS_SEGMENT_TIMEOUT
+        elif kind == _EVENT_SEGMENT_DONE:
+            segment_deadlines.pop(segment_seq, None)
+            count = reorder_buffer.close(segment_seq)
+            if count == 0:
+                # 真正失败，没有产生任何音频块，输出时会直接跳过该段落
+                logging.warning(f"段落 {segment_seq} 的TTS完成但真没有音频块，已从处理序列中移除")
+            elif count > 0:
+                logging.info(f"TTS正常完成的段落: {segment_seq}, 音频块数量: {count}, 剩余待处理段落数: {reorder_buffer.open_count}")
+        elif reorder_buffer.push(segment_seq, audio_chunk):
+            # 收到音频块说明该段落仍在进展，顺延截止时间
+            segment_deadlines[segment_seq] = time.time() + TTS_SEGMENT_TIMEOUT
+        else:
+            # 段落已超过截止时间被放弃，迟到的音频块直接丢弃
+            logging.warning(f"段落 {segment_seq} 已被放弃，丢弃迟到的音频块")
+
+def _expire_stalled_segments(reorder_buffer, segment_deadlines):
+    """放弃超过截止时间仍无进展的段落，避免个别TTS请求卡住整轮对话"""
+    now = time.time()
+    for segment_seq, deadline in list(segment_deadlines.items()):
+        if deadline > now:
+            continue
+        del segment_deadlines[segment_seq]
+        count = reorder_buffer.close(segment_seq)
+        logging.warning(f"段落 {segment_seq} 超过截止时间仍无进展（TTS未开始或 {TTS_SEGMENT_TIMEOUT} 秒没有新的音频块），放弃等待（已产生 {count} 个音频块）")
+
+def _next_wakeup_timeout(llm_completed, deadlines):
+    """计算调度循环的最长阻塞时间：有任务在等待时醒来检查最近的截止时间，否则一直等待新事件"""
+    if not deadlines:
+        # LLM已结束且没有待处理任务时不会再等待；LLM未结束时一直阻塞直到有新事件
+        return None if not llm_completed else 0
+    return max(0.0, min(deadlines) - time.time())
+
+def _submit_translation(translate_text, text, text_output_language, voice_output_language, turn_events):
+    """在线程池中提交翻译任务，任务完成时向事件通道发送唤醒事件"""
+    future = _thread_pool.submit(translate_text, text, target_language=text_output_language, source_language=voice_output_language)
+    future.add_done_callback(lambda _: turn_events.put((_EVENT_TASK_DONE, None, None)))
+    return future
+
+async def _predict_emotion_safely(run_predict_emotion, text, client):
+    """运行情感分析，出错时返回None"""
+    try:
+        return await run_predict_emotion(text, client)
+    except Exception as e:
+        logging.error(f"情感分析出错: {e}")
+        return None
+
+def _submit_emotion_analysis(run_predict_emotion, text, client, turn_events):
+    """在共享事件循环中提交情感分析任务，任务完成时向事件通道发送唤醒事件"""
+    future = submit_async(_predict_emotion_safely, run_predict_emotion, text, client)
+    future.add_done_callback(lambda _: turn_events.put((_EVENT_TASK_DONE, None, None)))
+    return future
+
+def _comparable_text(text):
+    """去除所有空白，用于判断两段文本的内容是否相同"""
+    return re.sub(r"\s+", "", text)
+
+def _translation_result(future, deadline, description):
+    """
+    取出已完成的翻译结果，不会阻塞；任务仍在进行但已超过截止时间时放弃等待
     
-    yielded_count = 0
+    返回:
+        tuple: (是否已有结论, 翻译结果)，翻译失败或超时时结果为None
+    """
+    if future.done():
+        try:
+            return True, future.result()
+        except Exception as e:
+            logging.error(f"{description}翻译失败: {e}")
+            return True, None
+    if time.time() < deadline:
+        return False, None
+    future.cancel()
+    logging.error(f"{description}翻译超时，使用原文")
+    return True, None
+
+def _ready_stream_events(pending_stream_segments, full_response_for_client_segments, trace=None):
+    """
+    按段落顺序产生翻译已完成的llm_stream事件
     
-    # 处理队列中的音频块 - 使用简化逻辑
-    while audio_queue:
-        head_seg, chunk = audio_queue[0]
+    前面的段落翻译未完成时，后面的段落即使已完成也要等待，保证客户端收到的文本顺序与语音一致
+    """
+    while pending_stream_segments:
+        segment, translation_future, deadline = pending_stream_segments[0]
+        translated_segment = None
+        if translation_future is not None:
+            settled, translated_segment = _translation_result(translation_future, deadline, "段落")
+            if not settled:
+                return
+        pending_stream_segments.popleft()
         
-        # 如果是当前输出段落的块或强制输出所有内容，则yield出去
-        if head_seg == current_output_segment_id[0] or force_all:
-            audio_queue.popleft()
-            yielded_count += 1
-            yield (head_seg, chunk)
-        else:
-            # 检查队首段落是否在 segment_order 中且排在当前段落之后
-            if (head_seg in segment_order and 
-                current_output_segment_id[0] in segment_order and
-                segment_order.index(head_seg) > segment_order.index(current_output_segment_id[0])):
-                # 队首段落在当前段落之后，跳到下一个段落
-                logging.info(f"队首段落 {head_seg} 在当前段落 {current_output_segment_id[0]} 之后，跳过当前段落")
-                _skip_to_next_segment(segment_order, current_output_segment_id)
-                continue  # 重新开始循环，用新的当前段落ID检查
-            elif head_seg not in segment_order:
-                # 队首段落不在 segment_order 中，这是过期的音频块，直接丢弃
-                logging.warning(f"发现过期音频块，段落ID: {head_seg}，直接丢弃")
-                audio_queue.popleft()
-                continue
-            else:
-                # 正常等待当前段落完成
-                logging.info(f"等待当前段落 {current_output_segment_id[0]} 完成，队首段落: {head_seg}")
-                break
+        # 决定要在流式事件中发送的文本：如果有翻译就用翻译，否则用原文
+        stream_text = translated_segment if (translated_segment and translated_segment.strip()) else segment
         
-        # 如果当前段落的所有块都已输出，检查是否需要切换到下一个段落
-        if not audio_queue or audio_queue[0][0] != current_output_segment_id[0]:
-            _skip_to_next_segment(segment_order, current_output_segment_id)
-    
-    if yielded_count > 0:
-        logging.info(f"本次输出了 {yielded_count} 个音频块，剩余队列长度: {len(audio_queue)}")
-    
-    return None
+        event_data = {"type": "llm_stream", "data": stream_text}
+        # 如果进行了翻译，也保留原文作为参考
+        if translated_segment and translated_segment.strip():
+            event_data["original"] = segment
+        logging.info(f"Yielding llm_stream event_data: {event_data}")
+        if trace is not None:
+            trace.mark("first_segment")
+        yield AdditionalOutputs(json.dumps(event_data))
+        
+        full_response_for_client_segments.append(stream_text)
+
 
-def _skip_to_next_segment(segment_order, current_output_segment_id):
-    """跳转到下一个段落的辅助函数"""
-    if segment_order and current_output_segment_id[0] in segment_order:
-        idx = segment_order.index(current_output_segment_id[0])
-        if idx + 1 < len(segment_order):
-            old_segment_id = current_output_segment_id[0]
-            current_output_segment_id[0] = segment_order[idx + 1]
-            logging.info(f"切换到下一个段落: {old_segment_id} -> {current_output_segment_id[0]}")
+def _paced_audio_outputs(outputs, last_audio_yield_time, min_audio_interval=0.01, trace=None):
+    """输出音频块并控制相邻音频块的最小间隔，避免挤在一起"""
+    for output in outputs:
+        if isinstance(output, AdditionalOutputs):
+            yield output
         else:
-            logging.info(f"当前段落 {current_output_segment_id[0]} 是最后一个段落")
+            current_time = time.time()
+            if current_time - last_audio_yield_time[0] < min_audio_interval:
+                time.sleep(min_audio_interval - (current_time - last_audio_yield_time[0]))
+            
+            if trace is not None:
+                trace.mark("first_audio")
+            yield output[1]  # 实际音频块
+            last_audio_yield_time[0] = time.time()
 
 def process_llm_stream(
     client, 
@@ -276,10 +293,18 @@ def process_llm_stream(
     max_tokens=None,
     max_context_length=None,
     min_segment_length=15,  # 添加最小片段长度参数
+    first_segment_min_length=None,
+    text_to_speech_stream_async=None,
+    translate_text=None,
+    trace=None,
+    on_llm_done=None,
 ):
     """
     处理 LLM 的流式响应，使用统一的处理逻辑并支持基于标点符号的分段
     
+    LLM文本片段、TTS音频块和段落完成标记都通过本轮独占的事件通道到达，
+    调度循环阻塞等待事件，任何一个事件到达都会被立即处理，不再按固定间隔轮询
+    
     参数:
         client: OpenAI 客户端
         messages: 消息历史
@@ -289,313 +314,275 @@ def process_llm_stream(
         is_same_language: 文本和语音是否为同一语言
         run_predict_emotion: 情感分析函数
         ai_stream: AI 流式生成函数
-        text_to_speech_stream: 文本转语音流函数
+        text_to_speech_stream: 文本转语音流函数，在TTS线程池中运行
         max_tokens: 最大生成令牌数
         max_context_length: 上下文最大消息数
         min_segment_length: 分段的最小长度，短于此长度的片段将尝试与相邻片段合并
+        first_segment_min_length: 第一个段落的最小长度，不指定时使用环境变量 FIRST_SEGMENT_MIN_LENGTH
+        text_to_speech_stream_async: 异步文本转语音流函数，提供时优先使用，在共享事件循环中运行
+        translate_text: 翻译函数，文本和语音语言不同时用于翻译段落
+        trace: 本轮对话的计时（TurnTrace），提供时记录首个token、首段文本和首个音频块的时间
+        on_llm_done: LLM生成结束时以完整响应文本调用的函数，此时剩余段落的TTS仍在进行
         
     返回:
         生成器，产生音频块和额外输出
     """
     full_response = ""
     full_response_for_client_segments = [] # New initialization
-    current_buffer = ""
-    processed_length = 0
     
-    # 清空音频块队列，避免之前的残留
-    while not _audio_chunk_queue.empty():
-        try:
-            _audio_chunk_queue.get_nowait()
-        except queue.Empty:
-            break
+    # 增量分段器：每个LLM文本片段只处理新增的字符
+    if first_segment_min_length is None and FIRST_SEGMENT_MIN_LENGTH > 0:
+        first_segment_min_length = FIRST_SEGMENT_MIN_LENGTH
+    segmenter = StreamingSegmenter(min_segment_length, first_segment_min_length)
     
-    # 存储正在进行的TTS任务（现在只用于跟踪哪些段落正在处理）
-    pending_tts_tasks: Dict[str, int] = {}
+    # 本轮对话独占的事件通道，LLM线程和TTS线程只向这里写入，避免并发会话之间互相串音或丢块
+    turn_events: "queue.Queue[Tuple[str, Optional[int], Any]]" = queue.Queue()
     
-    # 存储待输出的音频块队列
-    audio_queue: Deque[Tuple[str, Any]] = deque()  # (segment_id, audio_chunk)
+    # 段落重排缓冲区：段落按提交顺序获得序号，音频块按序号顺序输出
+    reorder_buffer = SegmentReorderBuffer()
     
-    # 为了确保流顺序，维护一个处理顺序列表
-    segment_order: List[str] = []
-    
-    # 当前正在输出的段落ID - 使用列表以便在函数间传递状态
-    current_output_segment_id = [None]
-    
-    # 最后一个段落的ID
-    last_segment_id = None
-    
-    # 上次检查TTS任务完成情况的时间
-    last_check_time = time.time()
+    # 每个进行中段落的截止时间，超过后放弃该段落：TTS开始前为排队的截止时间，开始后为无进展的截止时间
+    segment_deadlines: Dict[int, float] = {}
     
     # 标记LLM是否完成
     llm_completed = False
     
-    # 添加延迟机制，避免音频块挤在一起
-    last_audio_yield_time = 0
-    min_audio_interval = 0.01  # 最小音频块间隔 10ms
-    
-    for text_chunk, current_full_response in ai_stream(client, messages, model=model, max_tokens=max_tokens, max_context_length=max_context_length):        
-        full_response = current_full_response
-        current_buffer += text_chunk
-        
-        # 使用优化后的分段函数，传入最小片段长度
-        segments = split_text_by_punctuation(current_buffer, min_segment_length)
-        
-        # 定期检查TTS任务完成情况，不仅在有新分段时
-        current_time = time.time()
-        if current_time - last_check_time > 0.05:  # 每50毫秒检查一次，更频繁地检查
-            last_check_time = current_time
-            
-            # 检查已完成的TTS任务并获取新的音频块
-            check_and_process_tts_tasks(
-                pending_tts_tasks, 
-                audio_queue, 
-                segment_order,
-                current_output_segment_id
-            )
-            
-            # 输出准备好的音频块，添加间隔控制
-            for output in yield_ready_audio_chunks(audio_queue, segment_order, current_output_segment_id, pending_tts_tasks=pending_tts_tasks):
-                if isinstance(output, AdditionalOutputs):
-                    yield output
-                else:
-                    # 控制音频块输出间隔，避免挤在一起
-                    current_time = time.time()
-                    if current_time - last_audio_yield_time < min_audio_interval:
-                        time.sleep(min_audio_interval - (current_time - last_audio_yield_time))
-                    
-                    yield output[1]  # 实际音频块
-                    last_audio_yield_time = time.time()
-        
-        if len(segments) > 1:  # 如果有多个分段
-            segments_to_process = segments[:-1]
-            current_buffer = segments[-1]
-            
-            for segment in segments_to_process:
-                if segment.strip():
-                    # 为段落生成唯一ID
-                    segment_id = f"segment_{time.time()}_{len(segment)}"
-                    segment_order.append(segment_id)
-                    
-                    # 先初始化计数为0，必须在submit之前
-                    pending_tts_tasks[segment_id] = 0
-
-                    # Submit TTS to _tts_pool early
-                    _tts_pool.submit(
-                        run_tts_in_thread,
-                        text_to_speech_stream,
-                        segment, # Original segment for TTS
-                        siliconflow_config.get("voice"),
-                        segment_id
-                    )
-
-                    translated_segment = None
-                    if voice_output_language and text_output_language and voice_output_language != text_output_language:
-                        if segment.strip(): # Ensure there's text to translate
-                            translation_future = _thread_pool.submit(translate_text, segment, target_language=text_output_language, source_language=voice_output_language)
-                            try:
-                                translated_segment = translation_future.result(timeout=5) # Wait for this specific translation with a timeout
-                            except Exception as e:
-                                logging.error(f"Translation for segment failed or timed out: {e}")
-                                translated_segment = None # Ensure it's None if error or timeout
-                    
-                    # 决定要在流式事件中发送的文本：如果有翻译就用翻译，否则用原文
-                    stream_text = translated_segment if (translated_segment and translated_segment.strip()) else segment
-                    
-                    event_data = {"type": "llm_stream", "data": stream_text}
-                    # 如果进行了翻译，也保留原文作为参考
-                    if translated_segment and translated_segment.strip():
-                        event_data["original"] = segment
-                    # Yield llm_stream event
-                    logging.info(f"Yielding llm_stream event_data: {event_data}")
-                    yield AdditionalOutputs(json.dumps(event_data))
-
-                    # Append to full_response_for_client_segments
-                    if translated_segment and translated_segment.strip():
-                        full_response_for_client_segments.append(translated_segment)
-                    else:
-                        full_response_for_client_segments.append(segment)
-                    
-                    # 立即检查是否有新的音频块可用
-                    check_and_process_tts_tasks(
-                        pending_tts_tasks, 
-                        audio_queue, 
-                        segment_order,
-                        current_output_segment_id
-                    )
-                    
-                    # 立即输出就绪的音频块，添加间隔控制
-                    for output in yield_ready_audio_chunks(audio_queue, segment_order, current_output_segment_id, pending_tts_tasks=pending_tts_tasks):
-                        if isinstance(output, AdditionalOutputs):
-                            yield output
-                        else:
-                            # 控制音频块输出间隔，避免挤在一起
-                            current_time = time.time()
-                            if current_time - last_audio_yield_time < min_audio_interval:
-                                time.sleep(min_audio_interval - (current_time - last_audio_yield_time))
-                            
-                            yield output[1]  # 实际音频块
-                            last_audio_yield_time = time.time()
-    
-    # LLM已完成生成，标记完成状态
-    llm_completed = True
+    # 上次输出音频块的时间，用于控制音频块间隔
+    last_audio_yield_time = [0]
     
-    # 处理最后可能剩余的内容
-    if current_buffer.strip():
-        last_segment_text = current_buffer.strip() # Use a new variable for clarity
-        last_segment_id = f"last_segment_{time.time()}"
-        segment_order.append(last_segment_id)
-        
-        # 先初始化计数为0，必须在submit之前
-        pending_tts_tasks[last_segment_id] = 0
-
-        # Submit TTS to _tts_pool early for the last segment
-        _tts_pool.submit(
-            run_tts_in_thread,
-            text_to_speech_stream,
-            last_segment_text, # Use the stripped text
-            siliconflow_config.get("voice"),
-            last_segment_id
-        )
-
-        translated_last_segment = None
-        if voice_output_language and text_output_language and voice_output_language != text_output_language:
-            if last_segment_text: # Ensure there's text to translate
-                translation_future = _thread_pool.submit(translate_text, last_segment_text, target_language=text_output_language, source_language=voice_output_language)
-                try:
-                    translated_last_segment = translation_future.result(timeout=5) # Wait for this specific translation with a timeout
-                except Exception as e:
-                    logging.error(f"Translation for last segment failed or timed out: {e}")
-                    translated_last_segment = None # Ensure it's None if error or timeout
-
-        # 决定要在流式事件中发送的文本：如果有翻译就用翻译，否则用原文
-        stream_text = translated_last_segment if (translated_last_segment and translated_last_segment.strip()) else last_segment_text
-        
-        event_data = {"type": "llm_stream", "data": stream_text}
-        # 如果进行了翻译，也保留原文作为参考
-        if translated_last_segment and translated_last_segment.strip():
-            event_data["original"] = last_segment_text
-        # Yield final llm_stream event
-        logging.info(f"Yielding final llm_stream event_data: {event_data}")
-        yield AdditionalOutputs(json.dumps(event_data))
-
-        # Append to full_response_for_client_segments for the final segment
-        if translated_last_segment and translated_last_segment.strip():
-            full_response_for_client_segments.append(translated_last_segment)
-        else:
-            full_response_for_client_segments.append(last_segment_text)
+    # 在共享事件循环中运行的异步TTS任务，本轮结束或被打断时取消
+    async_tts_futures: List[Future] = []
     
-    # 在LLM完成后立即进行情感分析，不等待TTS
-    if run_predict_emotion and llm_completed:
-        try:
-            # 对完整响应进行情感分析
-            emotion_result = run_emotion_analysis_in_thread(run_predict_emotion, full_response, client)
-            emotion_json = json.dumps({
-                "type": "emotion_response", 
-                "data": f"{emotion_result}", 
-                "segment_id": "full_response"
-            })
-            yield AdditionalOutputs(emotion_json)
-        except Exception as e:
-            logging.error(f"情感分析出错: {e}")
+    # 等待产生llm_stream事件的段落：(原文, 翻译任务, 翻译截止时间)，按段落顺序排列
+    pending_stream_segments: Deque[Tuple[str, Optional[Future], float]] = deque()
     
-    # 将文本包装成JSON对象，表示这是LLM返回的完整响应
-    final_full_response_for_client = "".join(full_response_for_client_segments)
+    # 已提交的段落原文，按段落顺序排列
+    submitted_segments: List[str] = []
     
-    # 对完整响应进行统一翻译（如果需要翻译）
-    unified_translation = None
-    if voice_output_language and text_output_language and voice_output_language != text_output_language:
-        if full_response.strip():  # 确保有内容需要翻译
-            try:
-                logging.info(f"开始对完整响应进行统一翻译，原文长度: {len(full_response)}")
-                translation_future = _thread_pool.submit(translate_text, full_response, target_language=text_output_language, source_language=voice_output_language)
-                unified_translation = translation_future.result(timeout=10)  # 给统一翻译更长的超时时间
-                logging.info(f"统一翻译完成，译文长度: {len(unified_translation) if unified_translation else 0}")
-            except Exception as e:
-                logging.error(f"统一翻译失败: {e}")
-                unified_translation = None
+    # LLM结束后放入一个标记，所有llm_stream事件产生后产生llm_response事件并清空
+    pending_final_response: List[bool] = []
     
-    # 构建llm_response事件数据
-    llm_response_data = {"type": "llm_response", "data": final_full_response_for_client}
-    if unified_translation and unified_translation.strip():
-        llm_response_data["data"] = unified_translation
-        llm_response_data["original"] = full_response
+    # 后台整体翻译任务，llm_response事件产生后仍未完成时继续等待，但不会延长本轮对话
+    pending_consistency_pass: List[Future] = []
     
-    llm_response_json = json.dumps(llm_response_data)
-    logging.info(f"Yielding llm_response event_data: {llm_response_json}")
-    yield AdditionalOutputs(llm_response_json)
+    # 情感分析与文本流同时进行：同一时间最多一个请求，请求进行期间完成的新段落合并到下一次请求
+    emotion_inflight: List[Tuple[Future, str, float]] = []  # (任务, 段落标识, 截止时间)
+    emotion_wanted: List[str] = []  # 等待分析的段落标识，只保留最新的一个
+    emotion_analyzed_text = [""]  # 最近一次提交分析的文本，内容相同时不重复分析
     
-    # 继续处理TTS
-    # 等待所有TTS任务完成，添加重试机制防止无限循环
-    consecutive_no_progress_count = 0
-    max_no_progress_iterations = 50  # 最多50次无进展迭代
+    # 是否需要翻译
+    needs_translation = bool(
+        translate_text and voice_output_language and text_output_language and voice_output_language != text_output_language
+    )
     
-    while pending_tts_tasks:
-        # 记录循环前的状态
-        initial_pending_count = len(pending_tts_tasks)
-        initial_queue_size = len(audio_queue)
-        
-        # 检查已完成的TTS任务并获取新的音频块
-        check_and_process_tts_tasks(
-            pending_tts_tasks, 
-            audio_queue, 
-            segment_order,
-            current_output_segment_id
-        )
+    def submit_segment(segment):
+        """登记段落并提交TTS和翻译任务，然后产生已就绪的llm_stream事件"""
+        # 先登记段落获得序号，必须在submit之前
+        segment_seq = reorder_buffer.open_segment()
+        segment_deadlines[segment_seq] = time.time() + TTS_SEGMENT_QUEUE_TIMEOUT
+
+        # Submit TTS early: 优先在共享事件循环中运行异步TTS，否则提交到 _tts_pool
+        if text_to_speech_stream_async:
+            async_tts_futures.append(submit_async(
+                run_tts_async,
+                text_to_speech_stream_async,
+                segment, # Original segment for TTS
+                siliconflow_config.get("voice"),
+                segment_seq,
+                turn_events
+            ))
+        else:
+            _tts_pool.submit(
+                run_tts_in_thread,
+                text_to_speech_stream,
+                segment, # Original segment for TTS
+                siliconflow_config.get("voice"),
+                segment_seq,
+                turn_events
+            )
+
+        # 翻译在线程池中与TTS并行进行，完成后由调度循环按段落顺序产生llm_stream事件，不阻塞LLM和音频输出
+        translation_future = None
+        if needs_translation:
+            translation_future = _submit_translation(translate_text, segment, text_output_language, voice_output_language, turn_events)
+        submitted_segments.append(segment)
+        pending_stream_segments.append((segment, translation_future, time.time() + SEGMENT_TRANSLATION_TIMEOUT))
+        yield from _ready_stream_events(pending_stream_segments, full_response_for_client_segments, trace)
         
-        # 输出准备好的音频块，添加间隔控制
-        yielded_audio_count = 0
-        for output in yield_ready_audio_chunks(audio_queue, segment_order, current_output_segment_id, pending_tts_tasks=pending_tts_tasks):
-            if isinstance(output, AdditionalOutputs):
-                yield output
+        # 第一个段落完成时就开始情感分析，之后随段落到达持续更新
+        if run_predict_emotion:
+            emotion_wanted[:] = [f"segment_{len(submitted_segments) - 1}"]
+            yield from pump_emotion_analysis()
+    
+    def pump_emotion_analysis():
+        """产生已完成的情感分析结果，并在空闲时对目前为止的回复提交下一次分析"""
+        if emotion_inflight:
+            future, segment_id, deadline = emotion_inflight[0]
+            if future.done():
+                emotion_inflight.clear()
+                emotion_result = future.result()  # _predict_emotion_safely 出错时返回None，不会抛出异常
+                if emotion_result is not None:
+                    emotion_json = json.dumps({
+                        "type": "emotion_response", 
+                        "data": f"{emotion_result}", 
+                        "segment_id": segment_id
+                    })
+                    yield AdditionalOutputs(emotion_json)
+            elif time.time() >= deadline:
+                emotion_inflight.clear()
+                future.cancel()
+                logging.error(f"情感分析超过 {EMOTION_TIMEOUT} 秒未完成，放弃等待 - {segment_id}")
             else:
-                yielded_audio_count += 1
-                # 控制音频块输出间隔，避免挤在一起
-                current_time = time.time()
-                if current_time - last_audio_yield_time < min_audio_interval:
-                    time.sleep(min_audio_interval - (current_time - last_audio_yield_time))
-                
-                yield output[1]  # 实际音频块
-                last_audio_yield_time = time.time()
+                return
         
-        # 检查是否有进展
-        final_pending_count = len(pending_tts_tasks)
-        final_queue_size = len(audio_queue)
+        if not emotion_wanted:
+            return
+        segment_id = emotion_wanted.pop()
+        text = full_response if segment_id == "full_response" else "".join(submitted_segments)
+        if not text.strip() or _comparable_text(text) == emotion_analyzed_text[0]:
+            return
+        emotion_analyzed_text[0] = _comparable_text(text)
+        emotion_inflight.append((
+            _submit_emotion_analysis(run_predict_emotion, text, client, turn_events),
+            segment_id,
+            time.time() + EMOTION_TIMEOUT
+        ))
+    
+    def finish_llm_response():
+        """LLM生成结束后处理剩余文本，并提交完整响应的情感分析和整体翻译"""
+        # 处理最后可能剩余的内容
+        last_segment_text = segmenter.flush().strip()
+        if last_segment_text:
+            yield from submit_segment(last_segment_text)
         
-        has_progress = (
-            initial_pending_count > final_pending_count or  # 有任务完成
-            initial_queue_size < final_queue_size or       # 队列有新音频块
-            yielded_audio_count > 0                        # 输出了音频块
-        )
+        # 对完整响应进行最后一次情感分析，内容与已分析的段落相同时不再重复请求
+        if run_predict_emotion:
+            emotion_wanted[:] = ["full_response"]
+            yield from pump_emotion_analysis()
         
-        if has_progress:
-            consecutive_no_progress_count = 0
-        else:
-            consecutive_no_progress_count += 1
-            
-        # 如果连续无进展次数过多，强制结束防止无限循环
-        if consecutive_no_progress_count >= max_no_progress_iterations:
-            logging.warning(f"检测到可能的无限循环，连续{max_no_progress_iterations}次无进展。强制结束TTS处理。")
-            logging.warning(f"剩余未完成段落: {list(pending_tts_tasks.keys())}")
-            break
+        # 可选的整体翻译在后台进行，完整响应事件不等待它
+        if needs_translation and TRANSLATION_CONSISTENCY_PASS and full_response.strip():
+            logging.info(f"开始对完整响应进行后台整体翻译，原文长度: {len(full_response)}")
+            pending_consistency_pass.append(
+                _submit_translation(translate_text, full_response, text_output_language, voice_output_language, turn_events)
+            )
+        pending_final_response.append(True)
+    
+    def ready_final_response():
+        """所有段落的llm_stream事件都已产生时，用逐段翻译拼接出完整响应，产生llm_response事件"""
+        if not pending_final_response or pending_stream_segments:
+            return
+        pending_final_response.clear()
+        
+        # 将文本包装成JSON对象，表示这是LLM返回的完整响应
+        final_full_response_for_client = "".join(full_response_for_client_segments)
+        
+        # 构建llm_response事件数据，段落有翻译时保留原文作为参考
+        llm_response_data = {"type": "llm_response", "data": final_full_response_for_client}
+        if needs_translation and final_full_response_for_client != "".join(submitted_segments):
+            llm_response_data["original"] = full_response
         
-        # 如果仍有未完成的任务，等待一小段时间
-        if pending_tts_tasks:
-            time.sleep(0.05)  # 等待50毫秒再检查
+        llm_response_json = json.dumps(llm_response_data)
+        logging.info(f"Yielding llm_response event_data: {llm_response_json}")
+        yield AdditionalOutputs(llm_response_json)
+    
+    def ready_consistency_revision():
+        """后台整体翻译完成后，如果与逐段翻译的拼接结果不同，产生llm_response_revision事件"""
+        if pending_final_response or not pending_consistency_pass or not pending_consistency_pass[0].done():
+            return
+        future = pending_consistency_pass.pop()
+        try:
+            revised = future.result()
+        except Exception as e:
+            logging.error(f"整体翻译失败: {e}")
+            return
+        if not revised or not revised.strip() or revised == full_response or revised == "".join(full_response_for_client_segments):
+            return
+        revision_json = json.dumps({"type": "llm_response_revision", "data": revised, "original": full_response})
+        logging.info(f"Yielding llm_response_revision event_data: {revision_json}")
+        yield AdditionalOutputs(revision_json)
+    
+    def pending_deadlines():
+        """调度循环需要按时醒来检查的所有截止时间"""
+        deadlines = list(segment_deadlines.values())
+        if pending_stream_segments:
+            deadlines.append(pending_stream_segments[0][2])
+        if emotion_inflight:
+            deadlines.append(emotion_inflight[0][2])
+        return deadlines
+    
+    # 在独立线程中读取LLM流，文本片段通过事件通道送达调度循环
+    stop_event = threading.Event()
+    threading.Thread(
+        target=_pump_llm_stream,
+        args=(ai_stream, client, messages, model, max_tokens, max_context_length, turn_events, stop_event),
+        daemon=True
+    ).start()
     
-    # 确保所有音频块都已经输出，添加间隔控制
-    for output in yield_ready_audio_chunks(audio_queue, segment_order, current_output_segment_id, force_all=True):
-        if isinstance(output, AdditionalOutputs):
-            yield output
-        else:
-            # 控制音频块输出间隔，避免挤在一起
-            current_time = time.time()
-            if current_time - last_audio_yield_time < min_audio_interval:
-                time.sleep(min_audio_interval - (current_time - last_audio_yield_time))
+    try:
+        # 调度循环：直到LLM结束、所有段落的TTS都完成或超时，且所有文本和情感事件都已产生
+        while (not llm_completed or reorder_buffer.open_count or pending_stream_segments or pending_final_response
+               or emotion_inflight or emotion_wanted):
+            events = _wait_for_turn_events(turn_events, _next_wakeup_timeout(llm_completed, pending_deadlines()))
             
-            yield output[1]  # 实际音频块
-            last_audio_yield_time = time.time()
+            tts_events = []
+            for kind, segment_seq, payload in events:
+                if kind == _EVENT_LLM_TEXT:
+                    text_chunk, full_response = payload
+                    if trace is not None:
+                        trace.mark("first_token")
+                    
+                    # 增量分段，只有新完成的段落才会被返回
+                    for segment in segmenter.feed(text_chunk):
+                        if segment.strip():
+                            yield from submit_segment(segment)
+                elif kind == _EVENT_LLM_DONE:
+                    if payload is not None:
+                        raise payload
+                    # LLM已完成生成，标记完成状态
+                    llm_completed = True
+                    if trace is not None:
+                        trace.mark("llm_done")
+                    if on_llm_done is not None:
+                        try:
+                            on_llm_done(full_response)
+                        except Exception as e:
+                            logging.error(f"LLM生成结束回调出错: {e}")
+                    yield from finish_llm_response()
+                elif kind == _EVENT_TASK_DONE:
+                    # 翻译和情感分析的结果在下面统一处理
+                    continue
+                else:
+                    tts_events.append((kind, segment_seq, payload))
+            
+            # 处理新到达的音频块和完成标记，并放弃已超时的段落
+            _route_tts_events(tts_events, reorder_buffer, segment_deadlines)
+            _expire_stalled_segments(reorder_buffer, segment_deadlines)
+            
+            # 产生翻译已完成的文本事件，翻译未完成时不等待
+            yield from _ready_stream_events(pending_stream_segments, full_response_for_client_segments, trace)
+            yield from ready_final_response()
+            yield from ready_consistency_revision()
+            yield from pump_emotion_analysis()
+            
+            # 按段落顺序输出准备好的音频块，添加间隔控制
+            yield from _paced_audio_outputs(reorder_buffer.pop_ready(), last_audio_yield_time, trace=trace)
+        
+        # 确保所有音频块都已经输出，添加间隔控制
+        yield from _paced_audio_outputs(reorder_buffer.drain(), last_audio_yield_time, trace=trace)
+        yield from ready_consistency_revision()
+        if pending_consistency_pass:
+            logging.info("本轮对话结束时整体翻译仍未完成，放弃等待")
+    finally:
+        # 无论正常结束还是被打断，都通知LLM线程停止读取，并取消仍在进行的异步TTS
+        stop_event.set()
+        for future in async_tts_futures:
+            future.cancel()
+        for future in pending_consistency_pass:
+            future.cancel()
+        for future, _, _ in emotion_inflight:
+            future.cancel()
     
     # 在yield完所有内容后，再yield一次full_response字符串
     # 这样调用者就可以获取完整的响应文本
-    yield full_response          
\ No newline at end of file
+    yield full_response